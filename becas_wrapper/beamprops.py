@@ -0,0 +1,269 @@
+
+import numpy as np
+
+from becas_numpy import material_constitutive, material_rotation
+
+__all__ = ['transform_matrices', 'transform_beam_matrices', 'principal_angles',
+           'km2csprops', 'km2hawc2', 'section_shear_modulus']
+
+
+def transform_matrices(x0, y0, alpha):
+    """
+    Transformation matrices of 6x6 cross section stiffness matrices
+    to coordinate systems translated to (x0, y0) and rotated by alpha,
+    see transform_matrix in becas_numpy.
+
+    The transformed stiffness matrices are T^T K T.
+
+    parameters
+    ----------
+    x0: array
+        x-coordinates of the new origins. Size (nsec)
+    y0: array
+        y-coordinates of the new origins. Size (nsec)
+    alpha: array
+        rotation angles in radians. Size (nsec)
+
+    returns
+    -------
+    T: array
+        transformation matrices. Size ((nsec, 6, 6))
+    """
+
+    x0, y0, alpha = np.broadcast_arrays(np.atleast_1d(x0), np.atleast_1d(y0),
+                                        np.atleast_1d(alpha))
+    n = x0.shape[0]
+    Tt = np.tile(np.eye(6), (n, 1, 1))
+    Tt[:, 0, 5] = y0
+    Tt[:, 1, 5] = -x0
+    Tt[:, 2, 3] = -y0
+    Tt[:, 2, 4] = x0
+    c = np.cos(alpha)
+    s = np.sin(alpha)
+    Tr = np.tile(np.eye(6), (n, 1, 1))
+    for i in [0, 3]:
+        Tr[:, i, i] = c
+        Tr[:, i, i + 1] = -s
+        Tr[:, i + 1, i] = s
+        Tr[:, i + 1, i + 1] = c
+    return np.matmul(Tt, Tr)
+
+
+def transform_beam_matrices(K, M, x0, y0, alpha):
+    """
+    Transform the stiffness and mass matrices of all sections to
+    reference points (x0, y0) and coordinate systems rotated by alpha.
+
+    parameters
+    ----------
+    K: array
+        stiffness matrices. Size ((nsec, 6, 6))
+    M: array
+        mass matrices. Size ((nsec, 6, 6))
+    x0: array
+        x-coordinates of the new reference points in the current
+        coordinate systems. Size (nsec)
+    y0: array
+        y-coordinates of the new reference points. Size (nsec)
+    alpha: array
+        rotation angles in radians. Size (nsec)
+
+    returns
+    -------
+    Kt: array
+        transformed stiffness matrices T^T K T. Size ((nsec, 6, 6))
+    Mt: array
+        transformed mass matrices T^T M T. Size ((nsec, 6, 6))
+    """
+
+    T = transform_matrices(x0, y0, alpha)
+    Kt = np.einsum('nji,njk,nkl->nil', T, K, T)
+    Mt = np.einsum('nji,njk,nkl->nil', T, M, T)
+    return Kt, Mt
+
+
+def principal_angles(K):
+    """
+    Angles in radians of the principal bending axes of stiffness matrices.
+    Size ((nsec, 6, 6)) -> (nsec)
+    """
+
+    return 0.5 * np.arctan2(-2. * K[:, 3, 4], K[:, 4, 4] - K[:, 3, 3])
+
+
+def km2csprops(K, M):
+    """
+    Cross section centers, mass properties and principal axis angles of
+    all sections computed from their stiffness and mass matrices.
+
+    parameters
+    ----------
+    K: array
+        stiffness matrices w.r.t. the reference point. Size ((nsec, 6, 6))
+    M: array
+        mass matrices w.r.t. the reference point. Size ((nsec, 6, 6))
+
+    returns
+    -------
+    props: dict
+        shear center xs, ys, elastic center xe, ye, mass and mass center
+        xm, ym, mass moments of inertia Ixx, Iyy, Ixy w.r.t. the reference
+        point, principal axis angles w.r.t. the reference alpha_ref and
+        the elastic center alpha_e, and the compliance matrices F.
+        Sizes (nsec) and ((nsec, 6, 6))
+    """
+
+    K = np.asarray(K, dtype=float)
+    M = np.asarray(M, dtype=float)
+    F = np.linalg.inv(K)
+    F = 0.5 * (F + F.transpose(0, 2, 1))
+
+    p = {}
+    p['F'] = F
+    p['xs'] = -F[:, 5, 1] / F[:, 5, 5]
+    p['ys'] = F[:, 5, 0] / F[:, 5, 5]
+    den = F[:, 3, 3] * F[:, 4, 4] - F[:, 3, 4]**2
+    p['xe'] = (F[:, 3, 3] * F[:, 4, 2] - F[:, 3, 2] * F[:, 4, 3]) / den
+    p['ye'] = (-F[:, 3, 2] * F[:, 4, 4] + F[:, 3, 4] * F[:, 4, 2]) / den
+    p['mass'] = M[:, 0, 0]
+    p['xm'] = M[:, 1, 5] / p['mass']
+    p['ym'] = -M[:, 0, 5] / p['mass']
+    p['Ixx'] = M[:, 3, 3]
+    p['Iyy'] = M[:, 4, 4]
+    p['Ixy'] = -M[:, 3, 4]
+    p['alpha_ref'] = principal_angles(K)
+    Te = transform_matrices(p['xe'], p['ye'], 0.)
+    Ke = np.matmul(Te.transpose(0, 2, 1), np.matmul(K, Te))
+    p['alpha_e'] = principal_angles(Ke)
+    return p
+
+
+def km2hawc2(K, M, spanpos, hawc2_FPM=False, area=None, G=None):
+    """
+    HAWC2 beam properties of all sections computed from their stiffness
+    and mass matrices, as written by BECAS_Becas2Hawc2.
+
+    The standard format splits the stiffnesses into moduli and section
+    constants, which requires the areas and the area averaged shear
+    moduli of the sections, see section_shear_modulus.
+
+    parameters
+    ----------
+    K: array
+        stiffness matrices w.r.t. the reference point. Size ((nsec, 6, 6))
+    M: array
+        mass matrices w.r.t. the reference point. Size ((nsec, 6, 6))
+    spanpos: array
+        spanwise positions of the sections. Size (nsec)
+    hawc2_FPM: bool
+        return the fully populated stiffness matrix format
+    area: array
+        areas of the sections, only used for the standard format. Size (nsec)
+    G: array
+        area averaged out-of-plane shear moduli of the sections,
+        only used for the standard format. Size (nsec)
+
+    returns
+    -------
+    cs_props: array
+        HAWC2 beam properties. Size ((nsec, 19)) or ((nsec, 30)),
+        see BECASNumpy.becas2hawc2
+    """
+
+    K = np.asarray(K, dtype=float)
+    M = np.asarray(M, dtype=float)
+    n = K.shape[0]
+    p = km2csprops(K, M)
+    alpha = p['alpha_e']
+    xe = p['xe']
+    ye = p['ye']
+
+    # stiffness matrices at the elastic centers in the principal axes
+    Tp = transform_matrices(xe, ye, alpha)
+    Kp = np.matmul(Tp.transpose(0, 2, 1), np.matmul(K, Tp))
+
+    # mass radii of gyration w.r.t. the elastic center in the principal axes
+    m = p['mass']
+    Ixx = p['Ixx'] - 2. * ye * m * p['ym'] + m * ye**2
+    Iyy = p['Iyy'] - 2. * xe * m * p['xm'] + m * xe**2
+    Ixy = p['Ixy'] - xe * m * p['ym'] - ye * m * p['xm'] + m * xe * ye
+    c = np.cos(alpha)
+    s = np.sin(alpha)
+    Ix = c**2 * Ixx + s**2 * Iyy - 2. * s * c * Ixy
+    Iy = s**2 * Ixx + c**2 * Iyy + 2. * s * c * Ixy
+    ri_x = np.sqrt(Ix / m)
+    ri_y = np.sqrt(Iy / m)
+    pitch = np.degrees(alpha)
+
+    spanpos = np.ones(n) * spanpos
+    if hawc2_FPM:
+        cs_props = np.zeros((n, 30))
+        cs_props[:, :9] = np.array([spanpos, m, p['xm'], p['ym'], ri_x, ri_y,
+                                    pitch, xe, ye]).T
+        iu = np.triu_indices(6)
+        cs_props[:, 9:] = Kp[:, iu[0], iu[1]]
+    else:
+        if area is None or G is None:
+            raise ValueError('The section areas and shear moduli are needed '
+                             'for the standard HAWC2 format')
+        area = np.ones(n) * area
+        G = np.ones(n) * G
+        E = K[:, 2, 2] / area
+        cs_props = np.array([spanpos, m, p['xm'], p['ym'],
+                             ri_x, ri_y, p['xs'], p['ys'],
+                             E, G, Kp[:, 3, 3] / E, Kp[:, 4, 4] / E,
+                             1. / p['F'][:, 5, 5] / G,
+                             K[:, 0, 0] / (G * area),
+                             K[:, 1, 1] / (G * area),
+                             area, pitch, xe, ye]).T
+    return cs_props
+
+
+def section_shear_modulus(nl_2d, el_2d, emat, matprops):
+    """
+    area and area averaged out-of-plane shear modulus of a section
+    as used in the standard HAWC2 format, computed from the BECAS inputs.
+
+    parameters
+    ----------
+    nl_2d: array
+        nodal positions (node number, x, y). Size ((n_n, 3))
+    el_2d: array
+        element connectivity (element number, node 1, ..., node 8).
+        Size ((n_e, 9))
+    emat: array
+        element material assignment (element number, material number,
+        fiber angle, fiber plane angle). Size ((n_e, 4))
+    matprops: array
+        material properties E11 E22 E33 G12 G13 G23 nu12 nu13 nu23 rho.
+        Size ((nmat, 10))
+
+    returns
+    -------
+    area: float
+        section area
+    G: float
+        area averaged shear modulus
+    """
+
+    nl_2d = np.atleast_2d(nl_2d)
+    el_2d = np.atleast_2d(el_2d).astype(int)
+    emat = np.atleast_2d(emat)
+    node_idx = np.zeros(nl_2d[:, 0].astype(int).max() + 1, dtype=int)
+    node_idx[nl_2d[:, 0].astype(int)] = np.arange(nl_2d.shape[0])
+    emat_idx = np.zeros(emat[:, 0].astype(int).max() + 1, dtype=int)
+    emat_idx[emat[:, 0].astype(int)] = np.arange(emat.shape[0])
+    emat = emat[emat_idx[el_2d[:, 0]]]
+
+    # signed element areas from the corner nodes, the shear modulus is
+    # averaged with the absolute element areas as in BECAS
+    X = nl_2d[node_idx[el_2d[:, 1:5]], 1:3]
+    x = X[:, :, 0]
+    y = X[:, :, 1]
+    el_area = 0.5 * (x * np.roll(y, -1, axis=1) - np.roll(x, -1, axis=1) * y).sum(axis=1)
+
+    Qm = material_constitutive(matprops)[emat[:, 1].astype(int) - 1]
+    T = material_rotation(emat[:, 2], emat[:, 3])
+    Q = np.matmul(T.transpose(0, 2, 1), np.matmul(Qm, T))
+    area = el_area.sum()
+    return area, np.dot(np.abs(el_area), Q[:, 3, 3]) / area
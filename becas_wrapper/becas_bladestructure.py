@@ -1,14 +1,207 @@
 
 import numpy as np
 import os
+import copy
+import shutil
+import tempfile
+import multiprocessing
+from scipy.interpolate import pchip_interpolate
 
 from openmdao.api import Component, Group, ParallelGroup, ExecComp
 
-from cs2dtobecas import CS2DtoBECAS
+from cs2dtobecas import CS2DtoBECAS, write_becas_inp_blade
 from becas_wrapper import BECASWrapper
+from becas_numpy import BECASNumpy
+from becas_surrogate import SectionSurrogate
+from thinwalled import ThinWalledSection, wall_geometry
+from beamprops import transform_beam_matrices
 
 from fusedwind.lib.geom_tools import calculate_length
 
+
+def _init_cs2d(name, st3d, s):
+    """
+    create the constant part of the CS2DtoBECAS dictionary of a section
+    and the names of its layer variables.
+
+    parameters
+    ----------
+    name: str
+        section name, e.g. sec000
+    st3d: dict
+        dictionary with blade structural definition
+    s: float
+        spanwise location of the cross-section
+
+    returns
+    -------
+    cs2di: dict
+        cross section dictionary with zero thicknesses and angles
+    varnames: list
+        list of layer variable names
+    """
+
+    nr = len(st3d['regions'])
+    varnames = []
+    cs2di = {}
+    cs2di['materials'] = st3d['materials']
+    cs2di['matprops'] = st3d['matprops']
+    cs2di['failcrit'] = st3d['failcrit']
+    cs2di['failmat'] = st3d['failmat']
+    if 'snmat' in st3d:
+        cs2di['snmat'] = st3d['snmat']
+    cs2di['web_def'] = st3d['web_def']
+    cs2di['s'] = s
+    cs2di['DPs'] = np.zeros(nr + 1)
+    cs2di['regions'] = []
+    cs2di['webs'] = []
+    for ireg, reg in enumerate(st3d['regions']):
+        r = {}
+        r['layers'] = reg['layers']
+        nl = len(reg['layers'])
+        r['thicknesses'] = np.zeros(nl)
+        r['angles'] = np.zeros(nl)
+        cs2di['regions'].append(r)
+        for i, lname in enumerate(reg['layers']):
+            varname = '%s:r%02d%s' % (name, ireg, lname)
+            varnames.append(varname)
+    for ireg, reg in enumerate(st3d['webs']):
+        r = {}
+        r['layers'] = reg['layers']
+        nl = len(reg['layers'])
+        r['thicknesses'] = np.zeros(nl)
+        r['angles'] = np.zeros(nl)
+        cs2di['webs'].append(r)
+        for i, lname in enumerate(reg['layers']):
+            varname = '%s:w%02d%s' % (name, ireg, lname)
+            varnames.append(varname)
+
+    return cs2di, varnames
+
+
+def _params2cs2d(name, cs2di, nvar, params):
+    """
+    convert the OpenMDAO params dictionary of a section into
+    the dictionary format used in CS2DtoBECAS.
+
+    parameters
+    ----------
+    name: str
+        section name, e.g. sec000
+    cs2di: dict
+        constant cross section dictionary, see _init_cs2d
+    nvar: int
+        number of layer variables
+    params: dict
+        OpenMDAO params
+
+    returns
+    -------
+    cs2d: dict
+        cross section dictionary where zero thickness layers are removed
+    """
+    tvec = params[name+':tvec']
+
+    cs2d = {}
+    # constants
+    cs2d['s'] = cs2di['s']
+    cs2d['web_def'] = cs2di['web_def']
+    cs2d['failcrit'] = cs2di['failcrit']
+    cs2d['materials'] = cs2di['materials']
+    if 'snmat' in cs2di:
+        cs2d['snmat'] = cs2di['snmat']
+
+    # params
+    cs2d['coords'] = params['%s:coords' % name][:, :2]
+    cs2d['matprops'] = params['matprops']
+    cs2d['failmat'] = params['failmat']
+    cs2d['DPs'] = params['%s:DPs' % name]
+    cs2d['regions'] = []
+    cs2d['webs'] = []
+    counter = 0
+    for ireg, reg in enumerate(cs2di['regions']):
+        cs2d['regions'].append({})
+        Ts = []
+        As = []
+        layers = []
+        for i, lname in enumerate(reg['layers']):
+            if tvec[counter] > 0.:
+                Ts.append(tvec[counter])
+                As.append(tvec[nvar+counter])
+                layers.append(lname)
+            counter += 1
+        cs2d['regions'][ireg]['thicknesses'] = np.asarray(Ts)
+        cs2d['regions'][ireg]['angles'] = np.asarray(As)
+        cs2d['regions'][ireg]['layers'] = layers
+    for ireg, reg in enumerate(cs2di['webs']):
+        cs2d['webs'].append({})
+        Ts = []
+        As = []
+        layers = []
+        for i, lname in enumerate(reg['layers']):
+            if tvec[counter] > 0.:
+                Ts.append(tvec[counter])
+                As.append(tvec[nvar+counter])
+                layers.append(lname)
+            counter += 1
+        cs2d['webs'][ireg]['thicknesses'] = np.asarray(Ts)
+        cs2d['webs'][ireg]['angles'] = np.asarray(As)
+        cs2d['webs'][ireg]['layers'] = layers
+
+    return cs2d
+
+
+def _fd_section(args):
+    """
+    mesh and compute the properties of a perturbed section, used by
+    BECASCSStructure.linearize to finite difference the sections in
+    a worker pool. Each perturbed section is computed in a temporary
+    directory next to the work directory of the section, which is removed
+    afterwards.
+
+    parameters
+    ----------
+    args: tuple
+        (workdir, cs2d, mesher_config, distribution, becas_config, s), where
+        distribution is the mesh distribution of the unperturbed section
+        that the perturbed section is meshed with.
+
+    returns
+    -------
+    outputs: list
+        flattened cs_props, csprops_ref, k_matrix, m_matrix and DPcoords
+        of the section, or None if the computation failed.
+    """
+
+    workdir, cs2d, mesher_config, distribution, becas_config, s = args
+
+    workdir = tempfile.mkdtemp(prefix=os.path.basename(workdir) + '_fd',
+                               dir=os.path.dirname(workdir))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        mesher = CS2DtoBECAS(cs2d, **mesher_config)
+        for k, v in distribution.iteritems():
+            setattr(mesher, k, copy.deepcopy(v))
+        mesher.compute(False)
+        becas = BECASWrapper(s, **becas_config)
+        becas.compute()
+        if not becas.success:
+            return None
+        DPcoords = np.zeros((len(mesher.DPcoords), 3))
+        DPcoords[:, :2] = np.array(mesher.DPcoords)
+        return [np.asarray(becas.cs_props).flatten(),
+                np.asarray(becas.csprops).flatten(),
+                np.asarray(becas.k_matrix).flatten(),
+                np.asarray(becas.m_matrix).flatten(),
+                DPcoords.flatten()]
+    except:
+        return None
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
 class BECASCSStructure(Component):
     """
     Component for computing beam structural properties
@@ -94,39 +287,9 @@ class BECASCSStructure(Component):
         self.add_param('%s:DPs' % name, np.zeros(self.nr + 1))
 
         # add coords coords
-        self._varnames = []
         self.add_param('%s:coords' % name, np.zeros((ni_chord, 3)))
 
-        self.cs2di = {}
-        self.cs2di['materials'] = st3d['materials']
-        self.cs2di['matprops'] = st3d['matprops']
-        self.cs2di['failcrit'] = st3d['failcrit']
-        self.cs2di['failmat'] = st3d['failmat']
-        self.cs2di['web_def'] = st3d['web_def']
-        self.cs2di['s'] = s
-        self.cs2di['DPs'] = np.zeros(self.nr + 1)
-        self.cs2di['regions'] = []
-        self.cs2di['webs'] = []
-        for ireg, reg in enumerate(st3d['regions']):
-            r = {}
-            r['layers'] = reg['layers']
-            nl = len(reg['layers'])
-            r['thicknesses'] = np.zeros(nl)
-            r['angles'] = np.zeros(nl)
-            self.cs2di['regions'].append(r)
-            for i, lname in enumerate(reg['layers']):
-                varname = '%s:r%02d%s' % (name, ireg, lname)
-                self._varnames.append(varname)
-        for ireg, reg in enumerate(st3d['webs']):
-            r = {}
-            r['layers'] = reg['layers']
-            nl = len(reg['layers'])
-            r['thicknesses'] = np.zeros(nl)
-            r['angles'] = np.zeros(nl)
-            self.cs2di['webs'].append(r)
-            for i, lname in enumerate(reg['layers']):
-                varname = '%s:w%02d%s' % (name, ireg, lname)
-                self._varnames.append(varname)
+        self.cs2di, self._varnames = _init_cs2d(name, st3d, s)
         self.add_param(name + ':tvec', np.zeros(len(self._varnames)*2))
 
         # add outputs
@@ -139,7 +302,17 @@ class BECASCSStructure(Component):
         self.k_matrix_m1 = np.zeros((6,6))
         self.m_matrix_m1 = np.zeros((6,6))
 
-        self.add_output('%s:DPcoords' % name, np.zeros((self.nr + 1, 3)))
+        # when the blade is meshed in one go by BECASBladeMesher,
+        # the section only runs BECAS on the inputs generated by the mesher
+        try:
+            self.blade_mesh = config['blade_mesh']
+        except:
+            self.blade_mesh = False
+
+        if self.blade_mesh:
+            self.add_param('%s:path_input' % name, '', pass_by_obj=True)
+        else:
+            self.add_output('%s:DPcoords' % name, np.zeros((self.nr + 1, 3)))
 
         self.workdir = 'becas_%s_%i' % (name, self.becas_hash)
         # not so nice hack to ensure unique directory names when
@@ -147,66 +320,165 @@ class BECASCSStructure(Component):
         # the hash is passed to downstream BECASStressRecovery class
         self.add_output(name + ':hash', float(self.becas_hash))
 
+        self.mesher_config = config['CS2DtoBECAS']
+        self.becas_config = config['BECASWrapper']
         self.mesher = CS2DtoBECAS(self.cs2di, **config['CS2DtoBECAS'])
         self.becas = BECASWrapper(self.cs2di['s'], **config['BECASWrapper'])
         self.redistribute_flag = True
 
+        # with the native BECAS implementation the derivatives are computed
+        # semi-analytically in linearize, otherwise the component is finite
+        # differenced by OpenMDAO, or with config['fd_workers'] or
+        # config['gradient_mesh'] given, by linearize in a pool of
+        # fd_workers processes or serially.
+        # Sections meshed by BECASBladeMesher are finite differenced together
+        # with the mesher by BECASBeamStructure
+        self.analytic_derivatives = self.becas.exec_mode == 'numpy' and not self.blade_mesh
+        try:
+            self.fd_workers = config['fd_workers']
+        except:
+            self.fd_workers = None
+
+        # step sizes of the finite differences of the mesh
+        # w.r.t. lengths and ply angles in degrees
+        try:
+            self.fd_step = config['fd_step']
+        except:
+            self.fd_step = 1.e-5
+        try:
+            self.fd_step_angle = config['fd_step_angle']
+        except:
+            self.fd_step_angle = 1.
+
+        # optional coarse mesh used only for the derivatives, given as a dict
+        # of CS2DtoBECAS inputs overriding config['CS2DtoBECAS'],
+        # e.g. {'total_points': 60, 'max_layers': 1}
+        try:
+            self.gradient_mesh = config['gradient_mesh']
+        except:
+            self.gradient_mesh = None
+        if self.blade_mesh:
+            self.gradient_mesh = None
+        if self.gradient_mesh is not None:
+            self.gradient_mesher_config = dict(config['CS2DtoBECAS'])
+            self.gradient_mesher_config.update(self.gradient_mesh)
+            self.gradient_mesher_config['becas_inputs'] = self.mesher.becas_inputs + '_coarse'
+            self.gradient_mesher = CS2DtoBECAS(self.cs2di, **self.gradient_mesher_config)
+            self.gradient_becas_config = dict(config['BECASWrapper'])
+            self.gradient_becas_config['path_input'] = os.path.join(self.gradient_mesher.becas_inputs,
+                                                                     self.gradient_mesher.section_name)
+            self.gradient_becas_config['utils_rst_filebase'] = 'becas_utils_coarse'
+            self.gradient_becas_config['analysis_mode'] = 'stiffness'
+            self.gradient_becas_config['plot_paraview'] = False
+            self.gradient_becas = BECASWrapper(self.cs2di['s'], **self.gradient_becas_config)
+            self.gradient_redistribute_flag = True
+
+        if self.blade_mesh or (not self.analytic_derivatives and self.fd_workers is None
+                               and self.gradient_mesh is None):
+            self.fd_options['force_fd'] = True
+
+        # BECASStressRecovery reads the BECAS files of the current design
+        # from the work directory, so with config['with_sr'] = True BECAS
+        # is run for every evaluation
+        try:
+            self.with_sr = config['with_sr']
+        except:
+            self.with_sr = False
+
+        # optional trust-region surrogate of the outputs w.r.t. tvec,
+        # given as a dict of SectionSurrogate inputs, e.g. {'radius': 0.05}
+        try:
+            surrogate = config['surrogate']
+        except:
+            surrogate = None
+        if self.with_sr:
+            surrogate = None
+        if surrogate is not None:
+            self.surrogate = SectionSurrogate(len(self._varnames), **surrogate)
+        else:
+            self.surrogate = None
+        self.surrogate_hit = False
+        self._fd = False
+
+        # number of evaluations of the section computed with the thin-walled
+        # beam model ThinWalledSection before switching to BECAS
+        try:
+            self.thin_walled_iterations = config['thin_walled_iterations']
+        except:
+            self.thin_walled_iterations = 0
+        if self.blade_mesh or self.with_sr:
+            self.thin_walled_iterations = 0
+        self.thin_walled_count = 0
+        self.thin_walled = False
+
     def _params2dict(self, params):
         """
         convert the OpenMDAO params dictionary into
         the dictionary format used in CS2DtoBECAS.
         """
-        tvec = params[self.name+':tvec']
-
-        self.cs2d = {}
-        # constants
-        self.cs2d['s'] = self.cs2di['s']
-        self.cs2d['web_def'] = self.cs2di['web_def']
-        self.cs2d['failcrit'] = self.cs2di['failcrit']
-        self.cs2d['materials'] = self.cs2di['materials']
-
-        # params
-        self.cs2d['coords'] = params['%s:coords' % self.name][:, :2]
-        self.cs2d['matprops'] = params['matprops']
-        self.cs2d['failmat'] = params['failmat']
-        self.cs2d['DPs'] = params['%s:DPs' % self.name]
-        self.cs2d['regions'] = []
-        self.cs2d['webs'] = []
-        counter = 0
-        nvar = len(self._varnames)
-        for ireg, reg in enumerate(self.cs2di['regions']):
-            self.cs2d['regions'].append({})
-            Ts = []
-            As = []
-            layers = []
-            for i, lname in enumerate(reg['layers']):
-                if tvec[counter] > 0.:
-                    Ts.append(tvec[counter])
-                    As.append(tvec[nvar+counter])
-                    layers.append(lname)
-                counter += 1
-            self.cs2d['regions'][ireg]['thicknesses'] = np.asarray(Ts)
-            self.cs2d['regions'][ireg]['angles'] = np.asarray(As)
-            self.cs2d['regions'][ireg]['layers'] = layers
-        for ireg, reg in enumerate(self.cs2di['webs']):
-            self.cs2d['webs'].append({})
-            Ts = []
-            As = []
-            layers = []
-            for i, lname in enumerate(reg['layers']):
-                if tvec[counter] > 0.:
-                    Ts.append(tvec[counter])
-                    As.append(tvec[nvar+counter])
-                    layers.append(lname)
-                counter += 1
-            self.cs2d['webs'][ireg]['thicknesses'] = np.asarray(Ts)
-            self.cs2d['webs'][ireg]['angles'] = np.asarray(As)
-            self.cs2d['webs'][ireg]['layers'] = layers
 
-    def solve_nonlinear(self, params, unknowns, resids):
+        self.cs2d = _params2cs2d(self.name, self.cs2di, len(self._varnames), params)
+
+    def fd_jacobian(self, params, unknowns, resids, *args, **kwargs):
         """
-        calls CS2DtoBECAS/shellexpander to generate mesh
-        and BECAS to compute the cs_props and csprops
+        finite differences the component with BECAS, bypassing the
+        surrogate, so that the derivatives are those of BECAS.
+        """
+
+        self._fd = True
+        try:
+            return super(BECASCSStructure, self).fd_jacobian(params, unknowns, resids,
+                                                              *args, **kwargs)
+        finally:
+            self._fd = False
+
+    def _surrogate_key(self, params):
+        """
+        inputs other than tvec that the surrogate samples are valid for.
+        """
+
+        return [params['matprops'], params['%s:DPs' % self.name],
+                params['%s:coords' % self.name]]
+
+    def _add_surrogate_sample(self, params):
+
+        becas = self.becas
+        self.surrogate.add_sample(params['%s:tvec' % self.name],
+                                  np.concatenate([np.asarray(becas.cs_props).flatten(),
+                                                  np.asarray(becas.csprops).flatten(),
+                                                  np.asarray(becas.k_matrix).flatten(),
+                                                  np.asarray(becas.m_matrix).flatten()]),
+                                  self._surrogate_key(params))
+
+    def _run_thin_walled(self, cs2d):
+        """
+        compute a section with the thin-walled beam model.
+
+        returns
+        -------
+        outputs: list
+            flattened cs_props, csprops_ref, k_matrix, m_matrix and DPcoords
+            of the section, or None if the computation failed.
+        """
+
+        engine = ThinWalledSection(cs2d, hawc2_FPM=self.becas.hawc2_FPM,
+                                   web_offsets=self.mesher.web_offsets)
+        try:
+            engine.compute()
+        except:
+            return None
+        DPcoords = np.zeros((self.nr + 1, 3))
+        DPcoords[:, :2] = engine.DPcoords
+        return [np.asarray(engine.cs_props).flatten(),
+                np.asarray(engine.csprops).flatten(),
+                np.asarray(engine.k_matrix).flatten(),
+                np.asarray(engine.m_matrix).flatten(),
+                DPcoords.flatten()]
+
+    def _run_section(self, params):
+        """
+        calls CS2DtoBECAS/shellexpander to generate the mesh
+        and BECAS in the work directory of the section.
         """
 
         try:
@@ -215,41 +487,834 @@ class BECASCSStructure(Component):
             pass
         os.chdir(self.workdir)
 
-        self._params2dict(params)
-
         self.mesher.cs2d = self.cs2d
 
         try:
-            self.mesher.compute(self.redistribute_flag)
-            self.becas.compute()
-            if self.becas.success:
-                self.unknowns['%s:DPcoords' % self.name][:,0:2] = np.array(self.mesher.DPcoords)
-                self.unknowns['%s:cs_props' % self.name] = self.becas.cs_props
-                self.unknowns['%s:csprops_ref' % self.name] = self.becas.csprops
-                self.unknowns['%s:k_matrix' % self.name] = self.becas.k_matrix
-                self.unknowns['%s:m_matrix' % self.name] = self.becas.m_matrix
-                self.cs_props_m1 = self.becas.cs_props.copy()
-                self.csprops_ref_m1 = self.becas.csprops.copy()
-                self.k_matrix_m1 = self.becas.k_matrix.copy()
-                self.m_matrix_m1 = self.becas.m_matrix.copy()
+            if self.blade_mesh:
+                self.becas.path_input = params['%s:path_input' % self.name]
             else:
-                self.unknowns['%s:cs_props' % self.name] = self.cs_props_m1
-                self.unknowns['%s:csprops_ref' % self.name] = self.csprops_ref_m1
-                self.unknowns['%s:k_matrix' % self.name] = self.k_matrix_m1
-                self.unknowns['%s:m_matrix' % self.name] = self.m_matrix_m1
-                print('BECAS crashed for section %f' % self.cs2d['s'])
+                self.mesher.compute(self.redistribute_flag)
+            self.becas.compute()
         except:
+            self.becas.success = False
+
+        os.chdir(self.basedir)
+        if self.fix_mesh_distribution:
+            self.redistribute_flag = False
+
+    def solve_nonlinear(self, params, unknowns, resids):
+        """
+        calls CS2DtoBECAS/shellexpander to generate mesh
+        and BECAS to compute the cs_props and csprops
+
+        With config['surrogate'] the outputs are interpolated from the
+        sections already computed when possible, see SectionSurrogate.
+        The surrogate is disabled with config['with_sr'] = True, since
+        BECASStressRecovery needs the BECAS files of the current design,
+        and while the component is finite differenced, see fd_jacobian.
+        When a parent group is finite differenced the perturbed sections
+        may still be interpolated, giving the derivatives of the surrogate.
+
+        The first config['thin_walled_iterations'] evaluations are computed
+        with the thin-walled beam model, see ThinWalledSection, which writes
+        no BECAS files, so it is also disabled with config['with_sr'] = True.
+        """
+
+        self._params2dict(params)
+
+        self.thin_walled = self.thin_walled_count < self.thin_walled_iterations
+        if self.thin_walled:
+            self.thin_walled_count += 1
+            res = self._run_thin_walled(self.cs2d)
+            if res is not None:
+                for out, value in zip(['cs_props', 'csprops_ref', 'k_matrix',
+                                       'm_matrix', 'DPcoords'], res):
+                    name = '%s:%s' % (self.name, out)
+                    unknowns[name] = value.reshape(unknowns[name].shape)
+                return
+            # fall back to BECAS for sections the thin-walled model cannot handle
+            print('Thin-walled model failed for section %f' % self.cs2d['s'])
+            self.thin_walled = False
+
+        self.surrogate_hit = False
+        if self.surrogate is not None and not self._fd:
+            y = self.surrogate.predict(params['%s:tvec' % self.name],
+                                       self._surrogate_key(params))
+            if y is not None:
+                self.surrogate_hit = True
+                i0 = 0
+                for out in ['cs_props', 'csprops_ref', 'k_matrix', 'm_matrix']:
+                    name = '%s:%s' % (self.name, out)
+                    n = unknowns[name].size
+                    unknowns[name] = y[i0:i0 + n].reshape(unknowns[name].shape)
+                    i0 += n
+                return
+
+        self._run_section(params)
+
+        if self.becas.success:
+            if not self.blade_mesh:
+                self.unknowns['%s:DPcoords' % self.name][:,0:2] = np.array(self.mesher.DPcoords)
+            self.unknowns['%s:cs_props' % self.name] = self.becas.cs_props
+            self.unknowns['%s:csprops_ref' % self.name] = self.becas.csprops
+            self.unknowns['%s:k_matrix' % self.name] = self.becas.k_matrix
+            self.unknowns['%s:m_matrix' % self.name] = self.becas.m_matrix
+            self.cs_props_m1 = self.becas.cs_props.copy()
+            self.csprops_ref_m1 = self.becas.csprops.copy()
+            self.k_matrix_m1 = self.becas.k_matrix.copy()
+            self.m_matrix_m1 = self.becas.m_matrix.copy()
+            # the perturbed sections are too close to the others to sample
+            if self.surrogate is not None and not self._fd:
+                self._add_surrogate_sample(params)
+        else:
             self.unknowns['%s:cs_props' % self.name] = self.cs_props_m1
             self.unknowns['%s:csprops_ref' % self.name] = self.csprops_ref_m1
             self.unknowns['%s:k_matrix' % self.name] = self.k_matrix_m1
             self.unknowns['%s:m_matrix' % self.name] = self.m_matrix_m1
             print('BECAS crashed for section %f' % self.cs2d['s'])
 
+
+    def linearize(self, params, unknowns, resids):
+        """
+        derivatives of cs_props, csprops_ref, k_matrix, m_matrix and DPcoords
+        w.r.t. tvec, matprops, DPs and coords.
+
+        The derivatives of the mesh w.r.t. the geometric and layup parameters
+        are computed with forward differences of the mesher at the fixed
+        mesh distribution, and the derivatives of the section properties
+        w.r.t. the mesh and materials with the semi-analytic adjoint method
+        of BECASNumpy, which reuses the factorization of the unperturbed
+        section. Parameters that change the mesh topology are finite
+        differenced with a full section computation. Zero thickness plies
+        are not part of the section and get zero derivatives.
+
+        With the other execution modes and config['fd_workers'] or
+        config['gradient_mesh'] given, all parameters are finite differenced
+        with the perturbed sections computed concurrently, or serially
+        without fd_workers, see _linearize_fd.
+
+        When config['gradient_mesh'] is given the derivatives are computed
+        on the coarse mesh of the section. The outputs of the component
+        remain those of the fine mesh, i.e. the fine model is approximated
+        by the coarse model plus the additive correction at the current
+        point, which has the derivatives of the coarse model. The coarse
+        mesh is not used when a parent group is finite differenced, since
+        linearize is then not called.
+
+        When the outputs were interpolated by the surrogate, the section
+        is computed first such that the derivatives are those of BECAS.
+
+        Sections computed with the thin-walled beam model are finite
+        differenced with the thin-walled model, see _linearize_thin_walled.
+        """
+
+        name = self.name
+        nvar = len(self._varnames)
+
+        if self.thin_walled:
+            return self._linearize_thin_walled(params, unknowns)
+
+        if self.surrogate_hit:
+            self._params2dict(params)
+            self._run_section(params)
+            self.surrogate_hit = False
+            if self.becas.success:
+                self._add_surrogate_sample(params)
+
+        outputs = ['%s:cs_props' % name, '%s:csprops_ref' % name,
+                   '%s:k_matrix' % name, '%s:m_matrix' % name,
+                   '%s:DPcoords' % name]
+        pnames = ['%s:tvec' % name, 'matprops', '%s:DPs' % name, '%s:coords' % name]
+        J = {}
+        for out in outputs:
+            for pname in pnames:
+                J[out, pname] = np.zeros((unknowns[out].size, params[pname].size))
+        if not self.becas.success:
+            return J
+
+        mesher = self.mesher
+        becas = self.becas
+        mesher_config = self.mesher_config
+        becas_config = self.becas_config
+        DPcoords = unknowns['%s:DPcoords' % name].flatten()
+        if self.gradient_mesh is not None:
+            if self._compute_gradient_section():
+                mesher = self.gradient_mesher
+                becas = self.gradient_becas
+                mesher_config = self.gradient_mesher_config
+                becas_config = self.gradient_becas_config
+                DPcoords = np.zeros((self.nr + 1, 3))
+                DPcoords[:, :2] = np.array(mesher.DPcoords)
+                DPcoords = DPcoords.flatten()
+            else:
+                print('BECAS crashed for the gradient mesh of section %f, '
+                      'using the fine mesh' % self.cs2di['s'])
+        section = becas.section
+        ref = dict(zip(outputs, [np.asarray(becas.cs_props).flatten(),
+                                 np.asarray(becas.csprops).flatten(),
+                                 np.asarray(becas.k_matrix).flatten(),
+                                 np.asarray(becas.m_matrix).flatten(),
+                                 DPcoords]))
+
+        base = dict((pname, params[pname].copy()) for pname in pnames)
+        base['failmat'] = params['failmat']
+
+        # parameters perturbed through the mesher with their step sizes
+        tvec = base['%s:tvec' % name]
+        perturbations = []
+        for i in range(nvar):
+            if tvec[i] > 0.:
+                perturbations.append(('%s:tvec' % name, i, self.fd_step))
+                perturbations.append(('%s:tvec' % name, nvar + i, self.fd_step_angle))
+        for i in range(self.nr + 1):
+            perturbations.append(('%s:DPs' % name, i, self.fd_step))
+        ni = self.ni_chord
+        for i in range(ni):
+            for j in range(2):
+                perturbations.append(('%s:coords' % name, 3 * i + j, self.fd_step))
+
+        if not self.analytic_derivatives:
+            matprops = base['matprops']
+            for k in range(matprops.size):
+                perturbations.append(('matprops', k,
+                                      self.fd_step * max(abs(matprops.flat[k]), 1.)))
+            self._linearize_fd(base, perturbations, mesher, mesher_config,
+                               becas_config, ref, J)
+            return J
+
+        # material properties are mapped directly to the rows of MATPROPS.in
+        # when the materials can be identified by their properties
+        matprops = np.atleast_2d(base['matprops'])
+        same = np.all(np.isclose(section.matprops[:, None, :], matprops[None, :, :10],
+                                 rtol=1.e-5), axis=2)
+        directions = []
+        columns = []
+        for k in range(matprops.shape[0]):
+            rows = np.nonzero(same[:, k])[0]
+            if same[:, k].sum() > 1 or same[rows].sum() > rows.shape[0]:
+                for j in range(10):
+                    perturbations.append(('matprops', k * matprops.shape[1] + j,
+                                          self.fd_step * max(abs(matprops[k, j]), 1.)))
+                continue
+            for j in range(10):
+                d = np.zeros(section.matprops.shape)
+                d[rows, j] = 1.
+                directions.append({'matprops': d})
+                columns.append(('matprops', k * matprops.shape[1] + j, None))
+
+        os.chdir(self.workdir)
+        becas_inputs = mesher.becas_inputs
+        mesher.becas_inputs = becas_inputs + '_fd'
+        try:
+            for pname, index, step in perturbations:
+                pp = dict(base)
+                pp[pname] = base[pname].copy()
+                pp[pname].flat[index] += step
+                mesher.cs2d = _params2cs2d(name, self.cs2di, nvar, pp)
+                mesher.compute(False)
+                inputs = self._load_section_inputs(mesher.path_input)
+                dDPcoords = np.zeros(DPcoords.shape[0])
+                dDPcoords.reshape(-1, 3)[:, :2] = (np.array(mesher.DPcoords) -
+                                                  DPcoords.reshape(-1, 3)[:, :2]) / step
+                if np.array_equal(inputs['nl_2d'][:, 0], section.nl_2d[:, 0]) and \
+                   np.array_equal(inputs['el_2d'], section.el_2d) and \
+                   np.array_equal(inputs['emat'][:, 1], section.emat[:, 1]):
+                    d = {'nl_2d': (inputs['nl_2d'][:, 1:3] - section.xy) / step,
+                         'emat': (inputs['emat'][:, 2:4] - section.emat[:, 2:4]) / step,
+                         'matprops': (inputs['matprops'] - section.matprops) / step}
+                    directions.append(d)
+                    columns.append((pname, index, dDPcoords))
+                else:
+                    sec = BECASNumpy(inputs['nl_2d'], inputs['el_2d'],
+                                     inputs['emat'], inputs['matprops'])
+                    sec.compute()
+                    dprops = [(sec.becas2hawc2(becas.spanpos, becas.hawc2_FPM) - ref[outputs[0]]) / step,
+                              (sec.csprops - ref[outputs[1]]) / step,
+                              (sec.Ks.flatten() - ref[outputs[2]]) / step,
+                              (sec.Ms.flatten() - ref[outputs[3]]) / step,
+                              dDPcoords]
+                    for out, dp in zip(outputs, dprops):
+                        J[out, pname][:, index] = dp
+        finally:
+            mesher.becas_inputs = becas_inputs
+            os.chdir(self.basedir)
+
+        sens = becas.compute_sensitivities(directions)
+        for k, (pname, index, dDPcoords) in enumerate(columns):
+            J['%s:cs_props' % name, pname][:, index] = sens['cs_props'][k]
+            J['%s:csprops_ref' % name, pname][:, index] = sens['csprops'][k]
+            J['%s:k_matrix' % name, pname][:, index] = sens['k_matrix'][k].flatten()
+            J['%s:m_matrix' % name, pname][:, index] = sens['m_matrix'][k].flatten()
+            if dDPcoords is not None:
+                J['%s:DPcoords' % name, pname][:, index] = dDPcoords
+        return J
+
+    def _linearize_thin_walled(self, params, unknowns):
+        """
+        forward differences of the outputs of the thin-walled beam model
+        w.r.t. tvec, matprops, DPs and coords.
+        """
+
+        name = self.name
+        nvar = len(self._varnames)
+        outputs = ['%s:cs_props' % name, '%s:csprops_ref' % name,
+                   '%s:k_matrix' % name, '%s:m_matrix' % name,
+                   '%s:DPcoords' % name]
+        pnames = ['%s:tvec' % name, 'matprops', '%s:DPs' % name, '%s:coords' % name]
+        J = {}
+        for out in outputs:
+            for pname in pnames:
+                J[out, pname] = np.zeros((unknowns[out].size, params[pname].size))
+
+        base = dict((pname, params[pname].copy()) for pname in pnames)
+        base['failmat'] = params['failmat']
+        ref = self._run_thin_walled(_params2cs2d(name, self.cs2di, nvar, base))
+        if ref is None:
+            return J
+
+        tvec = base['%s:tvec' % name]
+        perturbations = []
+        for i in range(nvar):
+            if tvec[i] > 0.:
+                perturbations.append(('%s:tvec' % name, i, self.fd_step))
+                perturbations.append(('%s:tvec' % name, nvar + i, self.fd_step_angle))
+        for i in range(self.nr + 1):
+            perturbations.append(('%s:DPs' % name, i, self.fd_step))
+        for i in range(self.ni_chord):
+            for j in range(2):
+                perturbations.append(('%s:coords' % name, 3 * i + j, self.fd_step))
+        matprops = base['matprops']
+        for k in range(matprops.size):
+            perturbations.append(('matprops', k,
+                                  self.fd_step * max(abs(matprops.flat[k]), 1.)))
+
+        for pname, index, step in perturbations:
+            pp = dict(base)
+            pp[pname] = base[pname].copy()
+            pp[pname].flat[index] += step
+            res = self._run_thin_walled(_params2cs2d(name, self.cs2di, nvar, pp))
+            if res is None:
+                continue
+            for out, value, value0 in zip(outputs, res, ref):
+                J[out, pname][:, index] = (value - value0) / step
+        return J
+
+    def _compute_gradient_section(self):
+        """
+        compute the unperturbed section on the coarse gradient mesh.
+
+        returns
+        -------
+        success: bool
+            False if the coarse section could not be computed
+        """
+
+        os.chdir(self.workdir)
+        try:
+            self.gradient_mesher.cs2d = self.cs2d
+            self.gradient_mesher.compute(self.gradient_redistribute_flag)
+            self.gradient_becas.compute()
+        except:
+            self.gradient_becas.success = False
+        finally:
+            os.chdir(self.basedir)
+        if not self.gradient_becas.success:
+            return False
+        if self.fix_mesh_distribution:
+            self.gradient_redistribute_flag = False
+        return True
+
+    def _linearize_fd(self, base, perturbations, mesher, mesher_config,
+                      becas_config, ref, J):
+        """
+        forward differences of the section outputs computed in a pool
+        of fd_workers processes, or serially without fd_workers.
+
+        Only the section itself is recomputed, meshed with the distribution
+        of the unperturbed section such that the perturbed meshes have the
+        same topology, and each worker process uses its own work directory.
+
+        parameters
+        ----------
+        base: dict
+            unperturbed params
+        perturbations: list
+            (param name, flat index, step size) of every perturbation
+        mesher: object
+            CS2DtoBECAS instance of the unperturbed section
+        mesher_config: dict
+            inputs to CS2DtoBECAS
+        becas_config: dict
+            inputs to BECASWrapper
+        ref: dict
+            flattened unperturbed outputs
+        J: dict
+            Jacobian filled in place
+        """
+
+        name = self.name
+        nvar = len(self._varnames)
+        outputs = ['%s:cs_props' % name, '%s:csprops_ref' % name,
+                   '%s:k_matrix' % name, '%s:m_matrix' % name,
+                   '%s:DPcoords' % name]
+
+        distribution = {}
+        for k in ['dist', 'dist_ni', 'iDPs', 'total_points']:
+            distribution[k] = getattr(mesher, k)
+        becas_config = dict(becas_config)
+        becas_config['analysis_mode'] = 'stiffness'
+        becas_config['plot_paraview'] = False
+        workdir = os.path.join(self.basedir, self.workdir)
+
+        tasks = []
+        for pname, index, step in perturbations:
+            pp = dict(base)
+            pp[pname] = base[pname].copy()
+            pp[pname].flat[index] += step
+            cs2d = _params2cs2d(name, self.cs2di, nvar, pp)
+            tasks.append((workdir, cs2d, mesher_config, distribution,
+                          becas_config, self.cs2di['s']))
+
+        if self.fd_workers is not None and self.fd_workers > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(self.fd_workers, len(tasks)))
+            try:
+                results = pool.map(_fd_section, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = map(_fd_section, tasks)
+        os.chdir(self.basedir)
+
+        for (pname, index, step), res in zip(perturbations, results):
+            if res is None:
+                print('BECAS crashed for perturbed section %f' % self.cs2di['s'])
+                continue
+            for out, value in zip(outputs, res):
+                J[out, pname][:, index] = (value - ref[out]) / step
+
+    def _load_section_inputs(self, path):
+        """
+        load the BECAS input files of a section with the element
+        material assignments sorted in the element order.
+        """
+
+        inputs = {}
+        inputs['nl_2d'] = np.loadtxt(os.path.join(path, 'N2D.in'))
+        inputs['el_2d'] = np.loadtxt(os.path.join(path, 'E2D.in')).astype(int)
+        emat = np.loadtxt(os.path.join(path, 'EMAT.in'))
+        order = dict(zip(emat[:, 0].astype(int), range(emat.shape[0])))
+        inputs['emat'] = emat[[order[e] for e in inputs['el_2d'][:, 0]]]
+        inputs['matprops'] = np.atleast_2d(np.loadtxt(os.path.join(path, 'MATPROPS.in')))
+        return inputs
+
+
+class BECASBladeMesher(Component):
+    """
+    Component that meshes all cross sections of the blade with CS2DtoBECAS
+    and generates the BECAS input files of every section in a single
+    shellexpander call, avoiding the per-section import and
+    parsing overhead of shellexpander.
+
+    The BECASCSStructure components of the sections only run BECAS
+    on the inputs written by this component. No derivatives pass through
+    the paths of the inputs, so BECASBeamStructure is finite differenced
+    as a whole.
+
+    parameters
+    ----------
+    matprops: array
+        material stiffness properties. Size ((10, nmat)).
+    failmat: array
+        material strength properties. Size ((18, nmat)).
+    sec_DPs: array
+        DPs of the sections. Size: ((nsec, nDP))
+    sec_coords: array
+        blade section coordinates. Size: ((nsec, ni_chord, 3))
+    sec_tvec: array
+        layer thicknesses and angles of the sections.
+        Size ((nsec, 2 * nvar))
+
+    returns
+    -------
+    sec<xxx>:DPcoords: array
+        DP coordinates of the section mesh. Size ((nDP, 3))
+    sec<xxx>:path_input: str
+        absolute path to the BECAS input files of the section
+    """
+
+    def __init__(self, becas_hash, config, st3d, ni_chord):
+        """
+        parameters
+        ----------
+        becas_hash: int
+            unique ID of the group used to name the work directory
+        config: dict
+            dictionary with inputs to CS2DtoBECAS
+        st3d: dict
+            dictionary with blade structural definition
+        ni_chord: int
+            number of points definiting the cross-section shape
+        """
+        super(BECASBladeMesher, self).__init__()
+
+        self.basedir = os.getcwd()
+        self.nsec = st3d['s'].shape[0]
+        self.nr = len(st3d['regions'])
+
+        try:
+            self.fix_mesh_distribution = config['fix_mesh_distribution']
+        except:
+            self.fix_mesh_distribution = True
+
+        self.add_param('matprops', st3d['matprops'])
+        self.add_param('failmat', st3d['failmat'])
+
+        self.secnames = []
+        self.cs2di = []
+        self.meshers = []
+        self._varnames = []
+        for i in range(self.nsec):
+            name = 'sec%03d' % i
+            self.secnames.append(name)
+            cs2di, varnames = _init_cs2d(name, st3d, st3d['s'][i])
+            self.cs2di.append(cs2di)
+            self._varnames.append(varnames)
+            self.meshers.append(CS2DtoBECAS(cs2di, **config['CS2DtoBECAS']))
+            self.add_output('%s:DPcoords' % name, np.zeros((self.nr + 1, 3)))
+            self.add_output('%s:path_input' % name, '', pass_by_obj=True)
+        self.add_param('sec_DPs', np.zeros((self.nsec, self.nr + 1)))
+        self.add_param('sec_coords', np.zeros((self.nsec, ni_chord, 3)))
+        self.add_param('sec_tvec', np.zeros((self.nsec, len(varnames)*2)))
+
+        self.workdir = 'becas_blade_%i' % becas_hash
+        self.redistribute_flag = True
+
+    def solve_nonlinear(self, params, unknowns, resids):
+        """
+        meshes all sections and calls shellexpander once for the
+        whole blade.
+        """
+
+        try:
+            os.mkdir(self.workdir)
+        except:
+            pass
+        os.chdir(self.workdir)
+
+        meshers = []
+        for i, name in enumerate(self.secnames):
+            mesher = self.meshers[i]
+            mesher.cs2d = _params2cs2d(name, self.cs2di[i], len(self._varnames[i]),
+                                       _section_params(params, i, name))
+            try:
+                mesher.compute(self.redistribute_flag, write_inputs=False)
+                meshers.append(mesher)
+            except:
+                print('CS2DtoBECAS crashed for section %f' % self.cs2di[i]['s'])
+            # sections without a mesh will fail in BECAS and fall back
+            # on their previous results
+            unknowns['%s:path_input' % name] = ''
+
+        try:
+            write_becas_inp_blade(meshers,
+                                  becas_inputs=meshers[0].becas_inputs,
+                                  dry_run=meshers[0].dry_run)
+            for mesher in meshers:
+                name = self.secnames[self.meshers.index(mesher)]
+                unknowns['%s:DPcoords' % name][:,0:2] = np.array(mesher.DPcoords)
+                unknowns['%s:path_input' % name] = os.path.join(os.getcwd(),
+                                                                mesher.path_input)
+        except:
+            print('shellexpander crashed for the blade')
+
         os.chdir(self.basedir)
         if self.fix_mesh_distribution:
             self.redistribute_flag = False
 
 
+def _interpolate_span(si, s, k_matrix, m_matrix, props):
+    """
+    interpolate the stiffness and mass matrices and the cross section
+    properties computed at a subset of the sections to other sections.
+
+    The matrices are interpolated through their Cholesky factors with
+    monotone cubic splines, which keeps them positive definite, and the
+    properties with monotone cubic splines.
+
+    parameters
+    ----------
+    si: array
+        increasing spanwise positions of the computed sections. Size (n)
+    s: array
+        spanwise positions of the sections to interpolate to. Size (nsec)
+    k_matrix: array
+        stiffness matrices of the computed sections. Size ((n, 6, 6))
+    m_matrix: array
+        mass matrices of the computed sections. Size ((n, 6, 6))
+    props: list
+        list of arrays of properties of the computed sections. Size ((n, m))
+
+    returns
+    -------
+    k_matrix: array
+        interpolated stiffness matrices. Size ((nsec, 6, 6))
+    m_matrix: array
+        interpolated mass matrices. Size ((nsec, 6, 6))
+    props: list
+        interpolated properties. Size ((nsec, m))
+    """
+
+    # the slopes of constant entries are zero divided by zero in pchip
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mats = []
+        for mat in [k_matrix, m_matrix]:
+            try:
+                L = np.linalg.cholesky(mat)
+                L = pchip_interpolate(si, L, s, axis=0)
+                mats.append(np.einsum('nij,nkj->nik', L, L))
+            except np.linalg.LinAlgError:
+                mats.append(pchip_interpolate(si, mat, s, axis=0))
+        props = [pchip_interpolate(si, p, s, axis=0) for p in props]
+    return mats[0], mats[1], props
+
+
+class BECASAdaptiveCSStructure(Component):
+    """
+    Component computing the beam structural properties of all sections
+    of the blade with BECAS at an adaptively chosen subset of the
+    sections, interpolating the properties to the remaining sections.
+
+    The stiffness and mass matrices are interpolated through their
+    Cholesky factors such that they stay positive definite, see
+    _interpolate_span. Starting from n_initial evenly spaced sections, or
+    the sections computed in the previous call, the interpolation error of
+    every interior computed section is estimated by leaving it out of the
+    interpolation. The intervals next to a section with an error larger
+    than tol are refined by computing the section in their middle, until
+    the error is below tol everywhere or all sections are computed.
+
+    Only the sections whose inputs have changed since they were last
+    computed are run again. The component is finite differenced with the
+    computed sections kept fixed, so a perturbation of the inputs of one
+    section only runs BECAS for that section, if it is computed, and the
+    derivatives are those of a fixed interpolation. When a parent group is
+    finite differenced instead the sections may still be refined between
+    the perturbations.
+
+    The outputs are those of BECASCSStructure for every section, while the
+    inputs are the stacked section arrays of Slice. Stress recovery is only possible at the computed sections.
+    """
+
+    def __init__(self, becas_hash, config, st3d, ni_chord, cs_size, cs_size_ref):
+        """
+        parameters
+        ----------
+        becas_hash: int
+            unique ID of the group used to name the work directories
+        config: dict
+            dictionary with inputs to CS2DtoBECAS and BECASWrapper, and
+            config['adaptive_span'], a dict with the optional keys
+            n_initial (default 5) and tol (default 1.e-3)
+        st3d: dict
+            dictionary with blade structural definition
+        ni_chord: int
+            number of points definiting the cross-section shape
+        cs_size: int
+            size of blade_beam_structure array (19 or 30)
+        cs_size_ref: int
+            size of blade_beam_csprops_ref array (18)
+        """
+        super(BECASAdaptiveCSStructure, self).__init__()
+
+        self.basedir = os.getcwd()
+        self.s = st3d['s']
+        self.nsec = self.s.shape[0]
+        self.nr = len(st3d['regions'])
+
+        try:
+            self.fix_mesh_distribution = config['fix_mesh_distribution']
+        except:
+            self.fix_mesh_distribution = True
+
+        self.n_initial = 5
+        self.tol = 1.e-3
+        for k, w in config['adaptive_span'].iteritems():
+            try:
+                setattr(self, k, w)
+            except:
+                pass
+
+        self.add_param('matprops', st3d['matprops'])
+        self.add_param('failmat', st3d['failmat'])
+
+        self.secnames = []
+        self.cs2di = []
+        self._varnames = []
+        self.meshers = []
+        self.becas = []
+        self.workdirs = []
+        for i in range(self.nsec):
+            name = 'sec%03d' % i
+            self.secnames.append(name)
+            cs2di, varnames = _init_cs2d(name, st3d, self.s[i])
+            self.cs2di.append(cs2di)
+            self._varnames.append(varnames)
+            self.meshers.append(CS2DtoBECAS(cs2di, **config['CS2DtoBECAS']))
+            self.becas.append(BECASWrapper(self.s[i], **config['BECASWrapper']))
+            self.workdirs.append('becas_%s_%i' % (name, becas_hash))
+            self.add_output('%s:cs_props' % name, np.zeros(cs_size))
+            self.add_output('%s:csprops_ref' % name, np.zeros(cs_size_ref))
+            self.add_output('%s:k_matrix' % name, shape=(6,6))
+            self.add_output('%s:m_matrix' % name, shape=(6,6))
+            self.add_output('%s:DPcoords' % name, np.zeros((self.nr + 1, 3)))
+            self.add_output(name + ':hash', float(becas_hash))
+        self.add_param('sec_DPs', np.zeros((self.nsec, self.nr + 1)))
+        self.add_param('sec_coords', np.zeros((self.nsec, ni_chord, 3)))
+        self.add_param('sec_tvec', np.zeros((self.nsec, len(varnames)*2)))
+
+        self.redistribute_flag = [True] * self.nsec
+        self.computed = np.unique(np.round(np.linspace(0, self.nsec - 1,
+                                  min(self.n_initial, self.nsec))).astype(int))
+        self.fd_options['force_fd'] = True
+
+        # inputs of the sections in the current call and when they were
+        # last computed or meshed, so that only changed sections are redone
+        self._section_inputs = [None] * self.nsec
+        self._computed_inputs = [None] * self.nsec
+        self._meshed_inputs = [None] * self.nsec
+        self._fd = False
+
+    def fd_jacobian(self, params, unknowns, resids, *args, **kwargs):
+        """
+        finite differences the component with the computed sections kept
+        fixed, so that every perturbation only recomputes the sections
+        whose inputs are perturbed.
+        """
+
+        self._fd = True
+        try:
+            return super(BECASAdaptiveCSStructure, self).fd_jacobian(params, unknowns, resids,
+                                                                      *args, **kwargs)
+        finally:
+            self._fd = False
+
+    def _compute_section(self, i, write_inputs=True):
+        """
+        mesh section i and compute it with BECAS, or only mesh
+        the section if write_inputs is False. Sections whose inputs
+        have not changed since they were last computed, or meshed,
+        are not redone.
+        """
+
+        inputs = self._section_inputs[i]
+        last = self._computed_inputs if write_inputs else self._meshed_inputs
+        if last[i] is not None and \
+           all(np.array_equal(last[i][k], v) for k, v in inputs.iteritems()):
+            return True
+
+        try:
+            os.mkdir(self.workdirs[i])
+        except:
+            pass
+        os.chdir(self.workdirs[i])
+        success = False
+        try:
+            self.meshers[i].compute(self.redistribute_flag[i], write_inputs=write_inputs)
+            if self.fix_mesh_distribution:
+                self.redistribute_flag[i] = False
+            if write_inputs:
+                self.becas[i].compute()
+                success = self.becas[i].success
+            else:
+                success = True
+        except:
+            pass
+        os.chdir(self.basedir)
+        last[i] = dict((k, np.array(v)) for k, v in inputs.iteritems()) if success else None
+        # computing a section also meshes it
+        self._meshed_inputs[i] = last[i]
+        if write_inputs and not success:
+            print('BECAS crashed for section %f' % self.s[i])
+        return success
+
+    def _loo_errors(self, idx):
+        """
+        relative leave-one-out interpolation errors of the stiffness and
+        mass matrices of the interior computed sections.
+        """
+
+        errors = np.zeros(idx.shape[0])
+        if idx.shape[0] < 3:
+            return errors
+        K = np.array([self.becas[i].k_matrix for i in idx])
+        M = np.array([self.becas[i].m_matrix for i in idx])
+        for j in range(1, idx.shape[0] - 1):
+            others = np.delete(np.arange(idx.shape[0]), j)
+            Ki, Mi, _ = _interpolate_span(self.s[idx[others]], self.s[idx[[j]]],
+                                          K[others], M[others], [])
+            Ki = Ki[0]
+            Mi = Mi[0]
+            errors[j] = max(np.linalg.norm(Ki - K[j]) / np.linalg.norm(K[j]),
+                            np.linalg.norm(Mi - M[j]) / np.linalg.norm(M[j]))
+        return errors
+
+    def solve_nonlinear(self, params, unknowns, resids):
+        """
+        computes the sections adaptively and interpolates the
+        properties to the remaining sections.
+        """
+
+        for i, name in enumerate(self.secnames):
+            self._section_inputs[i] = _section_params(params, i, name)
+            self.meshers[i].cs2d = _params2cs2d(name, self.cs2di[i], len(self._varnames[i]),
+                                                self._section_inputs[i])
+
+        done = {}
+        pending = list(self.computed)
+        while len(pending) > 0:
+            for i in pending:
+                done[i] = self._compute_section(i)
+            if self._fd:
+                # the perturbations must not change the computed sections
+                break
+            idx = np.array(sorted([i for i in done if done[i]]))
+            errors = self._loo_errors(idx)
+            pending = []
+            for j in np.nonzero(errors > self.tol)[0]:
+                for a, b in [(idx[j - 1], idx[j]), (idx[j], idx[j + 1])]:
+                    mid = (a + b) // 2
+                    if mid not in done and mid not in pending and mid != a:
+                        pending.append(mid)
+        idx = np.array(sorted([i for i in done if done[i]]))
+        if idx.shape[0] < 2:
+            print('BECAS crashed for too many sections to interpolate')
+            return
+        if not self._fd:
+            self.computed = idx
+
+        K = np.array([self.becas[i].k_matrix for i in idx])
+        M = np.array([self.becas[i].m_matrix for i in idx])
+        props = [np.array([self.becas[i].cs_props for i in idx]),
+                 np.array([self.becas[i].csprops for i in idx])]
+        K, M, props = _interpolate_span(self.s[idx], self.s, K, M, props)
+        for i, name in enumerate(self.secnames):
+            if i not in done:
+                self._compute_section(i, write_inputs=False)
+            unknowns['%s:DPcoords' % name][:, 0:2] = np.array(self.meshers[i].DPcoords)
+            if i in idx:
+                becas = self.becas[i]
+                unknowns['%s:cs_props' % name] = becas.cs_props
+                unknowns['%s:csprops_ref' % name] = becas.csprops
+                unknowns['%s:k_matrix' % name] = becas.k_matrix
+                unknowns['%s:m_matrix' % name] = becas.m_matrix
+            else:
+                unknowns['%s:cs_props' % name] = props[0][i]
+                unknowns['%s:csprops_ref' % name] = props[1][i]
+                unknowns['%s:k_matrix' % name] = K[i]
+                unknowns['%s:m_matrix' % name] = M[i]
+
+
 class Slice(Component):
     """
     simple component for slicing arrays into vectors
@@ -265,10 +1330,20 @@ class Slice(Component):
 
     returns
     -------
-    sec<xxx>DPs: array
-        Vector of DPs along chord for each section. Size (nDP)
-    sec<xxx>coords: array
-        Array of cross section coords shapes. Size ((ni_chord, 3))
+    sec_DPs: array
+        DPs along chord of the sections. Size ((nsec, nDP))
+    sec_coords: array
+        cross section coords shapes of the sections.
+        Size ((nsec, ni_chord, 3))
+    sec_tvec: array
+        layer thicknesses followed by the layer angles of the sections.
+        Size ((nsec, 2 * nvar))
+
+    The sections are passed as a few stacked arrays rather than as
+    variables per section, which keeps the number of variables and the
+    setup time of the problem small. The section components are
+    connected to their rows with src_indices, see section_src_indices,
+    and components handling all sections read the rows as views.
     """
 
     def __init__(self, st3d, sdim):
@@ -307,24 +1382,311 @@ class Slice(Component):
                 self.add_param(varname + 'A', np.zeros(self.nsec))
                 self._varnames.append(varname)
 
-        for i in range(self.nsec):
-            self.add_output('sec%03d:DPs' % i, DPs[i, :])
-            self.add_output('sec%03d:coords' % i, np.zeros((sdim[0], sdim[2])))
-            self.add_output('sec%03d:tvec' % i, np.zeros(len(self._varnames)*2))
+        self.add_output('sec_DPs', DPs.copy())
+        self.add_output('sec_coords', np.zeros((self.nsec, sdim[0], sdim[2])))
+        self.add_output('sec_tvec', np.zeros((self.nsec, len(self._varnames)*2)))
 
     def solve_nonlinear(self, params, unknowns, resids):
 
         nvar = len(self._varnames)
+        DPs = unknowns['sec_DPs']
+        for j in range(self.nDP):
+            DPs[:, j] = params['DP%02d' % j]
+        unknowns['sec_coords'] = params['blade_surface_norm_st'].swapaxes(0, 1) * \
+                                 params['blade_length']
+        tvec = unknowns['sec_tvec']
+        for ii, name in enumerate(self._varnames):
+            tvec[:, ii] = params[name + 'T']
+            tvec[:, nvar+ii] = params[name + 'A']
+
+
+def section_src_indices(i, shape):
+    """
+    flat indices of the row of a section in one of the stacked
+    section arrays of Slice.
+
+    parameters
+    ----------
+    i: int
+        section index
+    shape: tuple
+        shape of the stacked array, with the sections along the first axis
+
+    returns
+    -------
+    src_indices: array
+        indices to connect the section variable with
+    """
+
+    n = int(np.prod(shape[1:]))
+    return np.arange(i * n, (i + 1) * n)
+
+
+def _section_params(params, i, name):
+    """
+    params of a section as views into the stacked section arrays,
+    in the format used by _params2cs2d.
+    """
+
+    p = {}
+    p['matprops'] = params['matprops']
+    p['failmat'] = params['failmat']
+    p['%s:DPs' % name] = params['sec_DPs'][i]
+    p['%s:coords' % name] = params['sec_coords'][i]
+    p['%s:tvec' % name] = params['sec_tvec'][i]
+    return p
+
+
+class BladeLayupMass(Component):
+    """
+    component for computing the mass distribution, the section mass
+    centers and the blade mass and mass moment directly from the layup
+    and the geometry, with exact derivatives.
+
+    The mass per unit length of a section is the sum over the regions
+    and webs of the wall length times the sum of the ply thicknesses
+    times their densities, where the regions follow the outer surface
+    between their DPs and the webs are straight lines between the DPs
+    they are attached to, see wall_geometry. The curvature of the walls
+    is neglected, so the mass is slightly larger than that of the
+    BECAS section.
+
+    parameters
+    ----------
+    matprops: array
+        material stiffness properties. Size ((nmat, 10)).
+    sec_DPs: array
+        DPs of the sections. Size ((nsec, nDP))
+    sec_coords: array
+        blade section coordinates. Size ((nsec, ni_chord, 3))
+    sec_tvec: array
+        layer thicknesses and angles of the sections. Size ((nsec, 2 * nvar))
+    x_st: array
+        non-dimensionalised x-coordinate of blade axis in structural grid
+    y_st: array
+        non-dimensionalised y-coordinate of blade axis in structural grid
+    z_st: array
+        non-dimensionalised z-coordinate of blade axis in structural grid
+    blade_length: float
+        dimensionalised blade length
+    hub_radius: float
+        dimensionalised hub length
+
+    returns
+    -------
+    blade_dm: array
+        mass per unit length of the sections. Size (nsec)
+    blade_cm: array
+        mass centers of the sections in the section coordinates.
+        Size ((nsec, 2))
+    blade_mass: float
+        blade mass integrated from blade_dm
+    blade_mass_moment: float
+        blade mass moment integrated from blade_dm
+    """
+
+    def __init__(self, st3d, sdim):
+        """
+        parameters
+        ----------
+        st3d: dict
+            dictionary with blade structural definition
+        sdim: array
+            blade surface. Size: ((ni_chord, nsec, 3))
+        """
+        super(BladeLayupMass, self).__init__()
+
+        self.nsec = sdim[1]
+        self.ni_chord = sdim[0]
+        self.nr = len(st3d['regions'])
+        self.web_def = st3d['web_def']
+
+        # wall and material of each layer variable, ordered as in tvec
+        walls = []
+        mats = []
+        for ireg, reg in enumerate(st3d['regions']):
+            for lname in reg['layers']:
+                walls.append(ireg)
+                mats.append(st3d['materials'][lname[:-2]])
+        for ireg, reg in enumerate(st3d['webs']):
+            for lname in reg['layers']:
+                walls.append(self.nr + ireg)
+                mats.append(st3d['materials'][lname[:-2]])
+        self.walls = np.array(walls, dtype=int)
+        self.mats = np.array(mats, dtype=int)
+        self.nvar = len(walls)
+        self.nwall = self.nr + len(st3d['webs'])
+
+        self.add_param('matprops', st3d['matprops'])
+        self.add_param('sec_DPs', np.zeros((self.nsec, self.nr + 1)))
+        self.add_param('sec_coords', np.zeros((self.nsec, sdim[0], 3)))
+        self.add_param('sec_tvec', np.zeros((self.nsec, self.nvar * 2)))
+        self.add_param('x_st', np.zeros(self.nsec), units='m',
+            desc='non-dimensionalised x-coordinate of blade axis in structural grid')
+        self.add_param('y_st', np.zeros(self.nsec), units='m',
+            desc='non-dimensionalised y-coordinate of blade axis in structural grid')
+        self.add_param('z_st', np.zeros(self.nsec), units='m',
+            desc='non-dimensionalised y-coordinate of blade axis in structural grid')
+        self.add_param('hub_radius', 0., units='m', desc='Hub length')
+        self.add_param('blade_length', 0., units='m', desc='Blade length')
+
+        self.add_output('blade_dm', np.zeros(self.nsec), desc='Mass per unit length')
+        self.add_output('blade_cm', np.zeros((self.nsec, 2)), desc='Section mass centers')
+        self.add_output('blade_mass', 0., units='kg', desc='Blade mass')
+        self.add_output('blade_mass_moment', 0., units='N*m',
+            desc='Blade mass moment')
+
+    def _sections(self, params):
+        """
+        mass per unit length and mass centers of the sections and their
+        derivatives w.r.t. the geometry, the thicknesses and the densities.
+        """
+
+        rho = np.atleast_2d(params['matprops'])[self.mats, 9]
+        self._dm = np.zeros(self.nsec)
+        self._cm = np.zeros((self.nsec, 2))
+        self._ddm = []
+        self._dcm = []
         for i in range(self.nsec):
-            DPs = np.zeros(self.nDP)
-            for j in range(self.nDP):
-                DPs[j] = params['DP%02d' % j][i]
-            unknowns['sec%03d:DPs' % i] = DPs
-            unknowns['sec%03d:coords' % i] = params['blade_surface_norm_st'][:, i, :] * \
-                                             params['blade_length']
-            for ii, name in enumerate(self._varnames):
-                unknowns['sec%03d:tvec' % i][ii] = params[name + 'T'][i]
-                unknowns['sec%03d:tvec' % i][nvar+ii] = params[name + 'A'][i]
+            t = params['sec_tvec'][i, :self.nvar]
+            length, moment, dlength, dmoment = wall_geometry(params['sec_coords'][i],
+                                                             params['sec_DPs'][i],
+                                                             self.web_def)
+            # mass per unit length of the walls
+            mu = np.bincount(self.walls, weights=t * rho, minlength=self.nwall)
+            dm = np.dot(mu, length)
+            S = np.dot(mu, moment)
+            # sections without plies have no mass center
+            dm = max(dm, 1.e-20)
+            cm = S / dm
+            self._dm[i] = dm
+            self._cm[i] = cm
+
+            d = {}
+            d['geom'] = np.dot(mu, dlength)
+            d['t'] = rho * length[self.walls]
+            d['rho'] = t * length[self.walls]
+            dS = {}
+            dS['geom'] = np.einsum('w,wjk->jk', mu, dmoment)
+            dS['t'] = (rho * moment[self.walls].T)
+            dS['rho'] = (t * moment[self.walls].T)
+            dc = {}
+            for k in d.keys():
+                dc[k] = (dS[k] - np.outer(cm, d[k])) / dm
+            self._ddm.append(d)
+            self._dcm.append(dc)
+
+    def _span(self, params):
+
+        L = params['blade_length']
+        r = np.array([params['x_st'], params['y_st'], params['z_st']]).T
+        dr = np.diff(r, axis=0)
+        h = np.sqrt((dr**2).sum(axis=1))
+        return L, r, dr, h
+
+    def solve_nonlinear(self, params, unknowns, resids):
+        """
+        compute the mass per unit length of the sections and
+        integrate the mass and mass moment using the trapezoidal rule.
+        """
+
+        self._sections(params)
+        L, r, dr, h = self._span(params)
+        dm = self._dm
+        g = 9.81
+        f = g * dm * (r[:, 2] * L + params['hub_radius'])
+
+        unknowns['blade_dm'] = dm
+        unknowns['blade_cm'] = self._cm
+        unknowns['blade_mass'] = np.sum(0.5 * (dm[:-1] + dm[1:]) * h * L)
+        unknowns['blade_mass_moment'] = np.sum(0.5 * (f[:-1] + f[1:]) * h * L)
+
+    def linearize(self, params, unknowns, resids):
+        """
+        exact derivatives of the outputs w.r.t. the layup, the materials
+        and the geometry.
+        """
+
+        nsec = self.nsec
+        nDP = self.nr + 1
+        ni = self.ni_chord
+        g = 9.81
+        self._sections(params)
+        L, r, dr, h = self._span(params)
+        dm = self._dm
+        hub = params['hub_radius']
+        zz = r[:, 2] * L + hub
+        f = g * dm * zz
+
+        # trapezoidal weights of the sections
+        wt = np.zeros(nsec)
+        wt[:-1] += 0.5 * h * L
+        wt[1:] += 0.5 * h * L
+
+        J = {}
+        matprops = np.atleast_2d(params['matprops'])
+        for out in ['blade_dm', 'blade_cm', 'blade_mass', 'blade_mass_moment']:
+            for pname in ['matprops', 'sec_DPs', 'sec_coords', 'sec_tvec']:
+                J[out, pname] = np.zeros((unknowns[out].size, params[pname].size))
+        drho = np.zeros((self.nvar, matprops.size))
+        drho[np.arange(self.nvar), self.mats * matprops.shape[1] + 9] = 1.
+        ntvec = 2 * self.nvar
+
+        for i in range(nsec):
+            d = self._ddm[i]
+            dc = self._dcm[i]
+            # coords are given in 3D, the z-coordinate has no influence
+            geom = np.zeros((3, 3 * ni + nDP))
+            idx = np.append(np.arange(3 * ni).reshape(ni, 3)[:, :2].flatten(),
+                            3 * ni + np.arange(nDP))
+            geom[0, idx] = d['geom']
+            geom[1:, idx] = dc['geom']
+            dout = {}
+            dout['blade_dm'] = np.zeros((nsec, 1))
+            dout['blade_dm'][i] = 1.
+            dout['blade_cm'] = np.zeros((nsec * 2, 2))
+            dout['blade_cm'][2 * i:2 * i + 2] = np.eye(2)
+            dout['blade_mass'] = np.array([[wt[i]]])
+            dout['blade_mass_moment'] = np.array([[g * zz[i] * wt[i]]])
+            for out, dd in dout.iteritems():
+                if out == 'blade_cm':
+                    rows = np.dot(dd, geom[1:])
+                    tt = np.dot(dd, dc['t'])
+                    rr = np.dot(dd, dc['rho'])
+                else:
+                    rows = np.dot(dd, geom[:1])
+                    tt = np.dot(dd, d['t'][None, :])
+                    rr = np.dot(dd, d['rho'][None, :])
+                J[out, 'sec_DPs'][:, i * nDP:(i + 1) * nDP] = rows[:, 3 * ni:]
+                J[out, 'sec_coords'][:, i * 3 * ni:(i + 1) * 3 * ni] = rows[:, :3 * ni]
+                J[out, 'sec_tvec'][:, i * ntvec:i * ntvec + self.nvar] = tt
+                J[out, 'matprops'] += np.dot(rr, drho)
+
+        # derivatives w.r.t. the blade axis
+        e = dr / np.maximum(h, 1.e-20)[:, None]
+        dmass = np.zeros((3, nsec))
+        dmm = np.zeros((3, nsec))
+        for j in range(3):
+            dh = np.zeros((nsec - 1, nsec))
+            dh[np.arange(nsec - 1), np.arange(nsec - 1)] = -e[:, j]
+            dh[np.arange(nsec - 1), np.arange(1, nsec)] = e[:, j]
+            dmass[j] = np.dot(0.5 * (dm[:-1] + dm[1:]) * L, dh)
+            dmm[j] = np.dot(0.5 * (f[:-1] + f[1:]) * L, dh)
+        dmm[2] += g * dm * wt * L
+        for j, pname in enumerate(['x_st', 'y_st', 'z_st']):
+            J['blade_mass', pname] = dmass[j][None, :]
+            J['blade_mass_moment', pname] = dmm[j][None, :]
+            J['blade_dm', pname] = np.zeros((nsec, nsec))
+            J['blade_cm', pname] = np.zeros((nsec * 2, nsec))
+        J['blade_mass', 'blade_length'] = np.array([[np.sum(0.5 * (dm[:-1] + dm[1:]) * h)]])
+        J['blade_mass_moment', 'blade_length'] = np.array([[np.sum(0.5 * (f[:-1] + f[1:]) * h) +
+                                                            np.sum(g * dm * wt * r[:, 2])]])
+        J['blade_mass_moment', 'hub_radius'] = np.array([[np.sum(g * dm * wt)]])
+        J['blade_mass', 'hub_radius'] = np.zeros((1, 1))
+        for out in ['blade_dm', 'blade_cm']:
+            J[out, 'blade_length'] = np.zeros((unknowns[out].size, 1))
+            J[out, 'hub_radius'] = np.zeros((unknowns[out].size, 1))
+        return J
 
 
 class PostprocessCS(Component):
@@ -357,6 +1719,17 @@ class PostprocessCS(Component):
         blade mass integrated from dm in beam properties
     blade_mass_moment: float
         blade mass moment integrated from dm in beam properties
+    KStruct: array
+        stiffness matrices w.r.t. the BECAS reference point. Size ((6, 6, nsec))
+    MStruct: array
+        mass matrices w.r.t. the BECAS reference point. Size ((6, 6, nsec))
+    KStruct_ref: array
+        stiffness matrices w.r.t. half chord, as the positions in
+        blade_beam_structure, in the coordinate system rotated by
+        rot_z_st. Size ((6, 6, nsec))
+    MStruct_ref: array
+        mass matrices w.r.t. half chord in the coordinate system
+        rotated by rot_z_st. Size ((6, 6, nsec))
     """
 
     def __init__(self, nsec, cs_size, cs_size_ref):
@@ -396,6 +1769,8 @@ class PostprocessCS(Component):
             desc='blade chord distribution in structural grid')
         self.add_param('p_le_st', np.zeros(nsec), units='m',
             desc='blade pitch axis aft leading edge in structural grid')
+        self.add_param('rot_z_st', np.zeros(nsec), units='deg',
+            desc='blade twist in structural grid')
 
 
         self.add_output('blade_beam_structure', np.zeros((nsec, cs_size)),
@@ -407,6 +1782,8 @@ class PostprocessCS(Component):
             desc='Blade mass moment')
         self.add_output('MStruct', shape=(6,6,nsec))
         self.add_output('KStruct', shape=(6,6,nsec))
+        self.add_output('MStruct_ref', shape=(6,6,nsec))
+        self.add_output('KStruct_ref', shape=(6,6,nsec))
 
     def solve_nonlinear(self, params, unknowns, resids):
         """
@@ -453,6 +1830,15 @@ class PostprocessCS(Component):
             unknowns['KStruct'][:,:,i] = params['k_matrix%03d' % i]
             unknowns['MStruct'][:,:,i] = params['m_matrix%03d' % i]
 
+        # stiffness and mass matrices w.r.t. half chord and rotated by the twist,
+        # which only depend on the planform and need no new BECAS runs
+        x0 = -(0.5 - params['p_le_st']) * params['chord_st'] * params['blade_length']
+        K, M = transform_beam_matrices(unknowns['KStruct'].transpose(2, 0, 1),
+                                       unknowns['MStruct'].transpose(2, 0, 1),
+                                       x0, np.zeros(self.nsec), np.radians(params['rot_z_st']))
+        unknowns['KStruct_ref'] = K.transpose(1, 2, 0)
+        unknowns['MStruct_ref'] = M.transpose(1, 2, 0)
+
 
 class BECASBeamStructure(Group):
     """
@@ -477,17 +1863,15 @@ class BECASBeamStructure(Group):
         material stiffness properties. Size (10, nmat).
     failmat: array
         material strength properties. Size (18, nmat).
-    sec<xx>DPs: array
-        2D array of DPs. Size: ((nsec, nDP))
-    sec<xx>coords: array
-        blade surface. Size: ((ni_chord, nsec, 3))
-    sec<xx>r<yy><lname>T: array
+    DP<xx>: array
+        arrays of DPs along span. Size: (nsec)
+    r<yy><lname>T: array
         region layer thicknesses, e.g. r01triaxT. Size (nsec)
-    sec<xx>r<yy><lname>A: array
+    r<yy><lname>A: array
         region layer angles, e.g. r01triaxA. Size (nsec)
-    sec<xx>w<yy><lname>T: array
+    w<yy><lname>T: array
         web layer thicknesses, e.g. r01triaxT. Size (nsec)
-    sec<xx>w<yy><lname>A: array
+    w<yy><lname>A: array
         web layer angles, e.g. r01triaxA. Size (nsec)
 
     returns
@@ -495,9 +1879,17 @@ class BECASBeamStructure(Group):
     blade_beam_structure: array
         array of beam structure properties. Size ((nsec, 19)).
     blade_mass: float
-        blade mass integrated from blade_beam_structure dm
+        blade mass integrated from blade_beam_structure dm, or from
+        blade_dm with config['layup_mass']
     blade_mass_moment: float
-        blade mass moment integrated from blade_beam_structure dm
+        blade mass moment integrated from blade_beam_structure dm, or from
+        blade_dm with config['layup_mass']
+    blade_dm: array
+        mass per unit length computed from the layup with
+        config['layup_mass']. Size (nsec)
+    blade_cm: array
+        section mass centers computed from the layup with
+        config['layup_mass']. Size ((nsec, 2))
     blade_beam_csprops_ref: array
         array of beam cs properties. Size ((nsec, 18)).
     KStruct: array size (6,6,nsec)
@@ -575,13 +1967,45 @@ class BECASBeamStructure(Group):
                 varname = 'w%02d%s' % (ireg, lname)
                 self._varnames.append(varname)
 
-        # # now add a component for each section
-        par = self.add('par', ParallelGroup(), promotes=['*'])
-
-        for i in range(nsec):
-            secname = 'sec%03d' % i
-            par.add(secname, BECASCSStructure(secname, self.__hash__(), config, st3d,
-                                              st3d['s'][i], sdim[0], cs_size, cs_size_ref), promotes=['*'])
+        # mesh all sections with a single shellexpander call
+        try:
+            blade_mesh = config['blade_mesh']
+        except:
+            blade_mesh = False
+        if blade_mesh:
+            self.add('mesher', BECASBladeMesher(self.__hash__(), config, st3d, sdim[0]),
+                     promotes=['*'])
+            # the sections only see the path of the inputs written by the
+            # mesher, so the derivatives w.r.t. the layup and shape can only
+            # be finite differenced through the mesher and the sections together
+            self.fd_options['force_fd'] = True
+
+        # compute an adaptively chosen subset of the sections
+        # and interpolate the properties to the others
+        try:
+            adaptive_span = config['adaptive_span']
+        except:
+            adaptive_span = None
+        if adaptive_span is not None and not blade_mesh:
+            self.add('adaptive', BECASAdaptiveCSStructure(self.__hash__(), config, st3d,
+                                                          sdim[0], cs_size, cs_size_ref),
+                     promotes=['*'])
+        else:
+            # # now add a component for each section
+            par = self.add('par', ParallelGroup(), promotes=['*'])
+
+            nvar = len(self._varnames)
+            for i in range(nsec):
+                secname = 'sec%03d' % i
+                par.add(secname, BECASCSStructure(secname, self.__hash__(), config, st3d,
+                                                  st3d['s'][i], sdim[0], cs_size, cs_size_ref), promotes=['*'])
+                # the sections read their rows of the stacked section arrays
+                self.connect('sec_DPs', '%s:DPs' % secname,
+                             src_indices=section_src_indices(i, (nsec, nr + 1)))
+                self.connect('sec_coords', '%s:coords' % secname,
+                             src_indices=section_src_indices(i, (nsec, sdim[0], 3)))
+                self.connect('sec_tvec', '%s:tvec' % secname,
+                             src_indices=section_src_indices(i, (nsec, nvar * 2)))
 
         promotions = ['hub_radius',
                       'blade_length',
@@ -590,12 +2014,24 @@ class BECASBeamStructure(Group):
                       'z_st',
                       'chord_st',
                       'p_le_st',
+                      'rot_z_st',
                       'blade_beam_structure',
                       'blade_beam_csprops_ref',
-                      'blade_mass',
-                      'blade_mass_moment',
                       'KStruct',
-                      'MStruct']
+                      'MStruct',
+                      'KStruct_ref',
+                      'MStruct_ref']
+
+        # compute the blade mass directly from the layup and geometry
+        # instead of integrating the BECAS mass distribution
+        try:
+            layup_mass = config['layup_mass']
+        except:
+            layup_mass = False
+        if layup_mass:
+            self.add('layup_mass', BladeLayupMass(st3d, sdim), promotes=['*'])
+        else:
+            promotions.extend(['blade_mass', 'blade_mass_moment'])
         self.add('postpro', PostprocessCS(nsec, cs_size, cs_size_ref), promotes=promotions)
         for i in range(nsec):
             secname = 'sec%03d' % i
@@ -0,0 +1,1262 @@
+
+__all__ = ['BECASNumpy', 'check_failure']
+
+import copy
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spla
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+from loadcases import miner_damage
+
+# strain component ordering used by BECAS:
+# eps_11 eps_22 gamma_12 gamma_13 gamma_23 eps_33
+_strain_pairs = [(0, 0), (1, 1), (0, 1), (0, 2), (1, 2), (2, 2)]
+
+
+def gauss_points(n):
+    """
+    Gauss points and weights of an n x n integration rule on
+    the square [-1, 1] x [-1, 1].
+
+    returns
+    -------
+    xi: array
+        first natural coordinate of the points. Size (n*n)
+    eta: array
+        second natural coordinate of the points. Size (n*n)
+    w: array
+        integration weights. Size (n*n)
+    """
+    p, w = np.polynomial.legendre.leggauss(n)
+    xi, eta = np.meshgrid(p, p, indexing='ij')
+    ww = np.outer(w, w)
+    return xi.flatten(), eta.flatten(), ww.flatten()
+
+
+def shape_functions(nnpe, xi, eta):
+    """
+    Shape functions and their derivatives in natural coordinates
+    of the Quad4 and Quad8 elements used in BECAS.
+
+    The node ordering follows BECAS: corner nodes 1-4 counter-clockwise
+    followed by the mid-side nodes 5-8 on the sides 1-2, 2-3, 3-4, 4-1.
+
+    parameters
+    ----------
+    nnpe: int
+        number of nodes per element, 4 or 8
+    xi: float
+        first natural coordinate
+    eta: float
+        second natural coordinate
+
+    returns
+    -------
+    N: array
+        shape functions. Size (nnpe)
+    dN: array
+        derivatives of the shape functions w.r.t. xi and eta. Size ((2, nnpe))
+    """
+    xs = np.array([-1., 1., 1., -1.])
+    es = np.array([-1., -1., 1., 1.])
+    if nnpe == 4:
+        N = 0.25 * (1. + xi * xs) * (1. + eta * es)
+        dN = np.array([0.25 * xs * (1. + eta * es),
+                       0.25 * es * (1. + xi * xs)])
+    elif nnpe == 8:
+        N = np.zeros(8)
+        dN = np.zeros((2, 8))
+        # corner nodes
+        N[:4] = 0.25 * (1. + xi * xs) * (1. + eta * es) * (xi * xs + eta * es - 1.)
+        dN[0, :4] = 0.25 * xs * (1. + eta * es) * (2. * xi * xs + eta * es)
+        dN[1, :4] = 0.25 * es * (1. + xi * xs) * (xi * xs + 2. * eta * es)
+        # mid-side nodes on the sides eta = -1 and eta = 1
+        for i, e in [(4, -1.), (6, 1.)]:
+            N[i] = 0.5 * (1. - xi**2) * (1. + eta * e)
+            dN[0, i] = -xi * (1. + eta * e)
+            dN[1, i] = 0.5 * (1. - xi**2) * e
+        # mid-side nodes on the sides xi = 1 and xi = -1
+        for i, x in [(5, 1.), (7, -1.)]:
+            N[i] = 0.5 * (1. + xi * x) * (1. - eta**2)
+            dN[0, i] = 0.5 * x * (1. - eta**2)
+            dN[1, i] = -eta * (1. + xi * x)
+    else:
+        raise ValueError('Only Quad4 and Quad8 elements are supported')
+    return N, dN
+
+
+def material_constitutive(matprops):
+    """
+    Constitutive matrices of orthotropic materials in the material
+    coordinate system using the BECAS strain ordering.
+
+    parameters
+    ----------
+    matprops: array
+        material properties E11 E22 E33 G12 G13 G23 nu12 nu13 nu23 rho.
+        Size ((nmat, 10))
+
+    returns
+    -------
+    Q: array
+        constitutive matrices. Size ((nmat, 6, 6))
+    """
+    matprops = np.atleast_2d(matprops)
+    E1, E2, E3, G12, G13, G23, nu12, nu13, nu23 = matprops[:, :9].T
+    S = np.zeros((matprops.shape[0], 6, 6))
+    S[:, 0, 0] = 1. / E1
+    S[:, 1, 1] = 1. / E2
+    S[:, 5, 5] = 1. / E3
+    S[:, 0, 1] = S[:, 1, 0] = -nu12 / E1
+    S[:, 0, 5] = S[:, 5, 0] = -nu13 / E1
+    S[:, 1, 5] = S[:, 5, 1] = -nu23 / E2
+    S[:, 2, 2] = 1. / G12
+    S[:, 3, 3] = 1. / G13
+    S[:, 4, 4] = 1. / G23
+    return np.linalg.inv(S)
+
+
+def material_rotation(fiber_angle, fiberplane_angle):
+    """
+    Strain transformation matrices from the cross section coordinate
+    system to the material coordinate systems of the elements.
+
+    The material 1-axis is rotated by the fiber angle from the beam axis
+    towards the tangent of the fiber plane, the 3-axis is normal to
+    the fiber plane, which is rotated by the fiber plane angle
+    about the beam axis.
+
+    parameters
+    ----------
+    fiber_angle: array
+        fiber angles in degrees. Size (ne)
+    fiberplane_angle: array
+        fiber plane angles in degrees. Size (ne)
+
+    returns
+    -------
+    T: array
+        strain transformation matrices, eps_material = T eps_global.
+        Size ((ne, 6, 6))
+    """
+    a = np.radians(fiber_angle)
+    b = np.radians(fiberplane_angle)
+    ne = a.shape[0]
+    ez = np.zeros((ne, 3))
+    ez[:, 2] = 1.
+    t = np.array([np.cos(b), np.sin(b), np.zeros(ne)]).T
+    n = np.array([-np.sin(b), np.cos(b), np.zeros(ne)]).T
+    e1 = np.cos(a)[:, None] * ez + np.sin(a)[:, None] * t
+    e2 = -np.sin(a)[:, None] * ez + np.cos(a)[:, None] * t
+    # rows are the material axes expressed in the global system
+    R = np.array([e1, e2, n]).transpose(1, 0, 2)
+
+    T = np.zeros((ne, 6, 6))
+    for p, (k, l) in enumerate(_strain_pairs):
+        # material strains of a unit global strain component
+        if k == l:
+            em = R[:, :, k, None] * R[:, None, :, k]
+        else:
+            em = 0.5 * (R[:, :, k, None] * R[:, None, :, l] +
+                        R[:, :, l, None] * R[:, None, :, k])
+        for q, (i, j) in enumerate(_strain_pairs):
+            if i == j:
+                T[:, q, p] = em[:, i, j]
+            else:
+                T[:, q, p] = 2. * em[:, i, j]
+    return T
+
+
+def transform_matrix(x0, y0, alpha):
+    """
+    Transformation matrix of a 6x6 cross section stiffness matrix
+    to a coordinate system translated to (x0, y0) and rotated by alpha.
+
+    The transformed stiffness matrix is T^T K T.
+
+    parameters
+    ----------
+    x0: float
+        x-coordinate of the new origin
+    y0: float
+        y-coordinate of the new origin
+    alpha: float
+        rotation angle in radians
+
+    returns
+    -------
+    T: array
+        transformation matrix. Size ((6, 6))
+    """
+    Tt = np.eye(6)
+    Tt[0, 5] = y0
+    Tt[1, 5] = -x0
+    Tt[2, 3] = -y0
+    Tt[2, 4] = x0
+    c = np.cos(alpha)
+    s = np.sin(alpha)
+    Tr = np.eye(6)
+    Tr[0:2, 0:2] = [[c, -s], [s, c]]
+    Tr[3:5, 3:5] = [[c, -s], [s, c]]
+    return np.dot(Tt, Tr)
+
+
+def principal_angle(K):
+    """
+    Angle in radians of the principal bending axes of a stiffness matrix.
+    """
+    return 0.5 * np.arctan2(-2. * K[3, 4], K[4, 4] - K[3, 3])
+
+
+def check_failure(failmat, stress, strain):
+    """
+    Failure indices of the elements in the BECAS failure output format
+    with six values per element.
+
+    The failure criteria are selected per element with the criterion id:
+
+    1: maximum strain, ratio of each strain component to its limit
+    2: maximum stress, ratio of each stress component to its limit
+    3: Tsai-Wu, failure index in the first column and zeros in the others
+
+    For the normal components the tensile or compressive limit
+    is used depending on the sign of the component.
+
+    parameters
+    ----------
+    failmat: array
+        criterion id followed by the 18 limits st11 st22 st33 s12 s13 s23
+        sc11 sc22 sc33 et11 et22 et33 e12 e13 e23 ec11 ec22 ec33 of the
+        material of each element. Size ((ne, 19))
+    stress: array
+        stresses in the material coordinate systems. Size ((..., ne, 6))
+    strain: array
+        strains in the material coordinate systems. Size ((..., ne, 6))
+
+    returns
+    -------
+    failure: array
+        failure indices. Size ((..., ne, 6))
+    """
+    failmat = np.atleast_2d(failmat)
+    crit = failmat[:, 0].astype(int)
+    # limit indices of the BECAS strain ordering 11 22 12 13 23 33
+    tens = np.array([0, 1, 3, 4, 5, 2])
+    comp = np.array([6, 7, 3, 4, 5, 8])
+
+    failure = np.zeros(np.broadcast(stress, strain).shape)
+    for c, values, offset in [(1, strain, 10), (2, stress, 1)]:
+        mask = crit == c
+        if not np.any(mask):
+            continue
+        v = values[..., mask, :]
+        Xt = failmat[mask][:, offset + tens]
+        Xc = failmat[mask][:, offset + comp]
+        failure[..., mask, :] = np.where(v > 0., v / Xt, -v / Xc)
+
+    mask = crit == 3
+    if np.any(mask):
+        s = stress[..., mask, :]
+        Xt = failmat[mask][:, 1 + tens]
+        Xc = failmat[mask][:, 1 + comp]
+        F = 1. / Xt - 1. / Xc
+        Fii = 1. / (Xt * Xc)
+        # shear limits are symmetric
+        F[:, 2:5] = 0.
+        fw = (F * s).sum(axis=-1) + (Fii * s**2).sum(axis=-1)
+        for i, j in [(0, 1), (0, 5), (1, 5)]:
+            Fij = -0.5 * np.sqrt(Fii[:, i] * Fii[:, j])
+            fw += 2. * Fij * s[..., i] * s[..., j]
+        failure[..., mask, 0] = fw
+    return failure
+
+
+class BECASNumpy(object):
+    """
+    Native NumPy/SciPy implementation of the BECAS cross section analysis.
+
+    Computes the cross section stiffness and mass matrices and the
+    cross section properties from the same nodal, element and material
+    arrays as read by BECAS_Utils, without calling Octave or Matlab.
+    The element matrices are integrated for all elements at once,
+    assembled into scipy.sparse matrices and the warping problem is solved
+    with a sparse direct solver.
+
+    The ordering of the unknowns and the assembly pattern are computed once
+    per mesh, such that a change of the materials only requires the
+    numerical factorization, see update_materials. Stresses, strains and
+    failure indices of any number of load cases are recovered from the
+    strains of the six unit load cases without further solutions.
+
+    parameters
+    ----------
+    nl_2d: array
+        nodal positions (node number, x, y). Size ((n_n, 3))
+    el_2d: array
+        element connectivity (element number, node 1, ..., node 8).
+        Nodes 5-8 are zero for Quad4 elements. Size ((n_e, 9))
+    emat: array
+        element material assignment (element number, material number,
+        fiber angle, fiber plane angle). Size ((n_e, 4))
+    matprops: array
+        material properties E11 E22 E33 G12 G13 G23 nu12 nu13 nu23 rho.
+        Size ((nmat, 10))
+    failmat: array
+        optional failure criterion and limits of each material as read
+        from FAILMAT.in, see check_failure. Size ((nmat, 19))
+    snmat: array
+        optional S-N curve parameters of each material as read from
+        SNMAT.in, see compute_fatigue. Size ((nmat, 2))
+
+    returns
+    -------
+    Ks: array
+        stiffness matrix w.r.t. the reference coordinate system. Size ((6, 6))
+    Fs: array
+        compliance matrix w.r.t. the reference coordinate system. Size ((6, 6))
+    Ms: array
+        mass matrix w.r.t. the reference coordinate system. Size ((6, 6))
+    csprops: array
+        cross section properties in the order of the BECAS csprops struct.
+        Size (18)
+    masspermaterial: array
+        mass per unit length of each material. Size (nmat)
+    """
+
+    # arrays needed for stress recovery, see get_state
+    _state_vars = ['unit_strains', 'T', 'Q', 'Qm', 'el_mat', 'elnr', 'failmat', 'snmat']
+
+    def __init__(self, nl_2d, el_2d, emat, matprops, failmat=None, snmat=None):
+
+        self.set_mesh(nl_2d, el_2d)
+        self.set_materials(emat, matprops)
+        self.failmat = failmat
+        self.snmat = snmat
+
+        self.Ks = np.zeros((6, 6))
+        self.Fs = np.zeros((6, 6))
+        self.Ms = np.zeros((6, 6))
+        self.csprops = np.zeros(18)
+        self.masspermaterial = np.array([])
+
+    def set_mesh(self, nl_2d, el_2d):
+        """
+        Set up the node and element numbering, the integration points
+        and the sparse assembly pattern of the mesh.
+        """
+
+        nl_2d = np.atleast_2d(nl_2d)
+        el_2d = np.atleast_2d(el_2d).astype(int)
+
+        # map node numbers to zero based indices
+        node_idx = np.zeros(nl_2d[:, 0].astype(int).max() + 1, dtype=int)
+        node_idx[nl_2d[:, 0].astype(int)] = np.arange(nl_2d.shape[0])
+
+        self.xy = nl_2d[:, 1:3].copy()
+        self.nn = nl_2d.shape[0]
+        self.ndof = 3 * self.nn
+        self.ne = el_2d.shape[0]
+        self.elnr = el_2d[:, 0]
+        self.nl_2d = nl_2d
+        self.el_2d = el_2d
+
+        if el_2d.shape[1] > 5 and np.any(el_2d[:, 5:9] > 0):
+            self.nnpe = 8
+            self.ngauss = 3
+        else:
+            self.nnpe = 4
+            self.ngauss = 2
+        self.conn = node_idx[el_2d[:, 1:self.nnpe + 1]]
+        self.nd = 3 * self.nnpe
+
+        # strain operators in the integration points of all elements
+        X = self.xy[self.conn]
+        self.gp = self._gauss_operators(X)
+
+        # strain operators in the element centers used for stress recovery
+        self.gc = self._strain_operators(0., 0., X)
+
+        # element areas
+        self.el_area = np.zeros(self.ne)
+        for g in self.gp:
+            self.el_area += g['w']
+
+        # global dofs of the element dofs
+        self.dofs = (3 * self.conn[:, :, None] + np.arange(3)).reshape(self.ne, self.nd)
+
+        self.D = self._constraints(self.xy)
+
+        self.set_pattern()
+
+    def _constraints(self, xy):
+        """
+        Constraint matrix of the rigid body motions of the nodes.
+        Size ((ndof, 6))
+        """
+
+        x = xy[:, 0]
+        y = xy[:, 1]
+        Z = np.zeros((xy.shape[0], 3, 6))
+        Z[:, 0, 0] = 1.
+        Z[:, 0, 5] = -y
+        Z[:, 1, 1] = 1.
+        Z[:, 1, 5] = x
+        Z[:, 2, 2] = 1.
+        Z[:, 2, 3] = y
+        Z[:, 2, 4] = -x
+        return Z.reshape(3 * xy.shape[0], 6)
+
+    def _gauss_operators(self, X):
+        """
+        Integration weights, coordinates and strain operators in the
+        integration points of the elements with nodal coordinates X.
+        """
+
+        xi, eta, wg = gauss_points(self.ngauss)
+        gp = []
+        for i in range(xi.shape[0]):
+            g = self._strain_operators(xi[i], eta[i], X)
+            g['w'] = wg[i] * g['detJ']
+            gp.append(g)
+        return gp
+
+    def _strain_operators(self, xi, eta, X):
+        """
+        Jacobian determinants, coordinates and strain operators
+        BN, SN and SZ in the point (xi, eta) of the elements with
+        nodal coordinates X of size ((ne, nnpe, 2)).
+        """
+
+        ne = X.shape[0]
+        N, dN = shape_functions(self.nnpe, xi, eta)
+        J = np.einsum('ai,nij->naj', dN, X)
+        detJ = J[:, 0, 0] * J[:, 1, 1] - J[:, 0, 1] * J[:, 1, 0]
+        Jinv = np.linalg.inv(J)
+        dNxy = np.matmul(Jinv, dN)
+        x = np.dot(X[:, :, 0], N)
+        y = np.dot(X[:, :, 1], N)
+
+        BN = np.zeros((ne, 6, self.nd))
+        BN[:, 0, 0::3] = dNxy[:, 0, :]
+        BN[:, 1, 1::3] = dNxy[:, 1, :]
+        BN[:, 2, 0::3] = dNxy[:, 1, :]
+        BN[:, 2, 1::3] = dNxy[:, 0, :]
+        BN[:, 3, 2::3] = dNxy[:, 0, :]
+        BN[:, 4, 2::3] = dNxy[:, 1, :]
+
+        SN = np.zeros((6, self.nd))
+        SN[3, 0::3] = N
+        SN[4, 1::3] = N
+        SN[5, 2::3] = N
+
+        SZ = np.zeros((ne, 6, 6))
+        SZ[:, 3, 0] = 1.
+        SZ[:, 3, 5] = -y
+        SZ[:, 4, 1] = 1.
+        SZ[:, 4, 5] = x
+        SZ[:, 5, 2] = 1.
+        SZ[:, 5, 3] = y
+        SZ[:, 5, 4] = -x
+
+        return {'detJ': detJ, 'x': x, 'y': y, 'BN': BN, 'SN': SN, 'SZ': SZ}
+
+    def set_pattern(self):
+        """
+        Compute the symbolic part of the factorization of the warping
+        problem coefficient matrix, which only depends on the mesh.
+
+        The unknowns are ordered with a reverse Cuthill-McKee ordering of
+        the warping unknowns followed by the section strains and the
+        Lagrange multipliers, such that the numerical factorization can be done
+        without a fill-reducing column ordering. The position of every
+        element matrix entry in the compressed sparse column arrays of
+        the permuted matrix is cached, so that the assembly reduces
+        to a single weighted bincount.
+        """
+
+        ndof = self.ndof
+        n = ndof + 12
+        ne = self.ne
+        nd = self.nd
+
+        # row and column indices of the blocks E, R, R^T, A, D and D^T
+        rows_dd = np.repeat(self.dofs, nd, axis=1).flatten()
+        cols_dd = np.tile(self.dofs, (1, nd)).flatten()
+        rows_d6 = np.repeat(self.dofs, 6, axis=1).flatten()
+        cols_d6 = np.tile(np.arange(6), ne * nd) + ndof
+        rows_66 = np.repeat(np.arange(6), 6) + ndof
+        cols_66 = np.tile(np.arange(6), 6) + ndof
+        rows_D = np.repeat(np.arange(ndof), 6)
+        cols_D = np.tile(np.arange(6), ndof) + ndof + 6
+        rows = np.concatenate([rows_dd, rows_d6, cols_d6, rows_66, rows_D, cols_D])
+        cols = np.concatenate([cols_dd, cols_d6, rows_d6, cols_66, cols_D, rows_D])
+
+        # bandwidth reducing ordering of the warping unknowns, the dense
+        # border of the section strains and Lagrange multipliers is last
+        mask = (rows < ndof) & (cols < ndof)
+        S = sp.csr_matrix((np.ones(mask.sum()), (rows[mask], cols[mask])), shape=(ndof, ndof))
+        perm = reverse_cuthill_mckee(S, symmetric_mode=True)
+        self.perm = np.concatenate([perm, np.arange(ndof, n)]).astype(int)
+        iperm = np.zeros(n, dtype=int)
+        iperm[self.perm] = np.arange(n)
+
+        # positions of the entries in the CSC arrays of the permuted matrix
+        keys = iperm[cols] * n + iperm[rows]
+        ukeys, self._k1_idx = np.unique(keys, return_inverse=True)
+        self._k1_indices = (ukeys % n).astype(np.int32)
+        self._k1_indptr = np.searchsorted(ukeys // n, np.arange(n + 1)).astype(np.int32)
+        self._k1_nnz = ukeys.shape[0]
+
+    def set_materials(self, emat, matprops):
+        """
+        Set the element material assignment and the material properties
+        and compute the constitutive matrices of the elements in the
+        cross section coordinate system.
+        """
+
+        emat = np.atleast_2d(emat)
+        self.matprops = np.atleast_2d(matprops)
+
+        # sort the material assignments in the element order of el_2d
+        emat_idx = np.zeros(emat[:, 0].astype(int).max() + 1, dtype=int)
+        emat_idx[emat[:, 0].astype(int)] = np.arange(emat.shape[0])
+        self.emat = emat[emat_idx[self.elnr]]
+
+        self.el_mat = self.emat[:, 1].astype(int) - 1
+        self.Qm, self.T, self.Q, self.rho = self._constitutive(self.emat, self.matprops)
+
+    def _constitutive(self, emat, matprops):
+        """
+        Constitutive matrices in the material and cross section coordinate
+        systems, strain transformation matrices and densities of the
+        elements with material assignments emat.
+        """
+
+        el_mat = emat[:, 1].astype(int) - 1
+        Qm = material_constitutive(matprops)[el_mat]
+        T = material_rotation(emat[:, 2], emat[:, 3])
+        Q = np.matmul(T.transpose(0, 2, 1), np.matmul(Qm, T))
+        return Qm, T, Q, matprops[el_mat, 9]
+
+    def update_materials(self, emat, matprops):
+        """
+        Update the material assignment and the material properties of
+        the same mesh and recompute the section.
+
+        The assembly pattern and the ordering of the unknowns are reused,
+        only the numerical factorization is redone.
+        """
+
+        self.set_materials(emat, matprops)
+        self.compute()
+
+    def integrate(self):
+        """
+        Integrate the element matrices of the warping problem
+        coefficient matrix of all elements.
+        """
+
+        self.Ee, self.Re, self.Ae = self._integrate(self.gp, self.Q)
+
+    def _integrate(self, gp, Q):
+        """
+        Element matrices E, R and A of the elements with the integration
+        point operators gp and constitutive matrices Q.
+        """
+
+        ne = Q.shape[0]
+        nd = self.nd
+        Ae = np.zeros((ne, 6, 6))
+        Re = np.zeros((ne, nd, 6))
+        Ee = np.zeros((ne, nd, nd))
+
+        for g in gp:
+            w = g['w'][:, None, None]
+            BN = g['BN']
+            SZ = g['SZ']
+            QBN = np.matmul(Q, BN)
+            QSZ = np.matmul(Q, SZ)
+            BNt = BN.transpose(0, 2, 1)
+            Ae += w * np.matmul(SZ.transpose(0, 2, 1), QSZ)
+            Re += w * np.matmul(BNt, QSZ)
+            Ee += w * np.matmul(BNt, QBN)
+        return Ee, Re, Ae
+
+    def assemble(self):
+        """
+        Assemble the permuted coefficient matrix of the warping problem
+
+        | E    R    D |
+        | R^T  A    0 |
+        | D^T  0    0 |
+        """
+
+        self.A = self.Ae.sum(axis=0)
+        D = self.D.flatten()
+        data = np.concatenate([self.Ee.flatten(), self.Re.flatten(),
+                               self.Re.flatten(), self.A.flatten(), D, D])
+        n = self.ndof + 12
+        data = np.bincount(self._k1_idx, weights=data, minlength=self._k1_nnz)
+        self.K1 = sp.csc_matrix((data, self._k1_indices, self._k1_indptr), shape=(n, n))
+
+    def factorize(self):
+        """
+        Numerical factorization of the permuted coefficient matrix.
+        """
+
+        self.lu = spla.splu(self.K1, permc_spec='NATURAL',
+                            diag_pivot_thresh=0.01,
+                            options=dict(SymmetricMode=True))
+
+    def solve(self, rhs):
+        """
+        Solve the warping problem for one or more right hand sides
+        with the factorization of the coefficient matrix.
+        """
+
+        x = np.empty_like(rhs, dtype=float)
+        x[self.perm] = self.lu.solve(np.asarray(rhs, dtype=float)[self.perm])
+        return x
+
+    def _scatter(self, v, dofs=None):
+        """
+        Assemble element vectors of size ((ne, nd, k)) into a global
+        array of size ((ndof, k)).
+        """
+
+        if dofs is None:
+            dofs = self.dofs
+        dofs = dofs.flatten()
+        v = v.reshape(dofs.shape[0], -1)
+        return np.array([np.bincount(dofs, weights=v[:, j], minlength=self.ndof)
+                         for j in range(v.shape[1])]).T
+
+    def compute_stiffness(self):
+        """
+        Solve the warping problems and compute the cross section
+        compliance and stiffness matrices.
+
+        The terms of the right hand side of the zero order warping problem
+        and the compliance matrix are integrated directly from the
+        strain fields, such that only the coefficient matrix
+        needs to be assembled.
+        """
+
+        ndof = self.ndof
+        n = ndof + 12
+
+        Tr = np.zeros((6, 6))
+        Tr[3, 1] = 1.
+        Tr[4, 0] = -1.
+
+        # first order warping
+        rhs = np.zeros((n, 6))
+        rhs[ndof:ndof + 6] = Tr
+        self.X1 = self.solve(rhs)
+        self.w1 = self.X1[:ndof]
+        self.psi1 = self.X1[ndof:ndof + 6]
+
+        # zero order warping
+        rhs = self._rhs0(self.gp, self.Q, self.dofs, self.X1)
+        rhs[ndof:ndof + 6] += np.eye(6)
+        self.X0 = self.solve(rhs)
+        self.w0 = self.X0[:ndof]
+        self.psi0 = self.X0[ndof:ndof + 6]
+
+        # compliance matrix from the strain energy of the unit load cases
+        Xs = (self.w0, self.w1, self.psi0)
+        self.Fs = self._energy(self.gp, self.Q, self.dofs, Xs, Xs)
+        self.Fs = 0.5 * (self.Fs + self.Fs.T)
+        self.Ks = np.linalg.inv(self.Fs)
+
+        # strains in the element centers of the unit load cases
+        self.unit_strains = self._unit_strains(self.gc, self.dofs, Xs)
+
+    def _rhs0(self, gp, Q, dofs, X1):
+        """
+        Contribution of the elements with the integration point operators
+        gp, constitutive matrices Q and dofs to the right hand side of the
+        zero order warping problem for the first order solution X1,
+        -(C - C^T) w1 + L psi1 and -L^T w1.
+        """
+
+        ndof = self.ndof
+        ue1 = X1[:ndof][dofs]
+        psi1 = X1[ndof:ndof + 6]
+        rw = np.zeros(ue1.shape)
+        rpsi = np.zeros((6, X1.shape[1]))
+        for g in gp:
+            w = g['w'][:, None, None]
+            BN = g['BN']
+            SN = g['SN']
+            SZ = g['SZ']
+            QSN1 = np.matmul(Q, np.matmul(SN, ue1))
+            QBN1 = np.matmul(Q, np.matmul(BN, ue1))
+            QSZ1 = np.matmul(Q, np.matmul(SZ, psi1))
+            rw += w * (-np.matmul(BN.transpose(0, 2, 1), QSN1) +
+                       np.matmul(SN.T, QBN1 + QSZ1))
+            rpsi -= (w * np.matmul(SZ.transpose(0, 2, 1), QSN1)).sum(axis=0)
+        rhs = np.zeros((ndof + 12, X1.shape[1]))
+        rhs[:ndof] = self._scatter(rw, dofs)
+        rhs[ndof:ndof + 6] = rpsi
+        return rhs
+
+    def _energy(self, gp, Q, dofs, Xa, Xb):
+        """
+        Strain energy product of the elements with the integration point
+        operators gp, constitutive matrices Q and dofs for the unit
+        load solutions Xa and Xb given as (w0, w1, psi0).
+        """
+
+        F = np.zeros((Xa[2].shape[1], Xb[2].shape[1]))
+        for g in gp:
+            eps_a = self._unit_strains(g, dofs, Xa)
+            eps_b = self._unit_strains(g, dofs, Xb)
+            F += np.einsum('n,nij,nik->jk', g['w'], eps_a, np.matmul(Q, eps_b))
+        return F
+
+    def _unit_strains(self, g, dofs, Xs):
+        """
+        Strains in the cross section coordinate system of the six unit
+        load cases with the solution Xs given as (w0, w1, psi0) in a point
+        of the elements with operators g. Size ((ne, 6, 6))
+        """
+
+        w0, w1, psi0 = Xs
+        return np.matmul(g['BN'], w0[dofs]) + np.matmul(g['SN'], w1[dofs]) + \
+               np.matmul(g['SZ'], psi0)
+
+    def compute_strains(self, loads, elements=None):
+        """
+        Strains in the element centers of one or more load cases.
+
+        The strains are linear combinations of the strains of the
+        six unit load cases, so no additional solutions of the
+        warping problem are needed.
+
+        parameters
+        ----------
+        loads: array
+            section forces and moments Fx Fy Fz Mx My Mz. Size ((ncase, 6))
+        elements: array
+            indices of the elements to recover, default all elements
+
+        returns
+        -------
+        strain: array
+            strains in the cross section coordinate system. Size ((ncase, ne, 6))
+        strain_m: array
+            strains in the material coordinate systems. Size ((ncase, ne, 6))
+        """
+
+        if elements is None:
+            elements = slice(None)
+        loads = np.atleast_2d(loads)
+        strain = np.einsum('nij,cj->cni', self.unit_strains[elements], loads)
+        strain_m = np.einsum('nij,cnj->cni', self.T[elements], strain)
+        return strain, strain_m
+
+    def compute_stresses(self, strain, strain_m, elements=None):
+        """
+        Stresses in the cross section and material coordinate systems
+        of the strains returned by compute_strains.
+        """
+
+        if elements is None:
+            elements = slice(None)
+        stress = np.einsum('nij,cnj->cni', self.Q[elements], strain)
+        stress_m = np.einsum('nij,cnj->cni', self.Qm[elements], strain_m)
+        return stress, stress_m
+
+    def compute_failure(self, loads, failmat=None, elements=None):
+        """
+        Failure indices in the element centers of one or more load cases.
+
+        parameters
+        ----------
+        loads: array
+            section forces and moments Fx Fy Fz Mx My Mz. Size ((ncase, 6))
+        failmat: array
+            failure criterion and limits of each material as read from
+            FAILMAT.in, defaults to the failmat of the section.
+            Size ((nmat, 19))
+        elements: array
+            indices of the elements to recover, default all elements
+
+        returns
+        -------
+        failure: array
+            failure indices in the BECAS format. Size ((ncase, ne, 6))
+        """
+
+        if failmat is None:
+            failmat = self.failmat
+        if failmat is None:
+            raise RuntimeError('No failure criteria defined for the section')
+        if elements is None:
+            elements = slice(None)
+        strain, strain_m = self.compute_strains(loads, elements)
+        stress, stress_m = self.compute_stresses(strain, strain_m, elements)
+        return check_failure(np.atleast_2d(failmat)[self.el_mat[elements]], stress_m, strain_m)
+
+    def compute_fatigue(self, loads, snmat=None, component=0, block_size=4000000):
+        """
+        Fatigue damage in the element centers of a series of section loads.
+
+        The stress histories of the elements are computed from the stresses
+        of the six unit load cases, counted with the rainflow method and
+        summed with Miner's rule, see miner_damage.
+
+        parameters
+        ----------
+        loads: array
+            section forces and moments Fx Fy Fz Mx My Mz in time.
+            Size ((nt, 6))
+        snmat: array
+            Woehler exponent m and stress range S1 with a life of one cycle
+            of each material, N = (S1 / S)**m, defaults to the snmat of
+            the section. Size ((nmat, 2))
+        component: int
+            stress component in the material coordinate systems in the
+            BECAS ordering 11 22 12 13 23 33, defaults to the fiber direction
+        block_size: int
+            maximum number of stress values held in memory at a time
+
+        returns
+        -------
+        damage: array
+            damage of the elements. Size (ne)
+        """
+
+        if snmat is None:
+            snmat = self.snmat
+        if snmat is None:
+            raise RuntimeError('No S-N curves defined for the section')
+        snmat = np.atleast_2d(snmat)[self.el_mat]
+        loads = np.atleast_2d(loads)
+        ne = self.el_mat.shape[0]
+
+        # material stresses of the unit load cases
+        U = np.einsum('nj,njk,nkl->nl', self.Qm[:, component, :], self.T, self.unit_strains)
+        damage = np.zeros(ne)
+        nb = max(1, block_size // loads.shape[0])
+        for i in range(0, ne, nb):
+            b = slice(i, i + nb)
+            damage[b] = miner_damage(np.dot(U[b], loads.T), snmat[b, 0], snmat[b, 1])
+        return damage
+
+    def get_state(self):
+        """
+        Arrays of a computed section needed for stress recovery.
+        """
+
+        return dict((name, getattr(self, name)) for name in self._state_vars
+                    if getattr(self, name) is not None)
+
+    @classmethod
+    def from_state(cls, state):
+        """
+        Create a section for stress recovery from the arrays returned by
+        get_state, without setting up the mesh or solving the warping
+        problem.
+        """
+
+        section = cls.__new__(cls)
+        for name in cls._state_vars:
+            value = state[name] if name in state else None
+            setattr(section, name, None if value is None else np.asarray(value))
+        return section
+
+    def compute_mass(self):
+        """
+        Compute the cross section mass matrix and the mass per material.
+        """
+
+        self.Ms = np.zeros((6, 6))
+        el_mass = np.zeros(self.ne)
+        for g in self.gp:
+            w = self.rho * g['w']
+            x = g['x']
+            y = g['y']
+            m = w.sum()
+            mx = np.dot(w, x)
+            my = np.dot(w, y)
+            mxx = np.dot(w, x**2)
+            myy = np.dot(w, y**2)
+            mxy = np.dot(w, x * y)
+            Z = np.zeros((6, 6))
+            Z[0, 0] = Z[1, 1] = Z[2, 2] = m
+            Z[0, 5] = Z[5, 0] = -my
+            Z[1, 5] = Z[5, 1] = mx
+            Z[2, 3] = Z[3, 2] = my
+            Z[2, 4] = Z[4, 2] = -mx
+            Z[3, 3] = myy
+            Z[4, 4] = mxx
+            Z[3, 4] = Z[4, 3] = -mxy
+            Z[5, 5] = mxx + myy
+            self.Ms += Z
+            el_mass += w
+        self.el_mass = el_mass
+        self.masspermaterial = np.bincount(self.el_mat, weights=el_mass,
+                                           minlength=self.matprops.shape[0])
+
+    def compute_csprops(self):
+        """
+        Compute the cross section properties in the order of the
+        BECAS csprops struct:
+
+        ShearX ShearY ElasticX ElasticY MassTotal MassX MassY Ixx Iyy Ixy
+        AreaX AreaY Axx Ayy Axy AreaTotal AlphaPrincipleAxis_Ref
+        AlphaPrincipleAxis_ElasticCenter
+
+        The mass and area moments of inertia are computed w.r.t. the
+        reference point and the angles are given in radians.
+        """
+
+        F = self.Fs
+
+        # shear center
+        self.xs = -F[5, 1] / F[5, 5]
+        self.ys = F[5, 0] / F[5, 5]
+
+        # elastic center
+        den = F[3, 3] * F[4, 4] - F[3, 4]**2
+        self.xe = (F[3, 3] * F[4, 2] - F[3, 2] * F[4, 3]) / den
+        self.ye = (-F[3, 2] * F[4, 4] + F[3, 4] * F[4, 2]) / den
+
+        # mass center
+        self.mass = self.Ms[0, 0]
+        self.xm = self.Ms[1, 5] / self.mass
+        self.ym = -self.Ms[0, 5] / self.mass
+
+        # area center
+        self.area = self.el_area.sum()
+        ax = 0.
+        ay = 0.
+        for g in self.gp:
+            ax += np.dot(g['w'], g['x'])
+            ay += np.dot(g['w'], g['y'])
+        self.xa = ax / self.area
+        self.ya = ay / self.area
+
+        # mass and area moments of inertia w.r.t. the reference point
+        self.Ixx = self.Ms[3, 3]
+        self.Iyy = self.Ms[4, 4]
+        self.Ixy = -self.Ms[3, 4]
+        Axx = Ayy = Axy = 0.
+        for g in self.gp:
+            w = g['w']
+            Axx += np.dot(w, g['y']**2)
+            Ayy += np.dot(w, g['x']**2)
+            Axy += np.dot(w, g['x'] * g['y'])
+
+        # principal axis angles w.r.t. the reference and the elastic center
+        self.alpha_ref = principal_angle(self.Ks)
+        Te = transform_matrix(self.xe, self.ye, 0.)
+        self.alpha_e = principal_angle(np.dot(Te.T, np.dot(self.Ks, Te)))
+
+        self.csprops = np.array([self.xs, self.ys, self.xe, self.ye,
+                                 self.mass, self.xm, self.ym,
+                                 self.Ixx, self.Iyy, self.Ixy,
+                                 self.xa, self.ya, Axx, Ayy, Axy, self.area,
+                                 self.alpha_ref, self.alpha_e])
+
+    def compute(self):
+        """
+        Compute the stiffness and mass matrices and the cross section
+        properties.
+        """
+
+        self.integrate()
+        self.assemble()
+        self.factorize()
+        self.compute_stiffness()
+        self.compute_mass()
+        self.compute_csprops()
+
+    def becas2hawc2(self, spanpos=0., hawc2_FPM=False):
+        """
+        Cross section properties in the HAWC2 format as written
+        by BECAS_Becas2Hawc2.
+
+        parameters
+        ----------
+        spanpos: float
+            spanwise position of the section
+        hawc2_FPM: bool
+            return the fully populated stiffness matrix format
+
+        returns
+        -------
+        cs_props: array
+          | HAWC2 beam properties, size (19):
+          | s dm x_cg y_cg ri_x ri_y x_sh y_sh E G I_x I_y K k_x k_y A pitch x_e y_e
+          | Fully populated stiffness matrix, size (30):
+          | s dm x_cg y_cg ri_x ri_y pitch x_e y_e K_11 K_12 K_13 K_14 K_15 K_16 K_22
+          | K_23 K_24 K_25 K_26 K_33 K_34 K_35 K_36 K_44 K_45 K_46 K_55 K_56 K_66
+        """
+
+        alpha = self.alpha_e
+        pitch = np.degrees(alpha)
+
+        # stiffness matrix at the elastic center in the principal axes
+        Tp = transform_matrix(self.xe, self.ye, alpha)
+        Kp = np.dot(Tp.T, np.dot(self.Ks, Tp))
+
+        # mass radii of gyration w.r.t. the elastic center in the principal axes
+        m = self.mass
+        Ixx = self.Ixx - 2. * self.ye * m * self.ym + m * self.ye**2
+        Iyy = self.Iyy - 2. * self.xe * m * self.xm + m * self.xe**2
+        Ixy = self.Ixy - self.xe * m * self.ym - self.ye * m * self.xm + \
+              m * self.xe * self.ye
+        c = np.cos(alpha)
+        s = np.sin(alpha)
+        Ix = c**2 * Ixx + s**2 * Iyy - 2. * s * c * Ixy
+        Iy = s**2 * Ixx + c**2 * Iyy + 2. * s * c * Ixy
+        ri_x = np.sqrt(Ix / self.mass)
+        ri_y = np.sqrt(Iy / self.mass)
+
+        if hawc2_FPM:
+            cs_props = np.zeros(30)
+            cs_props[:9] = [spanpos, self.mass, self.xm, self.ym, ri_x, ri_y,
+                            pitch, self.xe, self.ye]
+            cs_props[9:] = Kp[np.triu_indices(6)]
+        else:
+            E = self.Ks[2, 2] / self.area
+            # area weighted average of the out-of-plane shear modulus,
+            # as in BECAS the element areas are taken as absolute values
+            G = np.dot(np.abs(self.el_area), self.Q[:, 3, 3]) / self.area
+            cs_props = np.array([spanpos, self.mass, self.xm, self.ym,
+                                 ri_x, ri_y, self.xs, self.ys,
+                                 E, G, Kp[3, 3] / E, Kp[4, 4] / E,
+                                 1. / self.Fs[5, 5] / G,
+                                 self.Ks[0, 0] / (G * self.area),
+                                 self.Ks[1, 1] / (G * self.area),
+                                 self.area, pitch, self.xe, self.ye])
+        return cs_props
+
+    def compute_sensitivities(self, directions, step=1.e-6, spanpos=0., hawc2_FPM=False):
+        """
+        Directional derivatives of the stiffness and mass matrices and the
+        cross section properties w.r.t. changes of the section inputs
+        on the same mesh topology.
+
+        The derivatives of the element matrices are computed semi-analytically
+        with central differences on the affected elements only, and the
+        derivatives of the compliance matrix with an adjoint method, which
+        reuses the factorization of the coefficient matrix. The twelve
+        adjoint solutions are independent of the number of directions,
+        the remaining cost per direction is local to the affected elements.
+
+        parameters
+        ----------
+        directions: list
+            list of dictionaries with the derivatives of the inputs w.r.t.
+            each design variable with the optional keys
+
+            | nl_2d: nodal x and y coordinates. Size ((n_n, 2))
+            | emat: fiber angle and fiber plane angle of the elements in the
+            | order of el_2d. Size ((n_e, 2))
+            | matprops: material properties. Size ((nmat, 10))
+        step: float
+            relative step size of the central differences
+        spanpos: float
+            spanwise position of the section passed to becas2hawc2
+        hawc2_FPM: bool
+            fully populated stiffness matrix format passed to becas2hawc2
+
+        returns
+        -------
+        sens: dict
+            derivatives of k_matrix and m_matrix, size ((nvar, 6, 6)),
+            csprops, size ((nvar, 18)) and cs_props, size ((nvar, 19))
+            or ((nvar, 30)).
+        """
+
+        ndof = self.ndof
+        n = ndof + 12
+        nvar = len(directions)
+        Xs = (self.w0, self.w1, self.psi0)
+        sens = {'k_matrix': np.zeros((nvar, 6, 6)),
+                'm_matrix': np.zeros((nvar, 6, 6)),
+                'csprops': np.zeros((nvar, 18)),
+                'cs_props': np.zeros((nvar, 30 if hawc2_FPM else 19))}
+
+        # element quantities of the affected elements at +-h
+        perturbed = []
+        for d in directions:
+            perturbed.append(self._perturb_elements(d, step))
+        active = [i for i, e in enumerate(perturbed) if e is not None]
+        if len(active) == 0:
+            return sens
+
+        def dK1_product(e, X):
+            # derivative of the coefficient matrix times X
+            ue = X[:ndof][e['dofs']]
+            psi = X[ndof:ndof + 6]
+            out = np.zeros((n, 6))
+            for q, sign in [(e['p'], 1.), (e['m'], -1.)]:
+                out[:ndof] += sign * self._scatter(np.matmul(q['Ee'], ue) +
+                                                   np.matmul(q['Re'], psi), e['dofs'])
+                out[ndof:ndof + 6] += sign * (np.matmul(q['Re'].transpose(0, 2, 1), ue).sum(axis=0) +
+                                              np.dot(q['Ae'].sum(axis=0), psi))
+            out /= 2. * e['h']
+            if e['dD'] is not None:
+                out[:ndof] += np.dot(e['dD'], X[ndof + 6:])
+                out[ndof + 6:] += np.dot(e['dD'].T, X[:ndof])
+            return out
+
+        def central(e, f, *args):
+            # central difference of an element quantity
+            return (f(e['p']['gp'], e['p']['Q'], e['dofs'], *args) -
+                    f(e['m']['gp'], e['m']['Q'], e['dofs'], *args)) / (2. * e['h'])
+
+        # adjoint solutions of the strain energy terms X_s^T G dX_s,
+        # K1 is symmetric, so the adjoint problems use the same factorization
+        Yw0, Yw1, Ypsi0 = self._energy_loads(self.gp, self.Q, self.dofs, Xs)
+        rhs = np.zeros((n, 6))
+        rhs[:ndof] = Yw0
+        rhs[ndof:ndof + 6] = Ypsi0
+        lam0 = self.solve(rhs)
+        rhs = self._rhs0_transpose(self.gp, self.Q, self.dofs, lam0)
+        rhs[:ndof] += Yw1
+        lam1 = self.solve(rhs)
+
+        for i in active:
+            e = perturbed[i]
+            dGs = np.dot(lam0.T, central(e, self._rhs0, self.X1) - dK1_product(e, self.X0)) - \
+                  np.dot(lam1.T, dK1_product(e, self.X1))
+            dF = central(e, self._energy, Xs, Xs) + dGs + dGs.T
+            dF = 0.5 * (dF + dF.T)
+
+            # the explicit properties are evaluated at +-h with the
+            # linearized compliance matrix
+            props = []
+            for q, sign in [(e['p'], 1.), (e['m'], -1.)]:
+                section = copy.copy(self)
+                section.gp = []
+                for g, gq in zip(self.gp, q['gp']):
+                    gn = {}
+                    for name in ['w', 'x', 'y']:
+                        gn[name] = g[name].copy()
+                        gn[name][e['els']] = gq[name]
+                    section.gp.append(gn)
+                section.el_area = np.sum([g['w'] for g in section.gp], axis=0)
+                section.Q = self.Q.copy()
+                section.Q[e['els']] = q['Q']
+                section.rho = self.rho.copy()
+                section.rho[e['els']] = q['rho']
+                section.compute_mass()
+                section.Fs = self.Fs + sign * e['h'] * dF
+                section.Ks = np.linalg.inv(section.Fs)
+                section.compute_csprops()
+                props.append((section.Ms, section.csprops,
+                              section.becas2hawc2(spanpos, hawc2_FPM)))
+
+            h2 = 2. * e['h']
+            sens['k_matrix'][i] = -np.dot(self.Ks, np.dot(dF, self.Ks))
+            sens['m_matrix'][i] = (props[0][0] - props[1][0]) / h2
+            sens['csprops'][i] = (props[0][1] - props[1][1]) / h2
+            sens['cs_props'][i] = (props[0][2] - props[1][2]) / h2
+
+        return sens
+
+    def _energy_loads(self, gp, Q, dofs, Xs):
+        """
+        Loads G X_s conjugate to the zero order warping, the first order
+        warping and the section strains of the unit load solutions Xs
+        given as (w0, w1, psi0).
+        """
+
+        nsub = dofs.shape[0]
+        yw0 = np.zeros((nsub, self.nd, 6))
+        yw1 = np.zeros((nsub, self.nd, 6))
+        ypsi0 = np.zeros((6, 6))
+        for g in gp:
+            w = g['w'][:, None, None]
+            Qeps = w * np.matmul(Q, self._unit_strains(g, dofs, Xs))
+            yw0 += np.matmul(g['BN'].transpose(0, 2, 1), Qeps)
+            yw1 += np.matmul(g['SN'].T, Qeps)
+            ypsi0 += np.matmul(g['SZ'].transpose(0, 2, 1), Qeps).sum(axis=0)
+        return self._scatter(yw0, dofs), self._scatter(yw1, dofs), ypsi0
+
+    def _rhs0_transpose(self, gp, Q, dofs, lam):
+        """
+        Transpose of the linear map from the first order solution to the
+        right hand side of the zero order warping problem, see _rhs0,
+        applied to lam: (C - C^T) lam_w - L lam_psi and L^T lam_w.
+        """
+
+        ndof = self.ndof
+        ue = lam[:ndof][dofs]
+        lpsi = lam[ndof:ndof + 6]
+        rw = np.zeros(ue.shape)
+        rpsi = np.zeros((6, lam.shape[1]))
+        for g in gp:
+            w = g['w'][:, None, None]
+            BN = g['BN']
+            SN = g['SN']
+            SZ = g['SZ']
+            QSN = np.matmul(Q, np.matmul(SN, ue))
+            QBN = np.matmul(Q, np.matmul(BN, ue))
+            QSZ = np.matmul(Q, np.matmul(SZ, lpsi))
+            rw += w * (np.matmul(BN.transpose(0, 2, 1), QSN) -
+                       np.matmul(SN.T, QBN + QSZ))
+            rpsi += (w * np.matmul(SZ.transpose(0, 2, 1), QSN)).sum(axis=0)
+        rhs = np.zeros((ndof + 12, lam.shape[1]))
+        rhs[:ndof] = self._scatter(rw, dofs)
+        rhs[ndof:ndof + 6] = rpsi
+        return rhs
+
+    def _perturb_elements(self, d, step):
+        """
+        Element quantities at +-h of the elements affected by the input
+        derivatives d, see compute_sensitivities. Returns None if no
+        element is affected.
+        """
+
+        dxy = d.get('nl_2d')
+        demat = d.get('emat')
+        dmat = d.get('matprops')
+
+        affected = np.zeros(self.ne, dtype=bool)
+        h = np.inf
+        if dxy is not None and np.any(dxy != 0.):
+            affected |= np.any(np.any(dxy != 0., axis=1)[self.conn], axis=1)
+            h = min(h, step * np.abs(self.xy).max() / np.abs(dxy).max())
+        else:
+            dxy = None
+        if demat is not None and np.any(demat != 0.):
+            affected |= np.any(demat != 0., axis=1)
+            h = min(h, step * max(np.abs(self.emat[:, 2:4]).max(), 1.) / np.abs(demat).max())
+        else:
+            demat = None
+        if dmat is not None and np.any(dmat != 0.):
+            affected |= np.any(dmat != 0., axis=1)[self.el_mat]
+            h = min(h, step * np.abs(self.matprops).max() / np.abs(dmat).max())
+        else:
+            dmat = None
+        els = np.nonzero(affected)[0]
+        if els.shape[0] == 0:
+            return None
+
+        e = {'els': els, 'dofs': self.dofs[els], 'h': h, 'dD': None}
+        if dxy is not None:
+            # the constraint matrix is linear in the coordinates
+            e['dD'] = self._constraints(dxy) - self._constraints(np.zeros_like(dxy))
+        for name, sign in [('p', 1.), ('m', -1.)]:
+            X = self.xy[self.conn[els]]
+            if dxy is not None:
+                X = X + sign * h * dxy[self.conn[els]]
+            gp = self._gauss_operators(X)
+            emat = self.emat[els].copy()
+            if demat is not None:
+                emat[:, 2:4] += sign * h * demat[els]
+            matprops = self.matprops
+            if dmat is not None:
+                matprops = matprops + sign * h * dmat
+            Qm, T, Q, rho = self._constitutive(emat, matprops)
+            Ee, Re, Ae = self._integrate(gp, Q)
+            e[name] = {'gp': gp, 'Q': Q, 'rho': rho, 'Ee': Ee, 'Re': Re, 'Ae': Ae}
+        return e
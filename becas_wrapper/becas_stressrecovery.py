@@ -3,20 +3,120 @@
 import numpy as np
 import time
 import os
+import shutil
+import tempfile
+import multiprocessing
 
 from openmdao.api import Component, Group, ParallelGroup
 
 from becas_wrapper import BECASWrapper
-from becas_wrapper import ksfunc
+from loadcases import hull_load_cases, hull_weights, ks_aggregate
+
+
+def _recover_chunk(args):
+    """
+    recover a chunk of the load cases of a section from the utils and
+    solutions saved in the work directory of the section, used by
+    BECASCSStressRecovery to recover the load cases in a worker pool.
+    Each chunk is recovered in a temporary subdirectory of the work
+    directory, which is removed afterwards.
+
+    parameters
+    ----------
+    args: tuple
+        (workdir, becas_config, s, loads), where workdir is the absolute
+        path of the work directory of the section
+
+    returns
+    -------
+    outputs: dict
+        max_failure, max_failure_ks, screening_exceeded, critical_elements
+        and the material and region aggregates of the chunk, or None if the
+        computation failed.
+    """
+
+    workdir, becas_config, s, loads = args
+
+    becas_config = dict(becas_config)
+    becas_config['analysis_mode'] = 'stress_recovery'
+    becas_config['plot_paraview'] = False
+    becas_config['utils_rst_filebase'] = os.path.join(workdir,
+        becas_config.get('utils_rst_filebase', 'becas_utils'))
+    becas_config['path_input'] = os.path.join(workdir,
+        becas_config.get('path_input', 'becas_inputs/BECAS_SECTION%3.3f' % s))
+    chunkdir = tempfile.mkdtemp(prefix='sr', dir=workdir)
+    cwd = os.getcwd()
+    os.chdir(chunkdir)
+    try:
+        becas = BECASWrapper(s, **becas_config)
+        becas.load_cases = loads
+        becas.compute()
+        if not becas.success:
+            return None
+        out = {}
+        for name in ['max_failure', 'max_failure_ks', 'screening_exceeded',
+                     'critical_elements', 'material_ids', 'material_max_failure',
+                     'material_failure_ks', 'region_names', 'region_max_failure',
+                     'region_failure_ks']:
+            out[name] = getattr(becas, name)
+        return out
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(chunkdir, ignore_errors=True)
 
 
 class BECASCSStressRecovery(Component):
     """
     component for calling BECAS on individual sections to
     compute stresses and strains.
+
+    With config['load_case_hull'] = True only the load cases that are
+    vertices of the convex hull of the section loads are recovered.
+    The failure indices of the other cases are bounded from above by the
+    convex combinations of the failure indices of the vertices, while the
+    maximum over all cases is exact, see hull_load_cases.
+
+    With config['fatigue'] = True the rows of load_cases are instead
+    treated as a time series and the maximum fatigue damage of the
+    elements is computed, see BECASNumpy.compute_fatigue. The S-N curves
+    of the materials are read from SNMAT.in, which CS2DtoBECAS writes from
+    st3d['snmat']. If the damage cannot be computed it is NaN.
+
+    With screening_threshold set in config['BECASWrapper'] recovery stops
+    at the first load case exceeding the threshold, which is flagged in
+    blade_failure_exceeded, and the failure indices of the remaining
+    cases are NaN, see BECASWrapper.screen_failure_numpy.
+
+    With config['sr_workers'] > 1 the load cases are split into chunks of
+    config['sr_chunk_size'] cases, by default one chunk per worker, which
+    are recovered in a pool of worker processes sharing the utils and
+    solutions of BECASBeamStructure, see BECASWrapper.save_state. The failure indices, critical
+    elements and material and region aggregates of the chunks are merged,
+    but not the element failure indices, failure_elements.
+
+    With config['sr_cache'] = True the failure indices of the load cases
+    are cached by the section state, see BECASWrapper.input_digest, and the
+    load vector, so that only new or changed load cases are recovered, e.g.
+    when finite differencing w.r.t. the loads. The states of the last
+    config['sr_cache_states'] sections are kept.
+
+    If the recovery fails the failure indices of the section are NaN.
+
+    The section is recovered from the BECAS files left in its work directory
+    by BECASCSStructure, which must therefore run BECAS for every evaluation.
+    config['surrogate'] and config['thin_walled_iterations'] require
+    config['with_sr'] = True, which disables the surrogate and the
+    thin-walled model of BECASCSStructure.
+
+    With the blade structure st3d given, the failure indices of each
+    region and web and of each material aggregated with the KS function
+    are output in blade_region_failure_index_<name>, with the regions
+    followed by the webs of st3d, and blade_material_failure_index_<name>,
+    in the order of st3d['matprops']. Regions, webs and materials without
+    elements in the section are zero.
     """
 
-    def __init__(self, name, config, s, ncases):
+    def __init__(self, name, config, s, ncases, st3d=None):
         super(BECASCSStressRecovery, self).__init__()
 
         self.name = name
@@ -31,55 +131,409 @@ class BECASCSStressRecovery(Component):
         self.add_param('load_cases_%s' % name, np.zeros((ncases, 6)))
         self.add_output('blade_failure_index_%s' % name, np.zeros(ncases))
 
+        # failure indices of the regions and materials of the blade, named as
+        # in REGIONS.in and numbered as in EMAT.in written by CS2DtoBECAS
+        self.region_names = None
+        self.material_index = None
+        if st3d is not None:
+            self.region_names = ['REGION%02d' % i for i in range(len(st3d['regions']))] + \
+                                ['WEB%02d' % i for i in range(len(st3d['webs']))]
+            self.material_index = [ix for mname, ix in st3d['materials'].iteritems()]
+            self.add_output('blade_region_failure_index_%s' % name,
+                            np.zeros((ncases, len(self.region_names))))
+            self.add_output('blade_material_failure_index_%s' % name,
+                            np.zeros((ncases, len(self.material_index))))
+        self.region_failure_index = None
+        self.material_failure_index = None
+
         self.becas = BECASWrapper(s, **config['BECASWrapper'])
         self.becas.analysis_mode = 'stress_recovery'
 
+        # sections interpolated by the surrogate or computed with the
+        # thin-walled model leave the BECAS files of a previous design, or
+        # none, in the work directory
+        try:
+            surrogate = config['surrogate']
+        except:
+            surrogate = None
+        try:
+            thin_walled_iterations = config['thin_walled_iterations']
+        except:
+            thin_walled_iterations = 0
+        try:
+            with_sr = config['with_sr']
+        except:
+            with_sr = False
+        if surrogate is not None and not with_sr:
+            raise RuntimeError('Stress recovery with config[\'surrogate\'] '
+                               'requires config[\'with_sr\'] = True')
+        if thin_walled_iterations > 0 and not with_sr:
+            raise RuntimeError('Stress recovery with config[\'thin_walled_iterations\'] '
+                               'requires config[\'with_sr\'] = True')
+
+        # only recover the load cases on the convex hull of the loads
+        try:
+            self.load_case_hull = config['load_case_hull']
+        except:
+            self.load_case_hull = False
+        self.hull_cases = np.arange(ncases)
+        self.workdir = None
+
+        # fatigue damage of a load time series
+        try:
+            self.fatigue = config['fatigue']
+        except:
+            self.fatigue = False
+        if self.fatigue:
+            if st3d is not None and 'snmat' not in st3d:
+                raise RuntimeError('config[\'fatigue\'] requires the S-N curves '
+                                   'of the materials in st3d[\'snmat\']')
+            self.becas.analysis_mode = 'fatigue'
+            self.add_output('blade_damage_%s' % name, 0.)
+
+        if self.becas.screening_threshold is not None:
+            self.add_output('blade_failure_exceeded_%s' % name, 0.)
+
+        # recovery of chunks of the load cases in parallel
+        try:
+            self.sr_workers = config['sr_workers']
+        except:
+            self.sr_workers = 1
+        try:
+            self.sr_chunk_size = config['sr_chunk_size']
+        except:
+            self.sr_chunk_size = None
+        self.becas_config = config['BECASWrapper']
+
+        # cache of the failure indices of the load cases
+        try:
+            self.sr_cache = config['sr_cache']
+        except:
+            self.sr_cache = False
+        try:
+            self.sr_cache_states = config['sr_cache_states']
+        except:
+            self.sr_cache_states = 10
+        self._cache = {}
+        self._cache_order = []
+
     def solve_nonlinear(self, params, unknowns, resids):
 
 
         becas_hash = params[self.name + ':hash']
         workdir = 'becas_%s_%i' % (self.name, int(becas_hash))
+        self.workdir = workdir
 
         os.chdir(workdir)
-        self.becas.load_cases = params['load_cases_%s' % self.name]
-        self.becas.compute()
-        try:
-            unknowns['blade_failure_index_%s' % self.name] = self.becas.max_failure_ks
-        except:
-            pass
+        loads = params['load_cases_%s' % self.name]
+        if self.fatigue:
+            self.becas.load_cases = loads
+            self.becas.compute()
+            if self.becas.success:
+                unknowns['blade_damage_%s' % self.name] = self.becas.max_damage
+            else:
+                # e.g. without SNMAT.in in the BECAS inputs of the section
+                print('BECAS fatigue failed for section %f' % self.s)
+                unknowns['blade_damage_%s' % self.name] = np.nan
+            os.chdir(self.basedir)
+            return
+
+        if self.load_case_hull:
+            self.hull_cases = hull_load_cases(loads)
+            cases = loads[self.hull_cases]
+        else:
+            cases = loads
+        if self.sr_cache and self.becas.screening_threshold is None:
+            self.recover_cached(cases)
+        else:
+            self.recover(cases)
+        if self.becas.screening_threshold is not None:
+            unknowns['blade_failure_exceeded_%s' % self.name] = float(self.becas.screening_exceeded)
+        fks = np.asarray(self.becas.max_failure_ks)
+        if self.becas.success and fks.shape == (cases.shape[0],):
+            if self.load_case_hull:
+                W = hull_weights(loads, self.hull_cases)
+                unknowns['blade_failure_index_%s' % self.name] = np.dot(W, fks)
+            else:
+                unknowns['blade_failure_index_%s' % self.name] = fks
+            if self.region_names is not None:
+                for out, value in [('region', self.region_failure_index),
+                                   ('material', self.material_failure_index)]:
+                    if self.load_case_hull:
+                        value = np.dot(W, value)
+                    unknowns['blade_%s_failure_index_%s' % (out, self.name)] = value
+        else:
+            # do not keep the failure indices of the previous design
+            print('BECAS stress recovery failed for section %f' % self.s)
+            unknowns['blade_failure_index_%s' % self.name] = np.ones(loads.shape[0]) * np.nan
+            if self.region_names is not None:
+                for out in ['region', 'material']:
+                    name = 'blade_%s_failure_index_%s' % (out, self.name)
+                    unknowns[name] = np.ones(unknowns[name].shape) * np.nan
 
         os.chdir(self.basedir)
 
+    def export_paraview(self, cases='critical', background=True):
+        """
+        Export ParaView files of the section and the selected load cases of
+        the last evaluation, see BECASWrapper.export_paraview.
+        """
 
-class SRAggregator(Component):
+        if self.workdir is None:
+            raise RuntimeError('section %s has not been evaluated' % self.name)
+        os.chdir(self.workdir)
+        try:
+            return self.becas.export_paraview(cases, background)
+        finally:
+            os.chdir(self.basedir)
+
+    def recover(self, loads):
+        """
+        Recover the load cases, in parallel if sr_workers > 1.
+
+        parameters
+        ----------
+        loads: array
+            section load vectors. Size ((ncases, 6))
+        """
+
+        if self.sr_workers > 1 and loads.shape[0] > 1:
+            self.recover_parallel(loads)
+        else:
+            self.becas.load_cases = loads
+            self.becas.compute()
+        if self.region_names is not None:
+            self.group_failure_index(loads.shape[0])
+
+    def group_failure_index(self, ncase):
+        """
+        Map the KS aggregated failure indices of the regions and materials
+        of the section, see BECASWrapper.aggregate_failure, to all regions
+        and materials of the blade in region_failure_index and
+        material_failure_index.
+
+        parameters
+        ----------
+        ncase: int
+            number of recovered load cases
+        """
+
+        becas = self.becas
+        self.region_failure_index = np.zeros((ncase, len(self.region_names)))
+        fks = np.asarray(becas.region_failure_ks)
+        if fks.shape == (ncase, len(becas.region_names)):
+            for j, rname in enumerate(becas.region_names):
+                if rname in self.region_names:
+                    self.region_failure_index[:, self.region_names.index(rname)] = fks[:, j]
+        self.material_failure_index = np.zeros((ncase, len(self.material_index)))
+        fks = np.asarray(becas.material_failure_ks)
+        if fks.shape == (ncase, len(becas.material_ids)):
+            for j, k in enumerate(becas.material_ids):
+                if 0 < k <= len(self.material_index):
+                    self.material_failure_index[:, self.material_index[k - 1]] = fks[:, j]
+
+    def recover_cached(self, loads):
+        """
+        Recover only the load cases that are not in the cache of the current
+        section state and set max_failure and max_failure_ks of the
+        BECASWrapper instance of the section, and the failure indices of
+        the regions and materials, for all cases.
+
+        parameters
+        ----------
+        loads: array
+            section load vectors. Size ((ncases, 6))
+        """
+
+        state = self.becas.input_digest()
+        if state not in self._cache:
+            self._cache[state] = {}
+            self._cache_order.append(state)
+            while len(self._cache_order) > self.sr_cache_states:
+                del self._cache[self._cache_order.pop(0)]
+        cache = self._cache[state]
+
+        loads = np.asarray(loads, dtype=float)
+        keys = [row.tobytes() for row in loads]
+        new = []
+        pending = set()
+        for i, key in enumerate(keys):
+            if key not in cache and key not in pending:
+                new.append(i)
+                pending.add(key)
+        if len(new) > 0:
+            self.recover(loads[new])
+            if not self.becas.success:
+                return
+            for j, i in enumerate(new):
+                groups = None
+                if self.region_names is not None:
+                    groups = (self.region_failure_index[j], self.material_failure_index[j])
+                cache[keys[i]] = (self.becas.max_failure[j], self.becas.max_failure_ks[j], groups)
+
+        self.becas.load_cases = loads
+        self.becas.max_failure = np.array([cache[key][0] for key in keys])
+        self.becas.max_failure_ks = np.array([cache[key][1] for key in keys])
+        if self.region_names is not None:
+            self.region_failure_index = np.array([cache[key][2][0] for key in keys])
+            self.material_failure_index = np.array([cache[key][2][1] for key in keys])
+        self.becas.success = True
+
+    def recover_parallel(self, loads):
+        """
+        Recover the load cases in chunks in a pool of sr_workers processes
+        and merge max_failure, max_failure_ks, critical_elements and the
+        material and region aggregates of the chunks into the BECASWrapper
+        instance of the section. The element failure indices are not
+        merged, and failure_elements is left empty.
+
+        parameters
+        ----------
+        loads: array
+            section load vectors. Size ((ncases, 6))
+        """
+
+        ncase = loads.shape[0]
+        if self.sr_chunk_size is None:
+            nchunk = min(self.sr_workers, ncase)
+        else:
+            nchunk = int(np.ceil(ncase / float(self.sr_chunk_size)))
+        chunks = np.array_split(np.arange(ncase), nchunk)
+        workdir = os.getcwd()
+        tasks = [(workdir, self.becas_config, self.s, loads[c]) for c in chunks]
+
+        pool = multiprocessing.Pool(min(self.sr_workers, nchunk))
+        try:
+            results = pool.map(_recover_chunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+        becas = self.becas
+        becas.load_cases = loads
+        becas.failure_elements = []
+        becas.screening_exceeded = False
+        becas.success = True
+        for name in ['max_failure', 'max_failure_ks']:
+            setattr(becas, name, np.ones(ncase) * np.nan)
+        ok = [res for res in results if res is not None]
+        # the groups are the same for all chunks of the section
+        for ids, names in [('material_ids', ['material_max_failure', 'material_failure_ks']),
+                           ('region_names', ['region_max_failure', 'region_failure_ks'])]:
+            ngroup = len(ok[0][ids]) if len(ok) > 0 else 0
+            setattr(becas, ids, ok[0][ids] if len(ok) > 0 else [])
+            for name in names:
+                setattr(becas, name, np.ones((ncase, ngroup)) * np.nan)
+
+        critical = []
+        for c, res in zip(chunks, results):
+            if res is None:
+                print('BECAS crashed for load cases %i-%i of section %f' % (c[0], c[-1], self.s))
+                becas.success = False
+                continue
+            becas.max_failure[c] = res['max_failure']
+            becas.max_failure_ks[c] = res['max_failure_ks']
+            becas.screening_exceeded |= res['screening_exceeded']
+            for name in ['material_max_failure', 'material_failure_ks',
+                         'region_max_failure', 'region_failure_ks']:
+                if np.asarray(res[name]).shape == (c.shape[0], getattr(becas, name).shape[1]):
+                    getattr(becas, name)[c] = res[name]
+            # load case numbers of the chunk in the load cases of the section
+            crit = np.array(res['critical_elements']).reshape(-1, 3)
+            crit[:, 1] += c[0]
+            critical.append(crit)
+
+        # elements with the highest failure indices of all chunks
+        n = max([crit.shape[0] for crit in critical] + [0])
+        critical = np.vstack(critical + [np.zeros((0, 3))])
+        critical = critical[np.argsort(-critical[:, 2], kind='mergesort')]
+        _, first = np.unique(critical[:, 0], return_index=True)
+        becas.critical_elements = critical[np.sort(first)][:n]
 
 
+class SRAggregator(Component):
+    """
+    Gathers the failure indices of all sections and aggregates them with
+    the KS function, see ks_aggregate, with config['rho_ks'] as aggregation
+    parameter. NaN failure indices are left out of the aggregation,
+    flagged in blade_failure_index_nan and set to zero in
+    blade_failure_index, so the outputs stay finite. The derivatives of
+    blade_failure_index_ks w.r.t. the failure indices of the sections are
+    exact. blade_failure_index and blade_failure_index_nan only gather the
+    sections and are passed by object without derivatives, since their
+    Jacobian would be a dense (ncases * nsec, ncases) block per section;
+    constrain the section outputs blade_failure_index_sec%03d instead.
+    """
+
     def __init__(self, config, s, ncases):
         super(SRAggregator, self).__init__()
 
         self.nsec = s.shape[0]
+        self.ncases = ncases
         for i in range(s.shape[0]):
             name = 'sec%03d' % i
             self.add_param('blade_failure_index_%s' % name, np.zeros(ncases))
 
-        self.add_output('blade_failure_index', np.zeros((ncases, s.shape[0])))
+        self.add_output('blade_failure_index', np.zeros((ncases, s.shape[0])),
+                        pass_by_obj=True)
         self.add_output('blade_failure_index_ks', 0.)
+        self.add_output('blade_failure_index_nan', np.zeros((ncases, s.shape[0])),
+                        pass_by_obj=True)
 
-    def solve_nonlinear(self, params, unknowns, resids):
+        try:
+            self.rho_ks = config['rho_ks']
+        except:
+            self.rho_ks = 50.
+        self._dks = np.zeros((ncases, s.shape[0]))
+        self._nan = np.zeros((ncases, s.shape[0]), dtype=bool)
 
         try:
-            for i in range(self.nsec):
-                unknowns['blade_failure_index'][:, i] = params['blade_failure_index_sec%03d'%i]
-                if np.isnan(unknowns['blade_failure_index'][:, i]).any():
-                    print 'NaN in failure index'
-                    unknowns['blade_failure_index'][:, i] = 0.
-
-            unknowns['blade_failure_index_ks'] = ksfunc(unknowns['blade_failure_index'])
-            if np.isnan(unknowns['blade_failure_index_ks']):
-                print 'NaN in failure index_ks'
-                unknowns['blade_failure_index_ks'] = 0.
+            self.fatigue = config['fatigue']
         except:
-            print 'stress recovery failed!'
+            self.fatigue = False
+        if self.fatigue:
+            for i in range(s.shape[0]):
+                self.add_param('blade_damage_sec%03d' % i, 0.)
+            self.add_output('blade_damage', np.zeros(s.shape[0]))
+            self.add_output('blade_max_damage', 0.)
+
+    def solve_nonlinear(self, params, unknowns, resids):
+
+        if self.fatigue:
+            for i in range(self.nsec):
+                unknowns['blade_damage'][i] = params['blade_damage_sec%03d' % i]
+            unknowns['blade_max_damage'] = unknowns['blade_damage'].max()
+            return
+
+        for i in range(self.nsec):
+            unknowns['blade_failure_index'][:, i] = params['blade_failure_index_sec%03d'%i]
+
+        ks, self._dks, nan = ks_aggregate(unknowns['blade_failure_index'], self.rho_ks)
+        self._nan = nan
+        unknowns['blade_failure_index'][nan] = 0.
+        unknowns['blade_failure_index_nan'] = nan.astype(float)
+        if np.isnan(ks):
+            ks = 0.
+        unknowns['blade_failure_index_ks'] = ks
+
+    def linearize(self, params, unknowns, resids):
+
+        J = {}
+        if self.fatigue:
+            imax = np.argmax(unknowns['blade_damage'])
+            for i in range(self.nsec):
+                name = 'blade_damage_sec%03d' % i
+                J['blade_damage', name] = np.zeros((self.nsec, 1))
+                J['blade_damage', name][i, 0] = 1.
+                J['blade_max_damage', name] = np.array([[float(i == imax)]])
+            return J
+
+        # blade_failure_index is passed by object, only the KS aggregate
+        # has derivatives
+        for i in range(self.nsec):
+            name = 'blade_failure_index_sec%03d' % i
+            J['blade_failure_index_ks', name] = self._dks[:, i].reshape(1, self.ncases)
+        return J
 
 class BECASStressRecovery(Group):
     """
@@ -98,9 +552,34 @@ class BECASStressRecovery(Group):
     blade_failure_index_%03d: array
         failure index computing using the method specified in blade structural
         definition. size ((nsec, ncase))
+    blade_failure_index_ks: float
+        failure index of all sections and load cases aggregated with the
+        KS function, leaving out NaN failure indices, which are set to zero
+        in blade_failure_index
+    blade_failure_index: array
+        failure indices of all sections, passed by object without
+        derivatives. size ((ncase, nsec))
+    blade_failure_index_nan: array
+        1 for the NaN failure indices of the sections, passed by object
+        without derivatives. size ((ncase, nsec))
+    blade_damage: array
+        max fatigue damage of each section for the load time series
+        in load_cases_sec%03d, only with config['fatigue']. size (nsec)
+    blade_max_damage: float
+        spanwise max fatigue damage, only with config['fatigue']
+    blade_failure_exceeded_%03d: float
+        1 if a load case of the section exceeded the screening_threshold
+        set in config['BECASWrapper']
+    blade_region_failure_index_%03d: array
+        failure index of each region followed by each web of st3d
+        aggregated with the KS function, only with st3d given.
+        size ((ncase, nregion + nweb))
+    blade_material_failure_index_%03d: array
+        failure index of each material of st3d aggregated with the
+        KS function, only with st3d given. size ((ncase, nmat))
     """
 
-    def __init__(self, config, s, ncases):
+    def __init__(self, config, s, ncases, st3d=None):
         super(BECASStressRecovery, self).__init__()
         self.nsec = s.shape[0]
         self.ncases = ncases
@@ -108,7 +587,36 @@ class BECASStressRecovery(Group):
 
         par = self.add('par', ParallelGroup(), promotes=['*'])
 
+        self.sections = []
         for i in range(self.nsec):
-            b = par.add('sec%03d' % i, BECASCSStressRecovery('sec%03d' % i, config, s[i], ncases), promotes=['*'])
+            b = par.add('sec%03d' % i, BECASCSStressRecovery('sec%03d' % i, config, s[i], ncases, st3d),
+                        promotes=['*'])
+            self.sections.append(b)
 
         self.add('agg', SRAggregator(config, s, ncases), promotes=['*'])
+
+    def export_paraview(self, cases='critical', background=True):
+        """
+        Export ParaView files of all sections for the last evaluation, by
+        default of the critical load case of each section in background
+        processes, e.g. for the final or best design of an optimization.
+        The exports are not part of the evaluations themselves, which no
+        longer write ParaView files by default.
+
+        parameters
+        ----------
+        cases: str or list
+            load cases to export, see BECASWrapper.export_paraview
+        background: bool
+            start the exports in background processes
+
+        returns
+        -------
+        processes: list
+            subprocess.Popen instances of the background processes
+        """
+
+        processes = []
+        for sec in self.sections:
+            processes.append(sec.export_paraview(cases, background))
+        return processes
@@ -0,0 +1,201 @@
+
+import numpy as np
+
+__all__ = ['SectionSurrogate']
+
+
+class SectionSurrogate(object):
+    """
+    Trust-region surrogate of the outputs of a cross section as
+    function of its layer thicknesses and angles, tvec.
+
+    The surrogate is a cubic radial basis function interpolation with a
+    linear polynomial tail, fitted to the sections already computed with
+    BECAS close to the query point. A prediction is only returned when the
+    nearest computed section lies within the trust region of the query point
+    and the leave-one-out error of the nearest section is below the
+    tolerance, otherwise the section has to be computed and added with
+    add_sample.
+
+    The thicknesses are normalized with the thicknesses of the first
+    sample and the angles with angle_scale, such that the trust region
+    radius is a relative change of the thicknesses. The samples are
+    discarded when the plies with nonzero thickness or the other
+    inputs of the section change.
+
+    parameters
+    ----------
+    radius: float
+        trust region radius in normalized variables (max norm)
+    tol: float
+        tolerance on the estimated relative error of the outputs
+    min_samples: int
+        minimum number of samples within the trust region for a prediction
+    max_samples: int
+        maximum number of samples used in a fit
+    angle_scale: float
+        normalization of the ply angles in degrees
+    """
+
+    def __init__(self, nvar, **kwargs):
+        """
+        parameters
+        ----------
+        nvar: int
+            number of layers, i.e. half the size of tvec
+        """
+
+        self.nvar = nvar
+        self.radius = 0.05
+        self.tol = 1.e-3
+        self.min_samples = 3
+        self.max_samples = 20
+        self.angle_scale = 10.
+
+        for k, w in kwargs.iteritems():
+            try:
+                setattr(self, k, w)
+            except:
+                pass
+
+        self.reset()
+
+    def reset(self):
+        """
+        discard all samples.
+        """
+
+        self.key = None
+        self.active = None
+        self.scale = None
+        self.X = np.zeros((0, 0))
+        self.Y = np.zeros((0, 0))
+
+    def _same_key(self, key):
+
+        if self.key is None or len(key) != len(self.key):
+            return False
+        for a, b in zip(key, self.key):
+            if not np.array_equal(a, b):
+                return False
+        return True
+
+    def _active(self, tvec):
+
+        nonzero = tvec[:self.nvar] > 0.
+        return np.append(nonzero, nonzero)
+
+    def _normalize(self, tvec):
+
+        return tvec[self.active] / self.scale
+
+    def add_sample(self, tvec, y, key=()):
+        """
+        add a computed section to the surrogate.
+
+        parameters
+        ----------
+        tvec: array
+            layer thicknesses and angles. Size (2 * nvar)
+        y: array
+            flattened outputs of the section
+        key: list
+            list of arrays of the other inputs of the section,
+            the samples are discarded when these change
+        """
+
+        tvec = np.asarray(tvec, dtype=float)
+        if not self._same_key(key) or \
+           not np.array_equal(self._active(tvec), self.active):
+            self.reset()
+            self.key = [np.array(k, copy=True) for k in key]
+            self.active = self._active(tvec)
+            t = tvec[:self.nvar][self.active[:self.nvar]]
+            self.scale = np.append(t, self.angle_scale * np.ones(t.shape[0]))
+            self.X = np.zeros((0, self.scale.shape[0]))
+            self.Y = np.zeros((0, np.asarray(y).size))
+
+        self.X = np.vstack([self.X, self._normalize(tvec)])
+        self.Y = np.vstack([self.Y, np.asarray(y, dtype=float).flatten()])
+
+    def predict(self, tvec, key=()):
+        """
+        predict the outputs of a section.
+
+        parameters
+        ----------
+        tvec: array
+            layer thicknesses and angles. Size (2 * nvar)
+        key: list
+            list of arrays of the other inputs of the section
+
+        returns
+        -------
+        y: array
+            predicted outputs, or None if the section is outside
+            the trust region or the estimated error is too large
+        """
+
+        tvec = np.asarray(tvec, dtype=float)
+        if self.X.shape[0] == 0 or not self._same_key(key) or \
+           not np.array_equal(self._active(tvec), self.active):
+            return None
+
+        x = self._normalize(tvec)
+        dist = np.abs(self.X - x).max(axis=1)
+        if dist.min() > self.radius:
+            return None
+        local = np.argsort(dist)[:self.max_samples]
+        local = local[dist[local] <= 2. * self.radius]
+        if local.shape[0] < self.min_samples:
+            return None
+        X = self.X[local]
+        Y = self.Y[local]
+
+        # leave-one-out error of the nearest sample
+        y0 = _rbf_fit_predict(X[1:], Y[1:], X[0])
+        yscale = np.abs(Y).max(axis=0)
+        yscale = np.maximum(yscale, 1.e-8 * yscale.max())
+        yscale[yscale == 0.] = 1.
+        self.error = np.abs((y0 - Y[0]) / yscale).max()
+        if self.error > self.tol:
+            return None
+
+        return _rbf_fit_predict(X, Y, x)
+
+
+def _rbf_fit_predict(X, Y, x):
+    """
+    fit a cubic radial basis function interpolation with a linear tail
+    to the samples and evaluate it at x.
+
+    parameters
+    ----------
+    X: array
+        sample points. Size ((n, d))
+    Y: array
+        sample values. Size ((n, m))
+    x: array
+        evaluation point. Size (d)
+
+    returns
+    -------
+    y: array
+        interpolated values at x. Size (m)
+    """
+
+    n, d = X.shape
+    Xc = X - x
+    r = np.sqrt(((Xc[:, None, :] - Xc[None, :, :])**2).sum(axis=2))
+    A = np.zeros((n + d + 1, n + d + 1))
+    A[:n, :n] = r**3
+    A[:n, n] = 1.
+    A[:n, n+1:] = Xc
+    A[n:, :n] = A[:n, n:].T
+    b = np.zeros((n + d + 1, Y.shape[1]))
+    b[:n] = Y
+    coef = np.dot(np.linalg.pinv(A), b)
+
+    # the tail is centered at x
+    phi = np.sqrt((Xc**2).sum(axis=1))**3
+    return np.dot(phi, coef[:n]) + coef[n]
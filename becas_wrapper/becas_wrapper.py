@@ -4,11 +4,22 @@ __all__ = ['BECASWrapper']
 import os
 import numpy as np
 import time
+import hashlib
 import commands
 import subprocess
 import matplotlib as mpl
 import scipy.io.matlab as spio
 
+from becas_numpy import BECASNumpy, check_failure
+from beamprops import km2hawc2, section_shear_modulus
+from loadcases import iter_load_chunks, FailureAccumulator, group_failure, \
+                      ks_aggregate
+
+# section states held in memory by the instances that computed them,
+# by the absolute path of their utils_rst_filename, see share_section
+_section_store = {}
+
+
 def ksfunc(p, rho=50., side=1.):
     """
     Kreisselmeier and Steinhauser constraint aggregation function
@@ -38,14 +49,32 @@ class BECASWrapper(object):
     parameters
     ----------
     exec_mode: str
-        options: 'oct2py', 'octave', 'matlab'.
-        Run BECAS either using the Oct2Py bridge, a system call to matlab or to octave.
+        options: 'oct2py', 'oct2py_session', 'octave', 'matlab', 'numpy'.
+        Run BECAS either using the Oct2Py bridge, a system call to matlab or to octave,
+        or compute the cross section properties and recover stresses in-process
+        with the native NumPy/SciPy implementation of BECAS in becas_numpy.
+        'oct2py_session' keeps an Octave session open between calls holding
+        the mesh of the section, so that subsequent calls with an unchanged
+        mesh only push the material inputs to Octave.
+        With 'numpy' and 'oct2py_session' the section state of a stiffness
+        run is shared in memory with instances in the same process that
+        recover stresses from the same utils_rst_filename, which then read
+        it directly instead of loading the saved file, see share_section.
     analysis_mode: str
-        options: 'stiffness', 'stress_recovery', 'combined'.
+        options: 'stiffness', 'stress_recovery', 'combined', 'fatigue'.
         call BECAS to either compute stiffness properties
-        or to recover stresses or both.
+        or to recover stresses or both. 'fatigue' computes the fatigue
+        damage of the elements for load_cases given as a time series
+        (only exec_mode 'numpy').
     utils_rst_filebase: str
-        file base name for mat files saved with BECAS utils. Default 'becas_utils'.
+        file base name for mat files saved with BECAS utils, or npz files
+        with the section arrays in exec_mode 'numpy'. Default 'becas_utils'.
+    save_state: bool
+        save the section state needed for stress recovery to
+        utils_rst_filename in exec_mode 'numpy' and 'oct2py_session', where
+        stress recovery in the same process, including forked sr_workers,
+        shares the state in memory, see share_section. Only needed for
+        stress recovery in other processes, e.g. under MPI. Default False.
     path_becas: str (deprecated)
         absolute path to BECAS source files
     timeout: float
@@ -57,11 +86,19 @@ class BECASWrapper(object):
     checkmesh: bool
         Activate BECAS check mesh
     plot_paraview: bool
-        Export plot files for ParaView
+        Export plot files for ParaView of the section and of every load
+        case in every call. Default False, since this is heavy on disk I/O
+        inside optimization loops; see export_paraview for exporting
+        selected load cases of a design on request.
     span_pos: float
         spanwise position of section along blade
     hawc2_FPM: bool
         Compute fully populated stiffness matrix beam properties
+    hawc2_numpy: bool
+        Compute the HAWC2 beam properties from the stiffness and mass
+        matrices with km2hawc2 in beamprops instead of BECAS_Becas2Hawc2
+        and the BECAS2HAWC2.out file (only used in exec_mode 'octave'
+        and 'matlab')
     rho_ks: float
         Kreisselmeier and Steinhauser aggregation parameter
     nl_2d: array
@@ -99,9 +136,40 @@ class BECASWrapper(object):
           | * rho the material density.
         The rotation of the material constitutive tensor is described in
         Section 3.2.
+    failmat: array
+        size: ((n_m, 19)). Failure criterion and limits of each material as
+        read from FAILMAT.in, only used in exec_mode 'numpy'.
+    snmat: array
+        size: ((n_m, 2)). S-N curve parameters of each material as read
+        from SNMAT.in: the Woehler exponent m and the stress range S1 with
+        a life of one cycle, N = (S1 / S)**m, only used in analysis_mode
+        'fatigue'.
+    fatigue_component: int
+        stress component in the material coordinate systems used for
+        fatigue, in the BECAS ordering 11 22 12 13 23 33. Default 0.
     load_cases: array
         List of section load vectors to calculate
         stresses, strains and perform failure analysis
+    recovery_regions: list
+        names of the regions and webs, e.g. the dominant_elsets, to which
+        stress recovery is restricted, see REGIONS.in (only exec_mode 'numpy')
+    recovery_top_k: int
+        restrict stress recovery to the recovery_top_k elements with the
+        highest failure indices in the previous call, in addition to the
+        recovery_regions (only exec_mode 'numpy')
+    full_sweep_interval: int
+        recover all elements every full_sweep_interval calls when stress
+        recovery is restricted, 0 to only recover all elements in the
+        first call
+    n_critical: int
+        number of elements in critical_elements when recovery_top_k is zero
+    screening_threshold: float
+        when set, only check whether any load case exceeds this failure
+        index: the load cases are recovered in the order of their failure
+        indices in the previous call and recovery stops at the first case
+        exceeding the threshold (only exec_mode 'numpy')
+    screening_chunk_size: int
+        number of load cases recovered at a time when screening
 
     returns
     -------
@@ -137,6 +205,57 @@ class BECASWrapper(object):
         max failure index for each laod case aggregated with simple max function
     max_failure_ks: array
         max failure index for each laod case aggregated with ks function
+    max_failure_ks_grad: array
+        derivatives of max_failure_ks w.r.t. the failure indices of the
+        elements, size ((ncases, ne, 6)) (only exec_mode 'numpy')
+    max_failure_nan: array
+        True for the load cases with NaN failure indices, which are left
+        out of max_failure_ks (only exec_mode 'numpy')
+    element_max_failure: array
+        max failure index of each element over all load cases of the
+        series passed to stress_recovery_stream
+    element_failure_ks: array
+        failure index of each element over all load cases of the series
+        aggregated with ks function
+    stream_failure_ks: float
+        failure index over all elements and load cases of the series
+        aggregated with ks function
+    critical_elements: array
+        element numbers, load cases and failure indices of the elements with
+        the highest failure indices, sorted by decreasing failure index,
+        size ((n, 3)) (only exec_mode 'numpy')
+    recovered_elements: array
+        indices of the elements recovered in the last call, None when
+        all elements were recovered
+    screening_exceeded: bool
+        True if a load case exceeded screening_threshold
+    screening_ncases: int
+        number of load cases recovered in the last call
+    max_failure_lower_bound: float
+        max failure index of the recovered load cases, a lower bound of the
+        max failure index of all load cases when screening stopped early.
+        The failure indices of the other cases are NaN
+    material_ids: array
+        material numbers of the section
+    material_max_failure: array
+        max failure index of each material for each load case,
+        size ((ncases, len(material_ids)))
+    material_failure_ks: array
+        failure index of each material for each load case aggregated
+        with ks function, size ((ncases, len(material_ids)))
+    region_names: list
+        names of the regions and webs of the section as read from
+        REGIONS.in written by CS2DtoBECAS
+    region_max_failure: array
+        max failure index of each region for each load case,
+        size ((ncases, len(region_names)))
+    region_failure_ks: array
+        failure index of each region for each load case aggregated
+        with ks function, size ((ncases, len(region_names)))
+    damage: array
+        fatigue damage of each element
+    max_damage: float
+        max fatigue damage of the section
     """
 
     def __init__(self, spanpos=0., **kwargs):
@@ -149,20 +268,43 @@ class BECASWrapper(object):
         self.analysis_mode = 'stiffness'
         self.debug_mode = False
         self.utils_rst_filebase = 'becas_utils'
-        self.path_becas = os.path.join(os.environ['BECAS_BASEDIR'], 'src', 'matlab')
+        self.save_state = False
+        self.path_becas = os.path.join(os.environ.get('BECAS_BASEDIR', ''), 'src', 'matlab')
         self.timeout = 180.
         self.path_input = 'becas_inputs/BECAS_SECTION%3.3f' % spanpos
         self.path_plots = 'plots'
         self.checkmesh = False
-        self.plot_paraview = True
+        self.plot_paraview = False
         self.spanpos = spanpos
         self.hawc2_FPM = False
+        self.hawc2_numpy = False
         self.rho_ks = 50.
 
         self.nl_2d = np.array([])
         self.el_2d = np.array([], dtype=int)
         self.matprops = np.array([])
 
+        # persistent Octave session used with exec_mode='oct2py_session'
+        self.octave = None
+        self._session_mesh = None
+
+        # native section kept between calls with exec_mode='numpy'
+        self.section = None
+        self._numpy_mesh = None
+        self.failmat = None
+        self.snmat = None
+        self.fatigue_component = 0
+
+        # restriction of stress recovery to the critical elements
+        self.recovery_regions = []
+        self.recovery_top_k = 0
+        self.full_sweep_interval = 10
+        self.n_critical = 10
+
+        # early exit of stress recovery at a failure threshold
+        self.screening_threshold = None
+        self.screening_chunk_size = 1
+
         for k, w in kwargs.iteritems():
             try:
                 setattr(self, k, w)
@@ -188,6 +330,34 @@ class BECASWrapper(object):
         self.strain = np.array([])
         self.max_failure = np.array([])
         self.max_failure_ks = np.array([])
+        self.max_failure_ks_grad = np.array([])
+        self.max_failure_nan = np.array([])
+        self.element_max_failure = np.array([])
+        self.element_failure_ks = np.array([])
+        self.stream_failure_ks = 0.
+        self.damage = np.array([])
+        self.max_damage = 0.
+
+        self.critical_elements = np.zeros((0, 3))
+        self.recovered_elements = None
+        self._recovery_count = 0
+        self._critical_idx = None
+
+        self.screening_exceeded = False
+        self.screening_ncases = 0
+        self.max_failure_lower_bound = 0.
+        self._case_criticality = None
+
+        # material number and region of the elements, see load_element_groups
+        self.el_material = None
+        self.el_region = None
+        self.material_ids = np.array([])
+        self.material_max_failure = np.array([])
+        self.material_failure_ks = np.array([])
+        self.region_names = []
+        self._region_names = []
+        self.region_max_failure = np.array([])
+        self.region_failure_ks = np.array([])
 
     def compute(self):
         """
@@ -197,13 +367,27 @@ class BECASWrapper(object):
         tt = time.time()
 
         try:
+            if self.analysis_mode == 'fatigue' and self.exec_mode != 'numpy':
+                raise RuntimeError('analysis_mode fatigue requires exec_mode numpy')
+
             if self.exec_mode == 'oct2py':
                 self.execute_oct2py()
 
+            elif self.exec_mode == 'oct2py_session':
+                self.execute_session()
+
+            elif self.exec_mode == 'numpy':
+                self.execute_numpy()
+
             elif self.exec_mode in ['matlab', 'octave']:
                 self.execute_shell()
             self.success = True
         except:
+            # the shared state may be incomplete
+            self.unshare_section()
+            # the state of the session is unknown, start a fresh one next time
+            if self.exec_mode == 'oct2py_session':
+                self.close_session()
             if self.hawc2_FPM:
                 self.cs_props = np.zeros(30)
             else:
@@ -258,40 +442,621 @@ class BECASWrapper(object):
             # print out
             # self._logger.info(out)
 
+        self.read_outputs()
+
+    def execute_session(self):
+        """
+        Execute BECAS in an Octave session which is kept open between calls.
+
+        The mesh of the section is held in the session and only pushed again
+        when the N2D.in or E2D.in input files have changed. Otherwise only the
+        element material assignments and material properties are updated.
+        BECAS does not provide an API for updating only the material dependent
+        parts of utils, so utils is rebuilt by BECAS_Utils from the arrays
+        in the session, which avoids reading and parsing the input files
+        in Octave. Only csprops and constitutive are saved to
+        utils_rst_filename, and utils and solutions only with save_state.
+        """
+
+        self.utils_rst_filename = self.utils_rst_filebase + '%3.3f.mat' % (self.spanpos)
+
+        # session holding utils and solutions of a stiffness run
+        owner = None
+        if self.analysis_mode == 'stress_recovery':
+            owner = self.shared_section()
+
+        # the session may have been started from another directory
+        out_str = ["cd('%s');\n" % os.getcwd()]
+        if self.analysis_mode in ['stiffness', 'combined']:
+            if not self.dry_run:
+                self.push_session_inputs()
+            out_str.append("options.foldername=fullfile('%s');\n" % os.path.join(os.getcwd(), self.path_input))
+            out_str = self.add_utils(out_str, 'options, nl_2d, el_2d, emat, matprops')
+            out_str = self.add_stiffness_calc(out_str)
+
+        if self.analysis_mode in ['combined', 'stress_recovery']:
+            if not self.dry_run and self.octave is None and owner is None:
+                self.start_session()
+            out_str = self.add_stress_recovery(out_str, owner is not None)
+
+        self.out_str = out_str
+
+        if not self.dry_run:
+            if owner is not None:
+                owner.octave.eval(''.join(out_str))
+            else:
+                self.octave.eval(''.join(out_str))
+                if self.analysis_mode in ['stiffness', 'combined']:
+                    self.share_section()
+
+        self.read_outputs()
+
+    def execute_numpy(self):
+        """
+        Compute the cross section properties and recover stresses
+        in-process with the native NumPy/SciPy implementation of BECAS.
+
+        The inputs are read from path_input if defined, otherwise the
+        nl_2d, el_2d, emat, matprops and failmat arrays are used.
+        The section is kept between calls, and as long as the mesh is
+        unchanged only the material dependent parts are recomputed.
+        With save_state the arrays needed for stress recovery are saved to
+        utils_rst_filebase%3.3f.npz for a stress_recovery run in another
+        process.
+        No scripts or Octave processes are involved, and
+        plot_paraview and checkmesh are ignored.
+        """
+
+        self.utils_rst_filename = self.utils_rst_filebase + '%3.3f.npz' % (self.spanpos)
+
+        if self.analysis_mode in ['stiffness', 'combined']:
+            if self.path_input != '':
+                self.load_input_vars()
+
+            if self.dry_run:
+                return
+
+            if self._numpy_mesh is not None and \
+               np.array_equal(self._numpy_mesh[0], self.nl_2d) and \
+               np.array_equal(self._numpy_mesh[1], self.el_2d):
+                self.section.update_materials(self.emat, self.matprops)
+            else:
+                self.section = BECASNumpy(self.nl_2d, self.el_2d, self.emat, self.matprops)
+                self.section.compute()
+                self._numpy_mesh = (self.nl_2d.copy(), self.el_2d.copy())
+            self.section.failmat = self.failmat
+            self.section.snmat = self.snmat
+            if self.save_state:
+                np.savez(self.utils_rst_filename, **self.section.get_state())
+            elif os.path.exists(self.utils_rst_filename):
+                # do not leave the state of a previous design behind
+                os.remove(self.utils_rst_filename)
+            self.share_section()
+
+            self.cs_props = self.section.becas2hawc2(self.spanpos, self.hawc2_FPM)
+            self.csprops = self.section.csprops.copy()
+            self.masspermaterial = self.section.masspermaterial.copy()
+            self.k_matrix = self.section.Ks.copy()
+            self.m_matrix = self.section.Ms.copy()
+
+        if self.analysis_mode in ['combined', 'stress_recovery', 'fatigue']:
+            if self.dry_run:
+                return
+            if self.analysis_mode in ['stress_recovery', 'fatigue']:
+                self.load_section_state()
+            if self.analysis_mode == 'fatigue':
+                self.fatigue_numpy()
+            else:
+                self.stress_recovery_numpy()
+
+    def load_section_state(self):
+        """
+        Get the native section for stress recovery from the instance
+        sharing it in memory, see share_section, or else load it from
+        utils_rst_filename.
+        """
+
+        owner = self.shared_section()
+        if owner is not None:
+            self.section = owner.section
+        else:
+            if not os.path.exists(self.utils_rst_filename):
+                raise RuntimeError('utils_rst_filename %s was not found, set save_state '
+                                   'for stress recovery in another process' % self.utils_rst_filename)
+            self.section = BECASNumpy.from_state(np.load(self.utils_rst_filename))
+        self._numpy_mesh = None
+
+    def share_section(self):
+        """
+        Register this instance as holder of the section state saved to
+        utils_rst_filename, i.e. the native section with exec_mode 'numpy'
+        or utils and solutions in the Octave session with exec_mode
+        'oct2py_session'. Stress recovery with the same utils_rst_filename
+        in the same process then reads the state directly instead of
+        loading the file. The state stays consistent with the file since
+        both are updated in every stiffness run.
+        """
+
+        _section_store[os.path.abspath(self.utils_rst_filename)] = (os.getpid(), self)
+
+    def unshare_section(self):
+        """
+        Remove the section state of this instance from the shared states.
+        """
+
+        try:
+            key = os.path.abspath(self.utils_rst_filename)
+        except:
+            return
+        if key in _section_store and _section_store[key][1] is self:
+            del _section_store[key]
+
+    def shared_section(self):
+        """
+        Instance holding the section state of utils_rst_filename in memory,
+        or None if the state has to be loaded from the file.
+        """
+
+        key = os.path.abspath(self.utils_rst_filename)
+        if key not in _section_store:
+            return None
+        pid, owner = _section_store[key]
+        if owner is self or owner.exec_mode != self.exec_mode:
+            return None
+        # forked worker processes get a copy of the native section,
+        # but must not use the Octave session of the parent process
+        if self.exec_mode == 'numpy' and owner.section is not None and \
+           owner._numpy_mesh is not None:
+            return owner
+        if self.exec_mode == 'oct2py_session' and owner.octave is not None and \
+           pid == os.getpid():
+            return owner
+        return None
+
+    def compute_sensitivities(self, directions, step=1.e-6):
+        """
+        Derivatives of cs_props, csprops, k_matrix and m_matrix w.r.t.
+        changes of the inputs of the last computed section, see
+        BECASNumpy.compute_sensitivities. Only available with
+        exec_mode 'numpy'.
+        """
+
+        if self.exec_mode != 'numpy' or self._numpy_mesh is None:
+            raise RuntimeError('Sensitivities require a section computed with exec_mode numpy')
+
+        return self.section.compute_sensitivities(directions, step, self.spanpos, self.hawc2_FPM)
+
+    def stress_recovery_numpy(self):
+        """
+        Recover strains and stresses in the element centers and evaluate
+        the failure criteria of all load cases with the native section.
+        """
+
+        loads = np.atleast_2d(self.load_cases)
+        elements = self.select_recovery_elements()
+        idx = slice(None) if elements is None else elements
+        failmat = np.atleast_2d(self.section.failmat)[self.section.el_mat[idx]]
+        if self.screening_threshold is None:
+            strain, strain_m = self.section.compute_strains(loads, elements)
+            stress, stress_m = self.section.compute_stresses(strain, strain_m, elements)
+            failure = check_failure(failmat, stress_m, strain_m)
+            self.screening_ncases = loads.shape[0]
+            self.screening_exceeded = False
+        else:
+            strain_m, stress_m, failure = self.screen_failure_numpy(loads, elements, failmat)
+
+        self.strain = strain_m
+        self.stress = stress_m
+        self.failure_elements = list(failure)
+        self.recovered_elements = elements
+        self.max_failure = failure.max(axis=(1, 2))
+        self.max_failure_ks, self.max_failure_ks_grad, nan = \
+            ks_aggregate(failure, self.rho_ks, axis=(1, 2))
+        self.max_failure_nan = nan.any(axis=(1, 2))
+        self.max_failure_lower_bound = np.nanmax(self.max_failure)
+        # cases that were not recovered keep their failure index of the
+        # previous call for ordering the cases when screening
+        if self._case_criticality is None or self._case_criticality.shape[0] != loads.shape[0]:
+            self._case_criticality = self.max_failure.copy()
+        else:
+            done = ~np.isnan(self.max_failure)
+            self._case_criticality[done] = self.max_failure[done]
+        self.aggregate_failure(failure, self.section.el_mat[idx] + 1, elements)
+        self.update_critical_elements(failure, elements)
+        self._recovery_count += 1
+
+    def screen_failure_numpy(self, loads, elements, failmat):
+        """
+        Recover the load cases in chunks of screening_chunk_size, in the
+        order of their failure indices in the previous call, until a case
+        exceeds screening_threshold.
+
+        The strains, stresses and failure indices of the cases that are
+        not recovered are NaN, so max_failure_lower_bound is a lower bound
+        of the max failure index of all cases.
+
+        parameters
+        ----------
+        loads: array
+            section load vectors. Size ((ncases, 6))
+        elements: array
+            indices of the elements to recover, None for all elements
+        failmat: array
+            failure criterion and limits of the recovered elements
+
+        returns
+        -------
+        strain_m: array
+            strains in the material coordinate systems. Size ((ncases, n, 6))
+        stress_m: array
+            stresses in the material coordinate systems. Size ((ncases, n, 6))
+        failure: array
+            failure indices. Size ((ncases, n, 6))
+        """
+
+        ncase = loads.shape[0]
+        ne = failmat.shape[0]
+        order = np.arange(ncase)
+        if self._case_criticality is not None and self._case_criticality.shape[0] == ncase:
+            crit = np.where(np.isnan(self._case_criticality), -np.inf, self._case_criticality)
+            order = np.argsort(-crit, kind='mergesort')
+
+        strain_m = np.ones((ncase, ne, 6)) * np.nan
+        stress_m = np.ones((ncase, ne, 6)) * np.nan
+        failure = np.ones((ncase, ne, 6)) * np.nan
+        self.screening_exceeded = False
+        self.screening_ncases = 0
+        chunk_size = max(int(self.screening_chunk_size), 1)
+        for i in range(0, ncase, chunk_size):
+            cases = order[i:i + chunk_size]
+            strain, strain_m[cases] = self.section.compute_strains(loads[cases], elements)
+            stress, stress_m[cases] = self.section.compute_stresses(strain, strain_m[cases], elements)
+            failure[cases] = check_failure(failmat, stress_m[cases], strain_m[cases])
+            self.screening_ncases += cases.shape[0]
+            if np.any(failure[cases] > self.screening_threshold):
+                self.screening_exceeded = True
+                break
+        return strain_m, stress_m, failure
+
+    def select_recovery_elements(self):
+        """
+        Indices of the elements to recover, restricted to recovery_regions
+        and the recovery_top_k elements of the previous call, or None
+        when all elements are recovered.
+        """
+
+        ne = self.section.el_mat.shape[0]
+        if len(self.recovery_regions) == 0 and self.recovery_top_k == 0:
+            return None
+        # periodic full sweep as a check of the restriction
+        if self._recovery_count == 0 or (self.full_sweep_interval > 0 and
+                                         self._recovery_count % self.full_sweep_interval == 0):
+            return None
+        if self._critical_idx is not None and self._critical_idx.max() >= ne:
+            self._critical_idx = None
+
+        selected = []
+        if len(self.recovery_regions) > 0:
+            self.load_element_groups()
+            if self.el_region is None or self.el_region.shape[0] != ne:
+                return None
+            ids = [i for i, name in enumerate(self._region_names) if name in self.recovery_regions]
+            selected.append(np.nonzero(np.in1d(self.el_region, ids))[0])
+        if self.recovery_top_k > 0:
+            if self._critical_idx is None:
+                return None
+            selected.append(self._critical_idx)
+        return np.unique(np.concatenate(selected))
+
+    def update_critical_elements(self, failure, elements=None):
+        """
+        Store the elements with the highest failure indices of all load
+        cases for the next call and in critical_elements.
+
+        parameters
+        ----------
+        failure: array
+            failure indices of the recovered elements. Size ((ncases, n, 6))
+        elements: array
+            indices of the recovered elements, None for all elements
+        """
+
+        if elements is None:
+            elements = np.arange(failure.shape[1])
+        fe = failure.max(axis=2)
+        fe[np.isnan(fe)] = -np.inf
+        case = np.argmax(fe, axis=0)
+        fmax = fe[case, np.arange(fe.shape[1])]
+        n = self.recovery_top_k if self.recovery_top_k > 0 else self.n_critical
+        top = np.argsort(-fmax, kind='mergesort')[:n]
+        self._critical_idx = np.sort(elements[top])
+        elnr = self.section.elnr if self.section.elnr is not None else np.arange(1, self.section.el_mat.shape[0] + 1)
+        self.critical_elements = np.array([elnr[elements[top]], case[top], fmax[top]]).T
+
+    def load_element_groups(self):
+        """
+        Read the material number and region of each element, in the
+        element order of E2D.in, from EMAT.in and REGIONS.in in path_input.
+        """
+
+        self.el_material = None
+        self.el_region = None
+        fname = os.path.join(self.path_input, 'E2D.in')
+        if not os.path.exists(fname):
+            return
+        elnr = np.loadtxt(fname)[:, 0].astype(int)
+
+        fname = os.path.join(self.path_input, 'EMAT.in')
+        if os.path.exists(fname):
+            emat = np.atleast_2d(np.loadtxt(fname))
+            idx = np.zeros(emat[:, 0].astype(int).max() + 1, dtype=int)
+            idx[emat[:, 0].astype(int)] = np.arange(emat.shape[0])
+            self.el_material = emat[idx[elnr], 1].astype(int)
+
+        fname = os.path.join(self.path_input, 'REGIONS.in')
+        if os.path.exists(fname):
+            with open(fname) as f:
+                names = f.readline().strip('# \n').split()
+            regions = np.atleast_2d(np.loadtxt(fname)).astype(int)
+            idx = np.zeros(regions[:, 0].max() + 1, dtype=int)
+            idx[regions[:, 0]] = np.arange(regions.shape[0])
+            self.el_region = regions[idx[elnr], 1]
+            self._region_names = names
+
+    def aggregate_failure(self, failure, el_material=None, elements=None):
+        """
+        Max and KS aggregated failure indices of each material and region
+        of the section for all load cases, see group_failure.
+
+        parameters
+        ----------
+        failure: array
+            failure indices of the elements. Size ((ncases, ne, 6))
+        el_material: array
+            material numbers of the elements, read from EMAT.in if not given.
+            Size (ne)
+        elements: array
+            indices of the elements in failure when stress recovery is
+            restricted, see select_recovery_elements
+        """
+
+        failure = np.asarray(failure)
+        if failure.ndim == 2:
+            failure = failure[np.newaxis]
+        ne = failure.shape[1]
+        # the mesh may have changed since the last call
+        self.load_element_groups()
+        idx = slice(None) if elements is None else elements
+        if el_material is None and self.el_material is not None:
+            el_material = self.el_material[idx]
+        el_region = None
+        if self.el_region is not None:
+            el_region = self.el_region[idx]
+
+        if el_material is not None and el_material.shape[0] == ne:
+            self.material_ids, self.material_max_failure, self.material_failure_ks = \
+                group_failure(failure, el_material, self.rho_ks)
+        if el_region is not None and el_region.shape[0] == ne:
+            keys, self.region_max_failure, self.region_failure_ks = \
+                group_failure(failure, el_region, self.rho_ks)
+            self.region_names = [self._region_names[k] for k in keys]
+
+    def fatigue_numpy(self):
+        """
+        Fatigue damage of the elements for the time series of section
+        loads in load_cases with the native section, see
+        BECASNumpy.compute_fatigue.
+        """
+
+        if self.snmat is not None:
+            self.section.snmat = self.snmat
+        self.damage = self.section.compute_fatigue(np.atleast_2d(self.load_cases),
+                                                   component=self.fatigue_component)
+        self.max_damage = self.damage.max()
+
+    def stress_recovery_stream(self, loads, chunk_size=100):
+        """
+        Recover the failure indices of a long series of load cases, e.g.
+        an aeroelastic time series, in chunks with the native section.
+
+        Only the running per element maximum and KS aggregate of the
+        failure indices are kept, so the memory use does not depend on
+        the length of the series. Only available with exec_mode 'numpy'.
+
+        parameters
+        ----------
+        loads: array or iterable
+            section load vectors Fx Fy Fz Mx My Mz, either as an array of
+            size ((ncase, 6)), which can be memory-mapped, or as an
+            iterable of load vectors, see iter_load_chunks
+        chunk_size: int
+            number of load cases recovered at a time
+        """
+
+        if self.exec_mode != 'numpy':
+            raise RuntimeError('Streaming stress recovery requires exec_mode numpy')
+
+        self.utils_rst_filename = self.utils_rst_filebase + '%3.3f.npz' % (self.spanpos)
+        if self.analysis_mode == 'stress_recovery' or self.section is None:
+            self.load_section_state()
+
+        acc = FailureAccumulator(self.section.el_mat.shape[0], self.rho_ks)
+        for chunk in iter_load_chunks(loads, chunk_size):
+            acc.add(self.section.compute_failure(chunk))
+
+        self.element_max_failure = acc.max
+        self.element_failure_ks = acc.ks
+        self.stream_failure_ks = acc.total_ks()
+
+    def start_session(self):
+        """
+        Start the persistent Octave session and add BECAS to its path
+        """
+
+        from oct2py import Oct2Py
+
+        self.octave = Oct2Py()
+        self.octave.timeout = self.timeout
+        self.setup_path()
+        self.octave.eval('BECAS_SetupPath;')
+        self._session_mesh = None
+
+    def close_session(self):
+        """
+        Close the persistent Octave session
+        """
+
+        if self.octave is not None:
+            try:
+                self.octave.exit()
+            except:
+                pass
+        self.octave = None
+        self._session_mesh = None
+
+    def push_session_inputs(self):
+        """
+        Push the BECAS inputs to the persistent Octave session.
+
+        The nodes and elements are only loaded and pushed when the mesh
+        files differ from the ones held in the session.
+        """
+
+        if self.octave is None:
+            self.start_session()
+
+        mesh = hashlib.md5()
+        for fname in ['N2D.in', 'E2D.in']:
+            with open(os.path.join(self.path_input, fname), 'rb') as f:
+                mesh.update(f.read())
+        mesh_id = mesh.hexdigest()
+
+        if mesh_id != self._session_mesh:
+            self.nl_2d = np.loadtxt(os.path.join(self.path_input, 'N2D.in'))
+            self.el_2d = np.loadtxt(os.path.join(self.path_input, 'E2D.in'))
+            self.octave.push('nl_2d', self.nl_2d)
+            self.octave.push('el_2d', self.el_2d)
+            self._session_mesh = mesh_id
+
+        self.emat = np.loadtxt(os.path.join(self.path_input, 'EMAT.in'))
+        self.matprops = np.loadtxt(os.path.join(self.path_input, 'MATPROPS.in'))
+        self.octave.push('emat', self.emat)
+        self.octave.push('matprops', self.matprops)
+
+    def input_digest(self):
+        """
+        md5 digest of the BECAS input files N2D.in, E2D.in, EMAT.in,
+        MATPROPS.in and FAILMAT.in in path_input, or of the input arrays
+        if path_input is empty, which identifies the state of the section
+        used for stress recovery.
+        """
+
+        digest = hashlib.md5()
+        if self.path_input != '':
+            for fname in ['N2D.in', 'E2D.in', 'EMAT.in', 'MATPROPS.in', 'FAILMAT.in']:
+                path = os.path.join(self.path_input, fname)
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+        else:
+            for a in [self.nl_2d, self.el_2d, getattr(self, 'emat', None),
+                      self.matprops, self.failmat]:
+                if a is not None:
+                    digest.update(np.ascontiguousarray(a).tobytes())
+        return digest.hexdigest()
+
+    def read_outputs(self):
+        """
+        Read the BECAS output files written by the stiffness
+        and stress recovery calculations
+        """
+
+        if not self.dry_run and not self.hawc2_numpy:
             if self.analysis_mode in ['stiffness', 'combined']:
                 self.cs_props = np.loadtxt('BECAS2HAWC2.out')
                 os.remove('BECAS2HAWC2.out')
 
         if self.analysis_mode in ['combined', 'stress_recovery']:
-            # try:
-            failure = []
-            ks_failure = []
-            for i in range(self.load_cases.shape[0]):
-                data = np.loadtxt('failure%i.out' % i)
-                # evaluate KS function of the failure criteria
-                ks_failure.append(ksfunc(data.flatten(), rho=self.rho_ks))
-                # also save the actual max value
-                failure.append(np.max(data))
-            self.max_failure = np.array(failure)
-            self.max_failure_ks = np.array(ks_failure)
-            # except:
-            #     pass
+            self.read_failure_outputs()
 
         self.get_out_vars()
 
-    def add_utils(self, out_str):
+        if not self.dry_run and self.hawc2_numpy:
+            if self.analysis_mode in ['stiffness', 'combined']:
+                self.cs_props = self.becas2hawc2_numpy()
+
+    def read_failure_outputs(self):
+        """
+        Read the failure indices of the load cases written by BECAS to
+        failure%i.out. The files of load cases with zero loads, which are
+        not recovered, only hold zeros, and these cases get zero failure
+        indices for all elements in the material and region aggregates.
+        """
+
+        failure = []
+        ks_failure = []
+        elements = []
+        for i in range(self.load_cases.shape[0]):
+            data = np.loadtxt('failure%i.out' % i)
+            # evaluate KS function of the failure criteria
+            ks_failure.append(ksfunc(data.flatten(), rho=self.rho_ks))
+            # also save the actual max value
+            failure.append(np.max(data))
+            elements.append(data)
+        self.max_failure = np.array(failure)
+        self.max_failure_ks = np.array(ks_failure)
+
+        shapes = [data.shape for data in elements if data.ndim == 2]
+        if not self.dry_run and len(shapes) > 0:
+            elements = [data if data.shape == shapes[0] else np.zeros(shapes[0])
+                        for data in elements]
+            self.aggregate_failure(np.array(elements))
+
+    def becas2hawc2_numpy(self):
+        """
+        HAWC2 beam properties computed from the stiffness and mass
+        matrices, see km2hawc2.
+        """
+
+        area = None
+        G = None
+        if not self.hawc2_FPM:
+            inputs = [np.loadtxt(os.path.join(self.path_input, name))
+                      for name in ['N2D.in', 'E2D.in', 'EMAT.in', 'MATPROPS.in']]
+            area, G = section_shear_modulus(*inputs)
+        return km2hawc2(np.asarray(self.k_matrix).reshape(1, 6, 6),
+                        np.asarray(self.m_matrix).reshape(1, 6, 6),
+                        self.spanpos, self.hawc2_FPM, area, G)[0]
 
-        out_str.append('[ utils ] = BECAS_Utils( options );\n')
+    def add_utils(self, out_str, utils_args='options'):
+
+        out_str.append('[ utils ] = BECAS_Utils( %s );\n' % utils_args)
         out_str.append('[constitutive.Ks,solutions] = BECAS_Constitutive_Ks(utils);\n')
         if self.plot_paraview:  # and '-fd' not in self.itername:
-            path = os.path.join(self.basedir, self.path_plots)
-            try:
-                os.mkdir(path)
-            except:
-                pass
+            out_str = self.add_paraview(out_str)
+        return out_str
+
+    def add_paraview(self, out_str, case=None):
+        """
+        Add the export of the ParaView files of the section, or of the
+        solution of load case number case, to the BECAS script.
+        """
+
+        path = os.path.join(self.basedir, self.path_plots)
+        try:
+            os.mkdir(path)
+        except:
+            pass
+        if case is None:
             dirname = os.path.join(path, '%s_span%3.3f' % ('Sec', self.spanpos))
             # self._logger.info('BECAS_PARAVIEW: saving to %s' % dirname)
             out_str.append("BECAS_PARAVIEW('%s', utils);\n" % dirname)
+        else:
+            dirname = os.path.join(path, '%s_span%3.3f_case%i' % ('Sec', self.spanpos, case))
+            # self._logger.info('BECAS_PARAVIEW: saving to %s' % dirname)
+            out_str.append("warping=solutions.X*theta0'; \n")
+            out_str.append("BECAS_PARAVIEW( '%s', utils, csprops, warping, strain.MaterialElement, stress.MaterialElement, failure )\n"
+                % dirname)
         return out_str
 
     def add_stiffness_calc(self, out_str):
@@ -301,60 +1066,142 @@ class BECASWrapper(object):
         if self.checkmesh:
             out_str.append('[ meshcheck ] = BECAS_CheckMesh( utils );\n')
         out_str.append('[csprops] = BECAS_CrossSectionProps(constitutive.Ks,utils);\n')
-        out_str.append('RadialPosition=%19.12g; \n' % self.spanpos)
-        out_str.append("OutputFilename='%s'; \n" % 'BECAS2HAWC2.out')
-        out_str.append("utils.hawc2_flag=%s ;\n" % str(not self.hawc2_FPM).lower())
-        out_str.append('BECAS_Becas2Hawc2(OutputFilename,RadialPosition,constitutive,csprops,utils)\n')
-
-        if self.exec_mode == 'octave':
+        if not self.hawc2_numpy:
+            out_str.append('RadialPosition=%19.12g; \n' % self.spanpos)
+            out_str.append("OutputFilename='%s'; \n" % 'BECAS2HAWC2.out')
+            out_str.append("utils.hawc2_flag=%s ;\n" % str(not self.hawc2_FPM).lower())
+            out_str.append('BECAS_Becas2Hawc2(OutputFilename,RadialPosition,constitutive,csprops,utils)\n')
+
+        # scipy.io.loadmat cannot read the default text format of Octave
+        if self.exec_mode == 'oct2py_session' and not self.save_state:
+            # utils and solutions stay in the session for stress recovery
+            out_str.append("save('-v7', '%s', 'csprops', 'constitutive')\n" % self.utils_rst_filename)
+        elif self.exec_mode in ['octave', 'oct2py_session']:
             out_str.append("save('-v7', '%s', 'utils', 'solutions', 'csprops', 'constitutive')\n" % self.utils_rst_filename)
         else:
             out_str.append("save('%s', 'utils', 'solutions', 'csprops', 'constitutive')\n" % self.utils_rst_filename)
 
         return out_str
 
-    def add_stress_recovery(self, out_str):
+    def add_stress_recovery(self, out_str, shared=False):
 
-        # load utils and solutions from saved file
+        # load utils and solutions from saved file unless they are already
+        # in the workspace after a stiffness run in the same script or session
         # self._logger.info('checking for file %s' % self.utils_rst_filename)
-        if self.analysis_mode == 'stress_recovery' and os.path.exists(self.utils_rst_filename):
-            out_str.append("load('%s', 'utils', 'solutions', 'csprops')\n" % self.utils_rst_filename)
-        else:
-            raise RuntimeError('utils_rst_filename %s was not found!' % self.utils_rst_filename)
+        if self.analysis_mode == 'stress_recovery' and not shared:
+            if self.exec_mode == 'oct2py_session' and not self.save_state:
+                raise RuntimeError('utils and solutions of %s were not saved, set save_state '
+                                   'for stress recovery in another process' % self.utils_rst_filename)
+            if os.path.exists(self.utils_rst_filename):
+                out_str.append("load('%s', 'utils', 'solutions', 'csprops')\n" % self.utils_rst_filename)
+            else:
+                raise RuntimeError('utils_rst_filename %s was not found!' % self.utils_rst_filename)
 
         for i in range(self.load_cases.shape[0]):
             load_vector = self.load_cases[i, :]
             if np.sum(load_vector) == 0.:
                 np.savetxt('failure%i.out'%i, np.zeros(100))
             else:
-                out_str.append('theta0=[%19.12g %19.12g %19.12g %19.12g %19.12g %19.12g]\n' % (load_vector[0],
-                                                                                               load_vector[1],
-                                                                                               load_vector[2],
-                                                                                               load_vector[3],
-                                                                                               load_vector[4],
-                                                                                               load_vector[5]))
-                out_str.append('%Calculate strains\n')
-                out_str.append('[strain.GlobalElement,strain.MaterialElement] = BECAS_CalcStrainsElementCenter(theta0,solutions,utils);\n')
-                out_str.append('%Calculate stresses\n')
-                out_str.append('[ stress.GlobalElement, stress.MaterialElement ] = BECAS_CalcStressesElementCenter( strain, utils );\n')
-                out_str.append('%Check failure criteria\n')
-                out_str.append('[ failure ] = BECAS_CheckFailure( utils, stress.MaterialElement, strain.MaterialElement );\n')
+                out_str = self.add_load_case(out_str, load_vector)
                 out_str.append("FileName='failure%i.out';\n" % i)
                 out_str.append("eval(['save ' FileName ' failure -ascii -double']);\n")
 
             if self.plot_paraview:  # and '-fd' not in self.itername:
-                path = os.path.join(self.basedir, self.path_plots)
-                try:
-                    os.mkdir(path)
-                except:
-                    pass
-                dirname = os.path.join(path, '%s_span%3.3f_case%i' % ('Sec', self.spanpos, i))
-                # self._logger.info('BECAS_PARAVIEW: saving to %s' % dirname)
-                out_str.append("warping=solutions.X*theta0'; \n")
-                out_str.append("BECAS_PARAVIEW( '%s', utils, csprops, warping, strain.MaterialElement, stress.MaterialElement, failure )\n"
-                    % dirname)
+                out_str = self.add_paraview(out_str, i)
         return out_str
 
+    def add_load_case(self, out_str, load_vector):
+        """
+        Add the recovery of the strains, stresses and failure indices of a
+        load vector to the BECAS script.
+        """
+
+        out_str.append('theta0=[%19.12g %19.12g %19.12g %19.12g %19.12g %19.12g]\n' % (load_vector[0],
+                                                                                       load_vector[1],
+                                                                                       load_vector[2],
+                                                                                       load_vector[3],
+                                                                                       load_vector[4],
+                                                                                       load_vector[5]))
+        out_str.append('%Calculate strains\n')
+        out_str.append('[strain.GlobalElement,strain.MaterialElement] = BECAS_CalcStrainsElementCenter(theta0,solutions,utils);\n')
+        out_str.append('%Calculate stresses\n')
+        out_str.append('[ stress.GlobalElement, stress.MaterialElement ] = BECAS_CalcStressesElementCenter( strain, utils );\n')
+        out_str.append('%Check failure criteria\n')
+        out_str.append('[ failure ] = BECAS_CheckFailure( utils, stress.MaterialElement, strain.MaterialElement );\n')
+        return out_str
+
+    def export_paraview(self, cases='critical', background=False):
+        """
+        Export ParaView files of the section and of selected load cases of
+        the last stress recovery, outside of the analysis, e.g. for the
+        final or best design of an optimization.
+
+        The utils and solutions saved to utils_rst_filename are loaded by a
+        separate Octave or Matlab process, which can run in the background
+        while the analysis continues. Only available with BECAS in Octave
+        or Matlab.
+
+        parameters
+        ----------
+        cases: str or list
+            'critical' for the load case with the highest failure index,
+            'all' for all load cases, a list of load case numbers, or None
+            for only the section
+        background: bool
+            start the export in a background process and return without
+            waiting for it to finish
+
+        returns
+        -------
+        process: object
+            subprocess.Popen instance of the background process, or None
+        """
+
+        if self.exec_mode == 'numpy':
+            raise RuntimeError('ParaView export requires BECAS in Octave or Matlab')
+        self.utils_rst_filename = self.utils_rst_filebase + '%3.3f.mat' % (self.spanpos)
+        if not os.path.exists(self.utils_rst_filename):
+            raise RuntimeError('utils_rst_filename %s was not found!' % self.utils_rst_filename)
+
+        loads = np.atleast_2d(self.load_cases)
+        if cases == 'critical':
+            if np.asarray(self.max_failure).shape[0] > 0:
+                cases = [int(np.nanargmax(self.max_failure))]
+            else:
+                cases = []
+        elif cases == 'all':
+            cases = range(loads.shape[0])
+        elif cases is None:
+            cases = []
+
+        self.setup_path()
+        out_str = ['BECAS_SetupPath;\n']
+        out_str.append("load('%s', 'utils', 'solutions', 'csprops')\n" % self.utils_rst_filename)
+        out_str = self.add_paraview(out_str)
+        for i in cases:
+            out_str = self.add_load_case(out_str, loads[i])
+            out_str = self.add_paraview(out_str, i)
+        out_str.append('exit;\n')
+
+        fid = open('becas_paraview.m', 'w')
+        for line in out_str:
+            fid.write(line)
+        fid.close()
+
+        if self.dry_run:
+            return None
+        if self.exec_mode == 'matlab':
+            cmd = ["matlab", "-nosplash", "-nodesktop", "-nojvm", "-r", "becas_paraview"]
+        else:
+            cmd = ["octave", "becas_paraview.m"]
+        if background:
+            log = open('becas_paraview.log', 'w')
+            return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+        if self.debug_mode:
+            subprocess.call(cmd)
+        else:
+            commands.getoutput(' '.join(cmd))
+
     def setup_path(self):
 
         setup_path=("function BECAS_SetupPath\n"
@@ -514,6 +1361,10 @@ class BECASWrapper(object):
         self.el_2d = np.loadtxt(os.path.join(self.path_input, 'E2D.in') )
         self.emat = np.loadtxt(os.path.join(self.path_input, 'EMAT.in') )
         self.matprops = np.loadtxt(os.path.join(self.path_input,'MATPROPS.in'))
+        if os.path.exists(os.path.join(self.path_input, 'FAILMAT.in')):
+            self.failmat = np.loadtxt(os.path.join(self.path_input, 'FAILMAT.in'))
+        if os.path.exists(os.path.join(self.path_input, 'SNMAT.in')):
+            self.snmat = np.loadtxt(os.path.join(self.path_input, 'SNMAT.in'))
 
 
     def get_output_vars_oct2py(self):
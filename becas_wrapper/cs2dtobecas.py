@@ -11,6 +11,57 @@ try:
 except:
     _PGL_installed = False
 
+# shellexpander module, imported only once per process, see load_shellexpander
+_shellexpander = None
+_shellexpander_legacy = False
+
+
+def load_shellexpander():
+    """
+    Import shellexpander and cache the module, so that repeated calls
+    do not pay the import and source parsing overhead again.
+
+    returns
+    -------
+    shellexpander: module
+        the shellexpander module
+    legacy: bool
+        True if shellexpander was loaded from SHELLEXP_BASEDIR (<=1.5),
+        in which case main() does not return the generated meshes
+    """
+    global _shellexpander, _shellexpander_legacy
+
+    if _shellexpander is None:
+        try: #shellexpander >1.5
+            import shellexpander
+            if shellexpander.__version__:
+                from shellexpander import shellexpander
+                _shellexpander = shellexpander
+                _shellexpander_legacy = False
+        except:
+            import imp
+            _shellexpander = imp.load_source('shellexpander',
+                          os.path.join(os.environ['SHELLEXP_BASEDIR'], 'src', 'shellexpander.py'))
+            _shellexpander_legacy = True
+
+    return _shellexpander, _shellexpander_legacy
+
+
+def _write_n_int_per_line(list_of_int, f, n):
+    """Write the integers in list_of_int to the output file - n integers
+    per line, separated by commas"""
+    i = 0
+    for number in list_of_int:
+        i = i+1
+        f.write('%d' %(number ))
+        if i < len(list_of_int):
+            f.write(',  ')
+        if i%n == 0:
+            f.write('\n')
+    if i%n != 0:
+        f.write('\n')
+
+
 class CS2DtoBECAS(object):
     """
     Component that generates a set of BECAS input files based on
@@ -23,7 +74,8 @@ class CS2DtoBECAS(object):
     config: dict
         dictionary of model specific inputs
     cs2d: dict
-        dictionary containing coordinates and materials
+        dictionary containing coordinates and materials, optionally with
+        the S-N curves of the materials in cs2d['snmat'] written to SNMAT.in
     path_shellexpander: str (deprecated)
         Absolute path to shellexpander.py
     total_points: int
@@ -59,6 +111,9 @@ class CS2DtoBECAS(object):
     spline_type: str
         spline type used to redistribute points on the airfoil
         default: ncubic, choices are: linear, pchip
+    region_names: list
+        names of the regions and webs in the element region map written
+        to REGIONS.in, see element_regions
     """
 
     def __init__(self, cs2d, **kwargs):
@@ -85,6 +140,7 @@ class CS2DtoBECAS(object):
         self.thickness_ratio = np.array([])
         self.spline_type = 'ncubic'
         self.min_layer_thickness = 0.
+        self.region_names = []
 
         for k, w in kwargs.iteritems():
             try:
@@ -129,10 +185,24 @@ class CS2DtoBECAS(object):
 
         return ret_cs2d
 
-    def compute(self, redistribute_flag=True):
-        """  """
+    def compute(self, redistribute_flag=True, write_inputs=True):
+        """
+        parameters
+        ----------
+        redistribute_flag: bool
+            redistribute the airfoil points among the regions
+        write_inputs: bool
+            write the Abaqus model and run shellexpander. Set to False
+            when the section is expanded together with the other sections
+            of the blade, see write_becas_inp_blade.
+        """
 
+        # webs without plies are removed by clean_up_cs2d
+        web_names = ['WEB%02d' % i for i, w in enumerate(self.cs2d['webs'])
+                     if np.sum(w['thicknesses']) > 0.]
         self.cs2d = self.clean_up_cs2d(self.cs2d)
+        self.region_names = ['REGION%02d' % i for i in range(len(self.cs2d['regions']))] + \
+                            web_names
 
         if __debug__:
             for reg in self.cs2d['regions']:
@@ -172,8 +242,9 @@ class CS2DtoBECAS(object):
         self.add_shearweb_nodes()
         self.create_elements()
         self.create_elements_3d(reverse_normals=False)
-        self.write_abaqus_inp()
-        self.write_becas_inp()
+        if write_inputs:
+            self.write_abaqus_inp()
+            self.write_becas_inp()
         print 'CS2DtoBECAS time:', time.time() - tt
 
     def compute_max_layers(self):
@@ -518,22 +589,34 @@ class CS2DtoBECAS(object):
         the actual BECAS input can be created.
         """
 
-        def write_n_int_per_line(list_of_int, f, n):
-            """Write the integers in list_of_int to the output file - n integers
-            per line, separated by commas"""
-            i = 0
-            for number in list_of_int:
-                i = i+1
-                f.write('%d' %(number ))
-                if i < len(list_of_int):
-                    f.write(',  ')
-                if i%n == 0:
-                    f.write('\n')
-            if i%n != 0:
-                f.write('\n')
-
         self.abaqus_inp_fname = 'airfoil_abaqus.inp'
 
+        with open(self.abaqus_inp_fname, 'w') as f:
+            self.write_abaqus_section(f)
+            self.write_abaqus_materials(f)
+        print 'Abaqus input file written: %s' % self.abaqus_inp_fname
+
+    def write_abaqus_section(self, f, node_offset=0, el_offset=0, suffix='',
+                             z_offset=0.):
+        """
+        Write the nodes, elements, element sets and shell section definitions
+        of this cross section to an open Abaqus input file.
+
+        parameters
+        ----------
+        f: file
+            open Abaqus input file
+        node_offset: int
+            offset added to all node numbers
+        el_offset: int
+            offset added to all element numbers
+        suffix: str
+            string appended to all element set names, used to keep
+            the element sets of several sections in one model apart
+        z_offset: float
+            offset of the section nodes along the beam axis
+        """
+
         # FIXME: for now, force 1 based numbering, I don't think shellexpander
         # and/or BECAS like zero based node and element numbering
         self.one_based_numbering()
@@ -544,129 +627,132 @@ class CS2DtoBECAS(object):
         else:
             off = 0
 
-        with open(self.abaqus_inp_fname, 'w') as f:
-
-            # Write nodal coordinates
-            f.write('**\n')
-            f.write('********************\n')
-            f.write('** NODAL COORDINATES\n')
-            f.write('********************\n')
-            f.write('*NODE\n')
-            tmp = np.ndarray( (len(self.nodes_3d),4) )
-            tmp[:,0] = np.arange(len(self.nodes_3d), dtype=np.int) + off
-            tmp[:,1:] = self.nodes_3d
-            np.savetxt(f, tmp, fmt='%1.0f, %1.20e, %1.20e, %1.20e')
-
-            # Write element definitions
-            f.write('**\n')
-            f.write('***********\n')
-            f.write('** ELEMENTS\n')
-            f.write('***********\n')
-            f.write('*ELEMENT, TYPE=S4, ELSET=%s\n' % self.section_name)
-            tmp = np.ndarray( (len(self.el_3d),5) )
-            tmp[:,0] = np.arange(len(self.el_3d), dtype=np.int) + off
-            tmp[:,1:] = self.el_3d
-            np.savetxt(f, tmp, fmt='%i, %i, %i, %i, %i')
-
-            # Write new element sets
-            f.write('**\n')
-            f.write('***************\n')
-            f.write('** ELEMENT SETS\n')
-            f.write('***************\n')
-            for elset in sorted(self.elset_defs.keys()):
-                elements = self.elset_defs[elset]
-                f.write('*ELSET, ELSET=%s\n' % (elset))
+        # Write nodal coordinates
+        f.write('**\n')
+        f.write('********************\n')
+        f.write('** NODAL COORDINATES\n')
+        f.write('********************\n')
+        f.write('*NODE\n')
+        tmp = np.ndarray( (len(self.nodes_3d),4) )
+        tmp[:,0] = np.arange(len(self.nodes_3d), dtype=np.int) + off + node_offset
+        tmp[:,1:] = self.nodes_3d
+        tmp[:,3] += z_offset
+        np.savetxt(f, tmp, fmt='%1.0f, %1.20e, %1.20e, %1.20e')
+
+        # Write element definitions
+        f.write('**\n')
+        f.write('***********\n')
+        f.write('** ELEMENTS\n')
+        f.write('***********\n')
+        f.write('*ELEMENT, TYPE=S4, ELSET=%s\n' % self.section_name)
+        tmp = np.ndarray( (len(self.el_3d),5) )
+        tmp[:,0] = np.arange(len(self.el_3d), dtype=np.int) + off + el_offset
+        tmp[:,1:] = self.el_3d + node_offset
+        np.savetxt(f, tmp, fmt='%i, %i, %i, %i, %i')
+
+        # Write new element sets
+        f.write('**\n')
+        f.write('***************\n')
+        f.write('** ELEMENT SETS\n')
+        f.write('***************\n')
+        for elset in sorted(self.elset_defs.keys()):
+            elements = self.elset_defs[elset] + el_offset
+            f.write('*ELSET, ELSET=%s\n' % (elset + suffix))
 #                np.savetxt(f, elements, fmt='%i', delimiter=', ')
-                write_n_int_per_line(list(elements), f, 8)
-
-            # Write Shell Section definitions
-            # The first layer is the outer most layer.
-            # The second item ("int. points") and the fifth item ("plyname")
-            # are not relevant. The are kept for compatibility with the ABAQUS
-            # input syntax. As an example, take this one:
-            # [0.006, 3, 'TRIAX', 0.0, 'Ply01']
-            f.write('**\n')
-            f.write('****************************\n')
-            f.write('** SHELL SECTION DEFINITIONS\n')
-            f.write('****************************\n')
-            names = ['REGION%02d' % i for i in range(len(self.cs2d['regions']))]
-            names.extend(['WEB%02d' % i for i in range(len(self.cs2d['webs']))])
-            # standard offsets for shell
-            offsets = ['bot' for i in range(len(self.cs2d['regions']))]
-            if not self.web_offsets:
-                # if web_offsets not provided
-                for web in range(len(self.cs2d['web_def'])):
-                    offsets.append('mid')
+            _write_n_int_per_line(list(elements), f, 8)
+
+        # Write Shell Section definitions
+        # The first layer is the outer most layer.
+        # The second item ("int. points") and the fifth item ("plyname")
+        # are not relevant. The are kept for compatibility with the ABAQUS
+        # input syntax. As an example, take this one:
+        # [0.006, 3, 'TRIAX', 0.0, 'Ply01']
+        f.write('**\n')
+        f.write('****************************\n')
+        f.write('** SHELL SECTION DEFINITIONS\n')
+        f.write('****************************\n')
+        names = ['REGION%02d' % i for i in range(len(self.cs2d['regions']))]
+        names.extend(['WEB%02d' % i for i in range(len(self.cs2d['webs']))])
+        # standard offsets for shell
+        offsets = ['bot' for i in range(len(self.cs2d['regions']))]
+        if not self.web_offsets:
+            # if web_offsets not provided
+            for web in range(len(self.cs2d['web_def'])):
+                offsets.append('mid')
+        else:
+            offsets.extend(self.web_offsets)
+        for i, r in enumerate(self.cs2d['regions'] + self.cs2d['webs']):
+            r_name = names[i]
+            r_offset = offsets[i]
+            if r_offset == 'mid':
+            #if r_name.startswith('WEB'):
+                offset = 0.0
+            if r_offset == 'bot':
+                offset = -0.5
+            text = '*SHELL SECTION, ELSET=%s, COMPOSITE, OFFSET=%3.3f\n'
+            f.write(text % (r_name + suffix, offset))
+            for il, l_name in enumerate(r['layers']):
+                #materialname = l_name.translate(None, digits).lower()
+                # remove last two digits from the name, lower case is not required
+                materialname = l_name[:-2]
+                m_ix = self.cs2d['materials'][materialname]
+                if self.cs2d['failcrit'][m_ix] == 'maximum_stress':
+                    mname = materialname + 'MAXSTRESS'
+                elif self.cs2d['failcrit'][m_ix] == 'maximum_strain':
+                    mname = materialname + 'MAXSTRAIN'
+                elif self.cs2d['failcrit'][m_ix] == 'tsai_wu':
+                    mname = materialname + 'TSAIWU'
+                else:
+                    mname = materialname
+                plyname = 'ply%02d' % i
+
+                if r['thicknesses'][il] >= self.min_layer_thickness:
+                    layer_def = (r['thicknesses'][il], 3, mname,
+                                 r['angles'][il], plyname)
+                f.write('%g, %d, %s, %g, %s\n' % layer_def )
+
+    def write_abaqus_materials(self, f):
+        """
+        Write the material definitions to an open Abaqus input file.
+        """
+
+        # Write material properties
+        f.write('**\n')
+        f.write('**********************\n')
+        f.write('** MATERIAL PROPERTIES\n')
+        f.write('**********************\n')
+        for matname, ix in self.cs2d['materials'].iteritems():
+            md = self.cs2d['matprops'][ix]
+
+            if self.cs2d['failcrit'][ix] == 'maximum_stress':
+                mname = matname + 'MAXSTRESS'
+            elif self.cs2d['failcrit'][ix] == 'maximum_strain':
+                mname = matname + 'MAXSTRAIN'
+            elif self.cs2d['failcrit'][ix] == 'tsai_wu':
+                mname = matname + 'TSAIWU'
             else:
-                offsets.extend(self.web_offsets)
-            for i, r in enumerate(self.cs2d['regions'] + self.cs2d['webs']):
-                r_name = names[i]
-                r_offset = offsets[i]
-                if r_offset == 'mid':
-                #if r_name.startswith('WEB'):
-                    offset = 0.0
-                if r_offset == 'bot':
-                    offset = -0.5
-                text = '*SHELL SECTION, ELSET=%s, COMPOSITE, OFFSET=%3.3f\n'
-                f.write(text % (r_name, offset))
-                for il, l_name in enumerate(r['layers']):
-                    #materialname = l_name.translate(None, digits).lower()
-                    # remove last two digits from the name, lower case is not required
-                    materialname = l_name[:-2]
-                    m_ix = self.cs2d['materials'][materialname]
-                    if self.cs2d['failcrit'][m_ix] == 'maximum_stress':
-                        mname = materialname + 'MAXSTRESS'
-                    elif self.cs2d['failcrit'][m_ix] == 'maximum_strain':
-                        mname = materialname + 'MAXSTRAIN'
-                    elif self.cs2d['failcrit'][m_ix] == 'tsai_wu':
-                        mname = materialname + 'TSAIWU'
-                    else:
-                        mname = materialname
-                    plyname = 'ply%02d' % i
-
-                    if r['thicknesses'][il] >= self.min_layer_thickness:
-                        layer_def = (r['thicknesses'][il], 3, mname,
-                                     r['angles'][il], plyname)
-                    f.write('%g, %d, %s, %g, %s\n' % layer_def )
-
-            # Write material properties
+                mname = matname
+            f.write('*MATERIAL, NAME=%s\n' % (mname))
+            f.write('*ELASTIC, TYPE=ENGINEERING CONSTANTS\n')
+            f.write('%g, %g, %g, %g, %g, %g, %g, %g\n' % (md[0], md[1],
+                md[2], md[3], md[4], md[5], md[6], md[7]))
+            f.write('%g\n' % (md[8]))
+            f.write('*DENSITY\n')
+            f.write('%g\n' % (md[9]))
+            # failcrit array
+            # s11_t s22_t s33_t s11_c s22_c s33_c
+            # t12 t13 t23 e11_t e22_t e33_t e11_c e22_c e33_c g12 g13 g23
+            # gM0 C1a C2a C3a C4a
+            md = self.cs2d['failmat'][ix]
+            f.write('*FAIL STRESS\n')
+            # gMa = gM0 C1a C2a C3a C4a
+            gMa = md[18] * (md[19] + md[20] + md[21] + md[22])
+            f.write('%g, %g, %g, %g, %g\n' % (gMa * md[0], gMa * md[3],
+                                              gMa * md[1], gMa * md[4], gMa * md[6]))
+            f.write('*FAIL STRAIN\n')
+            f.write('%g, %g, %g, %g, %g\n' % (gMa * md[9], gMa * md[12],
+                                              gMa * md[10], gMa * md[13], gMa * md[15]))
             f.write('**\n')
-            f.write('**********************\n')
-            f.write('** MATERIAL PROPERTIES\n')
-            f.write('**********************\n')
-            for matname, ix in self.cs2d['materials'].iteritems():
-                md = self.cs2d['matprops'][ix]
-
-                if self.cs2d['failcrit'][ix] == 'maximum_stress':
-                    mname = matname + 'MAXSTRESS'
-                elif self.cs2d['failcrit'][ix] == 'maximum_strain':
-                    mname = matname + 'MAXSTRAIN'
-                elif self.cs2d['failcrit'][ix] == 'tsai_wu':
-                    mname = matname + 'TSAIWU'
-                else:
-                    mname = matname
-                f.write('*MATERIAL, NAME=%s\n' % (mname))
-                f.write('*ELASTIC, TYPE=ENGINEERING CONSTANTS\n')
-                f.write('%g, %g, %g, %g, %g, %g, %g, %g\n' % (md[0], md[1],
-                    md[2], md[3], md[4], md[5], md[6], md[7]))
-                f.write('%g\n' % (md[8]))
-                f.write('*DENSITY\n')
-                f.write('%g\n' % (md[9]))
-                # failcrit array
-                # s11_t s22_t s33_t s11_c s22_c s33_c
-                # t12 t13 t23 e11_t e22_t e33_t e11_c e22_c e33_c g12 g13 g23
-                # gM0 C1a C2a C3a C4a
-                md = self.cs2d['failmat'][ix]
-                f.write('*FAIL STRESS\n')
-                # gMa = gM0 C1a C2a C3a C4a
-                gMa = md[18] * (md[19] + md[20] + md[21] + md[22])
-                f.write('%g, %g, %g, %g, %g\n' % (gMa * md[0], gMa * md[3],
-                                                  gMa * md[1], gMa * md[4], gMa * md[6]))
-                f.write('*FAIL STRAIN\n')
-                f.write('%g, %g, %g, %g, %g\n' % (gMa * md[9], gMa * md[12],
-                                                  gMa * md[10], gMa * md[13], gMa * md[15]))
-                f.write('**\n')
-        print 'Abaqus input file written: %s' % self.abaqus_inp_fname
 
     def write_becas_inp(self):
         """
@@ -702,19 +788,93 @@ class CS2DtoBECAS(object):
         args.verbose = False
 
         if not self.dry_run:
-            try: #shellexpander >1.5
-                import shellexpander
-                if shellexpander.__version__:
-                    from shellexpander import shellexpander
-                    shellexp_sections = shellexpander.main(args)
-                    msh2d = shellexp_sections[args.sections]
-                    return msh2d
-            except:
-                import imp
-                shellexpander = imp.load_source('shellexpander',
-                              os.path.join(os.environ['SHELLEXP_BASEDIR'], 'src', 'shellexpander.py'))
+            shellexpander, legacy = load_shellexpander()
+            shellexp_sections = shellexpander.main(args)
+            self.write_element_regions()
+            self.write_snmat()
+            if not legacy:
+                msh2d = shellexp_sections[args.sections]
+                return msh2d
+
+    def element_regions(self, nl_2d, el_2d):
+        """
+        Region and web of each element of the BECAS mesh generated by
+        shellexpander, found as the shell element closest to the element
+        center.
+
+        parameters
+        ----------
+        nl_2d: array
+            nodal positions (node number, x, y). Size ((n_n, 3))
+        el_2d: array
+            element connectivity (element number, node 1, ..., node 8).
+            Size ((n_e, 9))
+
+        returns
+        -------
+        el_region: array
+            index in region_names of each element, regions first followed
+            by the webs. Size (n_e)
+        """
 
-                shellexpander.main(args)
+        nl_2d = np.atleast_2d(nl_2d)
+        el_2d = np.atleast_2d(el_2d).astype(int)
+        node_idx = np.zeros(nl_2d[:, 0].astype(int).max() + 1, dtype=int)
+        node_idx[nl_2d[:, 0].astype(int)] = np.arange(nl_2d.shape[0])
+        xc = nl_2d[node_idx[el_2d[:, 1:5]], 1:3].mean(axis=1)
+
+        offset = 1 if self.onebasednumbering else 0
+        nr = len(self.cs2d['regions'])
+        shell_region = np.zeros(self.elements.shape[0], dtype=int)
+        for i, name in enumerate(self.region_names):
+            # the element sets of the webs are numbered after removing
+            # the webs without plies
+            if i >= nr:
+                name = 'WEB%02d' % (i - nr)
+            if name in self.elset_defs:
+                shell_region[self.elset_defs[name] - offset] = i
+
+        p0 = self.nodes[self.elements[:, 0] - offset, :2]
+        d = self.nodes[self.elements[:, 1] - offset, :2] - p0
+        el_region = np.zeros(el_2d.shape[0], dtype=int)
+        nb = max(1, 2000000 // self.elements.shape[0])
+        for i in range(0, el_2d.shape[0], nb):
+            x = xc[i:i + nb, np.newaxis, :] - p0
+            t = np.clip((x * d).sum(axis=2) / (d**2).sum(axis=1), 0., 1.)
+            dist = ((x - t[:, :, np.newaxis] * d)**2).sum(axis=2)
+            el_region[i:i + nb] = shell_region[np.argmin(dist, axis=1)]
+        return el_region
+
+    def write_element_regions(self):
+        """
+        Write the region of each element of the BECAS mesh to REGIONS.in
+        next to the other BECAS input files, with the names of the
+        regions in the header.
+        """
+
+        path = os.path.join(self.becas_inputs, self.section_name)
+        nl_2d = np.loadtxt(os.path.join(path, 'N2D.in'))
+        el_2d = np.loadtxt(os.path.join(path, 'E2D.in')).astype(int)
+        el_region = self.element_regions(nl_2d, el_2d)
+        np.savetxt(os.path.join(path, 'REGIONS.in'),
+                   np.array([el_2d[:, 0], el_region]).T, fmt='%d',
+                   header=' '.join(self.region_names))
+
+    def write_snmat(self):
+        """
+        Write the S-N curves of the materials in cs2d['snmat'], the Woehler
+        exponent m and the stress range S1 with a life of one cycle of each
+        material, to SNMAT.in next to the other BECAS input files, in the
+        order of the materials in MATPROPS.in. Nothing is written without
+        cs2d['snmat'].
+        """
+
+        if 'snmat' not in self.cs2d:
+            return
+        snmat = np.atleast_2d(self.cs2d['snmat'])
+        rows = [snmat[ix] for matname, ix in self.cs2d['materials'].iteritems()]
+        path = os.path.join(self.becas_inputs, self.section_name)
+        np.savetxt(os.path.join(path, 'SNMAT.in'), np.array(rows), fmt='%.6e')
 
 
     def output_te_ratio(self):
@@ -759,3 +919,96 @@ class CS2DtoBECAS(object):
             r_2_pres = getattr(self.cs2d, r_name2)
             thick_max = (r_1_suc.thickness + r_2_pres.thickness)
             self.thickness_ratio[i] = thick_max / shape_thickness
+
+
+def write_becas_inp_blade(meshers, becas_inputs='becas_inputs',
+                          abaqus_inp_fname='blade_abaqus.inp', dry_run=False):
+    """
+    Write a single Abaqus model containing all cross sections of a blade
+    and generate the BECAS input files of every section in one
+    shellexpander call.
+
+    Each section is placed at its spanwise position with its nodes and
+    elements numbered consecutively after the previous section. Its element
+    sets are suffixed with the section index so the sets of different
+    sections are kept apart, while the shellexpander section names are
+    the usual section_name of each mesher.
+
+    parameters
+    ----------
+    meshers: list
+        list of CS2DtoBECAS instances on which compute has been called
+        with write_inputs=False
+    becas_inputs: str
+        path for the BECAS input files of all sections
+    abaqus_inp_fname: str
+        name of the blade Abaqus input file
+    dry_run: bool
+        only write the Abaqus model, don't call shellexpander
+
+    returns
+    -------
+    msh2d: dict
+        the 2D meshes keyed by section name if returned by shellexpander,
+        otherwise None
+    """
+
+    tt = time.time()
+
+    node_offset = 0
+    el_offset = 0
+    elsets = []
+    dominant_elsets = []
+    subelsets = []
+    max_layers = 0
+    with open(abaqus_inp_fname, 'w') as f:
+        for i, m in enumerate(meshers):
+            suffix = '_S%03d' % i
+            m.write_abaqus_section(f, node_offset=node_offset,
+                                      el_offset=el_offset,
+                                      suffix=suffix,
+                                      z_offset=m.cs2d['s'])
+            node_offset += m.nodes_3d.shape[0]
+            el_offset += m.el_3d.shape[0]
+            for elset in ['SURFACE', 'WEBS']:
+                if elset in m.elset_defs:
+                    elsets.append(elset + suffix)
+            dominant_elsets.extend([name + suffix for name in m.dominant_elsets])
+            subelsets.extend([name + suffix for name in m.subelsets])
+            max_layers = max(max_layers, m.max_layers)
+            m.abaqus_inp_fname = abaqus_inp_fname
+            m.becas_inputs = becas_inputs
+            m.path_input = os.path.join(becas_inputs, m.section_name)
+
+        # the materials are shared by all sections of the blade
+        meshers[0].write_abaqus_materials(f)
+    print 'Abaqus blade input file written: %s' % abaqus_inp_fname
+
+    if len(elsets) < 1:
+        raise ValueError, 'badly defined element sets'
+
+    class args: pass
+    args.inputfile = abaqus_inp_fname
+    args.elsets = elsets
+    args.sections = [m.section_name for m in meshers]
+    args.layers = max_layers
+    args.nodal_thickness = 'min'
+    args.dominant_elsets = dominant_elsets
+    args.centerline = None
+    args.becasdir = becas_inputs
+    args.debug = False
+    args.subelsets = subelsets
+    args.verbose = False
+
+    msh2d = None
+    if not dry_run:
+        shellexpander, legacy = load_shellexpander()
+        shellexp_sections = shellexpander.main(args)
+        for m in meshers:
+            m.write_element_regions()
+            m.write_snmat()
+        if not legacy:
+            msh2d = shellexp_sections
+    print 'shellexpander blade time:', time.time() - tt
+
+    return msh2d
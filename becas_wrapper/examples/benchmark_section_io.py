@@ -0,0 +1,130 @@
+
+# Benchmark of the transfer of the section inputs from Slice to the
+# section components, comparing the stacked section arrays connected with
+# src_indices to one set of variables per section.
+
+import time
+import numpy as np
+
+from openmdao.api import Problem, Group, Component, IndepVarComp
+
+from becas_wrapper.becas_bladestructure import Slice, section_src_indices
+
+
+class ScalarSlice(Component):
+    """
+    Slice with one set of outputs per section, as used before the
+    sections were passed as stacked arrays.
+    """
+
+    def __init__(self, st3d, sdim, varnames):
+        super(ScalarSlice, self).__init__()
+
+        self.nsec = sdim[1]
+        self.nDP = st3d['DPs'].shape[1]
+        self._varnames = varnames
+        for i in range(self.nDP):
+            self.add_param('DP%02d' % i, st3d['DPs'][:, i])
+        self.add_param('blade_surface_norm_st', np.zeros(sdim))
+        self.add_param('blade_length', 0.)
+        for name in varnames:
+            self.add_param(name + 'T', np.zeros(self.nsec))
+            self.add_param(name + 'A', np.zeros(self.nsec))
+        for i in range(self.nsec):
+            self.add_output('sec%03d:DPs' % i, np.zeros(self.nDP))
+            self.add_output('sec%03d:coords' % i, np.zeros((sdim[0], sdim[2])))
+            self.add_output('sec%03d:tvec' % i, np.zeros(len(varnames)*2))
+
+    def solve_nonlinear(self, params, unknowns, resids):
+
+        nvar = len(self._varnames)
+        for i in range(self.nsec):
+            DPs = np.zeros(self.nDP)
+            for j in range(self.nDP):
+                DPs[j] = params['DP%02d' % j][i]
+            unknowns['sec%03d:DPs' % i] = DPs
+            unknowns['sec%03d:coords' % i] = params['blade_surface_norm_st'][:, i, :] * \
+                                             params['blade_length']
+            for ii, name in enumerate(self._varnames):
+                unknowns['sec%03d:tvec' % i][ii] = params[name + 'T'][i]
+                unknowns['sec%03d:tvec' % i][nvar+ii] = params[name + 'A'][i]
+
+
+class SectionSink(Component):
+    """
+    section component only receiving the section inputs.
+    """
+
+    def __init__(self, name, nDP, ni_chord, nvar):
+        super(SectionSink, self).__init__()
+
+        self.add_param('%s:DPs' % name, np.zeros(nDP))
+        self.add_param('%s:coords' % name, np.zeros((ni_chord, 3)))
+        self.add_param('%s:tvec' % name, np.zeros(nvar * 2))
+        self.add_output('%s:out' % name, 0.)
+
+    def solve_nonlinear(self, params, unknowns, resids):
+        pass
+
+
+def blade_structure(nsec, nr, nlayers):
+
+    st3d = {}
+    st3d['DPs'] = np.tile(np.linspace(-1., 1., nr + 1), (nsec, 1))
+    st3d['regions'] = [{'layers': ['mat%02d01' % k for k in range(nlayers)]}
+                       for i in range(nr)]
+    st3d['webs'] = []
+    varnames = []
+    for ireg, reg in enumerate(st3d['regions']):
+        for lname in reg['layers']:
+            varnames.append('r%02d%s' % (ireg, lname))
+    return st3d, varnames
+
+
+def configure(nsec, stacked, ni_chord=200, nr=15, nlayers=10):
+
+    st3d, varnames = blade_structure(nsec, nr, nlayers)
+    sdim = (ni_chord, nsec, 3)
+    nvar = len(varnames)
+
+    p = Problem(root=Group())
+    ivc = p.root.add('ivc', IndepVarComp([('blade_surface_norm_st', np.random.rand(*sdim)),
+                                          ('blade_length', 86.366)]), promotes=['*'])
+    for i in range(nr + 1):
+        ivc.add_output('DP%02d' % i, st3d['DPs'][:, i])
+    for name in varnames:
+        ivc.add_output(name + 'T', np.random.rand(nsec))
+        ivc.add_output(name + 'A', np.random.rand(nsec))
+
+    if stacked:
+        p.root.add('slice', Slice(st3d, sdim), promotes=['*'])
+    else:
+        p.root.add('slice', ScalarSlice(st3d, sdim, varnames), promotes=['*'])
+    for i in range(nsec):
+        name = 'sec%03d' % i
+        p.root.add(name, SectionSink(name, nr + 1, ni_chord, nvar), promotes=['*'])
+        if stacked:
+            p.root.connect('sec_DPs', '%s:DPs' % name,
+                           src_indices=section_src_indices(i, (nsec, nr + 1)))
+            p.root.connect('sec_coords', '%s:coords' % name,
+                           src_indices=section_src_indices(i, (nsec, ni_chord, 3)))
+            p.root.connect('sec_tvec', '%s:tvec' % name,
+                           src_indices=section_src_indices(i, (nsec, nvar * 2)))
+    return p
+
+
+if __name__ == '__main__':
+
+    nsec = 50
+    niter = 20
+    for stacked in [False, True]:
+        t0 = time.time()
+        p = configure(nsec, stacked)
+        p.setup(check=False)
+        t1 = time.time()
+        for i in range(niter):
+            p.run()
+        t2 = time.time()
+        print 'stacked: %s' % stacked
+        print 'setup: ', t1 - t0
+        print 'run: ', (t2 - t1) / niter
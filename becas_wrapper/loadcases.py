@@ -0,0 +1,404 @@
+
+import itertools
+import numpy as np
+from scipy.optimize import nnls
+from scipy.spatial import ConvexHull
+
+__all__ = ['hull_load_cases', 'hull_weights', 'iter_load_chunks',
+           'FailureAccumulator', 'rainflow', 'miner_damage', 'group_failure',
+           'ks_aggregate']
+
+
+def _reduce_loads(loads, tol):
+    """
+    Coordinates of the load vectors in the subspace spanned by them,
+    scaled to unit standard deviation, so that load sets varying in less
+    than six components can be handled by qhull.
+    """
+
+    x = loads - loads.mean(axis=0)
+    scale = x.std(axis=0)
+    scale[scale == 0.] = 1.
+    x = x / scale
+    u, sv, vt = np.linalg.svd(x, full_matrices=False)
+    if sv.shape[0] == 0 or sv[0] == 0.:
+        return x[:, :0]
+    rank = np.sum(sv > tol * sv[0])
+    return np.dot(x, vt[:rank].T)
+
+
+def hull_load_cases(loads, tol=1.e-9):
+    """
+    Indices of the load cases that are vertices of the convex hull of
+    all section load vectors.
+
+    The strains and stresses are linear in the section loads, and the
+    maximum strain, maximum stress and Tsai-Wu failure indices are convex
+    functions of them, so the maximum failure index of all load cases
+    is reached at one of the hull vertices. Load sets spanning less than
+    six dimensions are reduced to the subspace spanned by them before
+    computing the hull.
+
+    parameters
+    ----------
+    loads: array
+        section forces and moments Fx Fy Fz Mx My Mz. Size ((ncase, 6))
+    tol: float
+        relative singular value below which a direction of the load set
+        is considered degenerate
+
+    returns
+    -------
+    idx: array
+        sorted indices of the hull vertices
+    """
+
+    loads = np.atleast_2d(np.asarray(loads, dtype=float))
+    ncase = loads.shape[0]
+    x = _reduce_loads(loads, tol)
+    dim = x.shape[1]
+    if dim == 0:
+        return np.array([0])
+    if dim == 1:
+        return np.unique([np.argmin(x[:, 0]), np.argmax(x[:, 0])])
+    if ncase <= dim + 1:
+        return np.arange(ncase)
+    try:
+        hull = ConvexHull(x)
+    except Exception:
+        # qhull fails on nearly degenerate sets, keep all cases
+        return np.arange(ncase)
+    return np.sort(hull.vertices)
+
+
+def hull_weights(loads, idx):
+    """
+    Convex combination weights of the load cases in terms of the hull
+    vertices returned by hull_load_cases.
+
+    Since the failure indices are convex in the loads, the weighted sum
+    of the failure indices of the vertices is an upper bound of the
+    failure index of a load case, and equal to it at the vertices.
+
+    parameters
+    ----------
+    loads: array
+        section loads of all cases. Size ((ncase, 6))
+    idx: array
+        indices of the hull vertices. Size (nvert)
+
+    returns
+    -------
+    W: array
+        weights with rows summing to one. Size ((ncase, nvert))
+    """
+
+    loads = np.atleast_2d(np.asarray(loads, dtype=float))
+    idx = np.asarray(idx)
+    scale = np.abs(loads).max(axis=0)
+    scale[scale == 0.] = 1.
+    x = loads / scale
+    W = np.zeros((loads.shape[0], idx.shape[0]))
+    W[idx, np.arange(idx.shape[0])] = 1.
+    A = np.vstack([x[idx].T, np.ones(idx.shape[0])])
+    inner = np.setdiff1d(np.arange(loads.shape[0]), idx)
+    for i in inner:
+        w, res = nnls(A, np.append(x[i], 1.))
+        W[i] = w / w.sum()
+    return W
+
+
+def iter_load_chunks(loads, chunk_size=100):
+    """
+    Iterate over a series of section load vectors in chunks.
+
+    parameters
+    ----------
+    loads: array or iterable
+        array, e.g. memory-mapped with np.load(..., mmap_mode='r'),
+        of size ((ncase, 6)), or an iterable of load vectors of size (6)
+    chunk_size: int
+        number of load vectors per chunk
+
+    returns
+    -------
+    chunks: iterator
+        arrays of up to chunk_size load vectors. Size ((nchunk, 6))
+    """
+
+    if hasattr(loads, 'shape'):
+        loads = np.atleast_2d(loads)
+        for i in range(0, loads.shape[0], chunk_size):
+            yield np.asarray(loads[i:i + chunk_size], dtype=float)
+    else:
+        it = iter(loads)
+        while True:
+            chunk = list(itertools.islice(it, chunk_size))
+            if len(chunk) == 0:
+                break
+            yield np.asarray(chunk, dtype=float).reshape(-1, 6)
+
+
+class FailureAccumulator(object):
+    """
+    Running per element maximum and Kreisselmeier and Steinhauser
+    aggregate of the failure indices of a series of load cases.
+
+    The KS sums are kept relative to the running maxima, so the
+    accumulators do not overflow and their size only depends on
+    the number of elements.
+
+    parameters
+    ----------
+    ne: int
+        number of elements
+    rho: float
+        KS aggregation parameter
+    """
+
+    def __init__(self, ne, rho=50.):
+
+        self.rho = rho
+        self.ncase = 0
+        self.max = np.ones(ne) * -np.inf
+        self._sum = np.zeros(ne)
+
+    def add(self, failure):
+        """
+        add the failure indices of a chunk of load cases.
+
+        parameters
+        ----------
+        failure: array
+            failure indices in the BECAS format. Size ((ncase, ne, 6))
+        """
+
+        f = np.asarray(failure).transpose(1, 0, 2).reshape(self.max.shape[0], -1)
+        m = np.maximum(self.max, f.max(axis=1))
+        self._sum = self._sum * np.exp(self.rho * (self.max - m)) + \
+                    np.exp(self.rho * (f - m[:, np.newaxis])).sum(axis=1)
+        self.max = m
+        self.ncase += failure.shape[0]
+
+    @property
+    def ks(self):
+        """
+        KS aggregate over all load cases of every element. Size (ne)
+        """
+
+        return self.max + np.log(self._sum) / self.rho
+
+    def total_ks(self):
+        """
+        KS aggregate over all load cases and elements.
+        """
+
+        m = self.max.max()
+        return m + np.log(np.sum(self._sum * np.exp(self.rho * (self.max - m)))) / self.rho
+
+
+def _turning_points(x, ids):
+    """
+    Remove repeated values and intermediate points of monotone runs from
+    concatenated histories, keeping the first and last point of every
+    history.
+    """
+
+    first = np.ones(x.shape[0], dtype=bool)
+    first[1:] = ids[1:] != ids[:-1]
+    keep = first.copy()
+    keep[1:] |= x[1:] != x[:-1]
+    x = x[keep]
+    ids = ids[keep]
+    first = first[keep]
+    last = np.ones(x.shape[0], dtype=bool)
+    last[:-1] = first[1:]
+    keep = first | last
+    d = np.diff(x)
+    keep[1:-1] |= d[:-1] * d[1:] < 0.
+    return x[keep], ids[keep]
+
+
+def rainflow(histories):
+    """
+    Rainflow counting of many histories at once with the four point
+    method.
+
+    The turning points of all histories are concatenated, and in every
+    pass all inner ranges that are smaller than both of their neighbouring
+    ranges are counted as full cycles and removed simultaneously, until no
+    such ranges are left. The remaining ranges of every history are counted
+    as half cycles, as in ASTM E1049.
+
+    parameters
+    ----------
+    histories: array
+        histories, e.g. stresses in time. Size ((nh, nt))
+
+    returns
+    -------
+    ranges: array
+        ranges of the cycles. Size (ncycle)
+    means: array
+        mean values of the cycles. Size (ncycle)
+    counts: array
+        number of cycles, 1 for full and 0.5 for half cycles. Size (ncycle)
+    ids: array
+        history of each cycle. Size (ncycle)
+    """
+
+    histories = np.atleast_2d(np.asarray(histories, dtype=float))
+    nh, nt = histories.shape
+    x, ids = _turning_points(histories.flatten(), np.repeat(np.arange(nh), nt))
+
+    ranges = []
+    means = []
+    counts = []
+    cids = []
+    while x.shape[0] >= 4:
+        r = np.abs(np.diff(x))
+        same = ids[:-3] == ids[3:]
+        cand = same & (r[1:-1] <= r[:-2]) & (r[1:-1] <= r[2:])
+        # candidates sharing a point are removed in the next pass
+        cand[1:] &= ~cand[:-1]
+        j = np.nonzero(cand)[0]
+        if j.shape[0] == 0:
+            break
+        ranges.append(r[j + 1])
+        means.append(0.5 * (x[j + 1] + x[j + 2]))
+        counts.append(np.ones(j.shape[0]))
+        cids.append(ids[j + 1])
+        keep = np.ones(x.shape[0], dtype=bool)
+        keep[j + 1] = False
+        keep[j + 2] = False
+        x = x[keep]
+        ids = ids[keep]
+
+    # residue
+    same = ids[1:] == ids[:-1]
+    ranges.append(np.abs(np.diff(x))[same])
+    means.append((0.5 * (x[1:] + x[:-1]))[same])
+    counts.append(0.5 * np.ones(np.sum(same)))
+    cids.append(ids[1:][same])
+    return np.concatenate(ranges), np.concatenate(means), \
+           np.concatenate(counts), np.concatenate(cids)
+
+
+def miner_damage(histories, m, S1):
+    """
+    Miner sum of the damage of histories with S-N curves
+    N = (S1 / S)**m, where S is the range of a cycle.
+
+    parameters
+    ----------
+    histories: array
+        stress histories. Size ((nh, nt))
+    m: array
+        Woehler exponents of the histories. Size (nh)
+    S1: array
+        stress ranges with a life of one cycle. Size (nh)
+
+    returns
+    -------
+    damage: array
+        damage of every history. Size (nh)
+    """
+
+    histories = np.atleast_2d(histories)
+    nh = histories.shape[0]
+    m = np.ones(nh) * m
+    S1 = np.ones(nh) * S1
+    ranges, means, counts, ids = rainflow(histories)
+    d = counts * (ranges / S1[ids])**m[ids]
+    return np.bincount(ids, weights=d, minlength=nh)
+
+
+def group_failure(failure, groups, rho=50.):
+    """
+    Maximum and Kreisselmeier and Steinhauser aggregate of the failure
+    indices of groups of elements, e.g. regions or materials, computed
+    with segmented reductions over the elements sorted by group.
+
+    parameters
+    ----------
+    failure: array
+        failure indices in the BECAS format. Size ((ncase, ne, 6))
+    groups: array
+        group of each element. Size (ne)
+    rho: float
+        KS aggregation parameter
+
+    returns
+    -------
+    keys: array
+        sorted groups with at least one element. Size (ngroup)
+    fmax: array
+        max failure index of each group. Size ((ncase, ngroup))
+    fks: array
+        failure index of each group aggregated with the KS function.
+        Size ((ncase, ngroup))
+    """
+
+    failure = np.asarray(failure)
+    if failure.ndim == 2:
+        failure = failure[np.newaxis]
+    groups = np.asarray(groups)
+    ncase, ne, ncomp = failure.shape
+
+    order = np.argsort(groups, kind='mergesort')
+    keys, start = np.unique(groups[order], return_index=True)
+    f = failure[:, order].reshape(ncase, ne * ncomp)
+    idx = start * ncomp
+    fmax = np.maximum.reduceat(f, idx, axis=1)
+    size = np.diff(np.append(idx, ne * ncomp))
+    fks = fmax + np.log(np.add.reduceat(np.exp(rho * (f - np.repeat(fmax, size, axis=1))),
+                                        idx, axis=1)) / rho
+    return keys, fmax, fks
+
+
+def ks_aggregate(p, rho=50., axis=None, side=1.):
+    """
+    Kreisselmeier and Steinhauser aggregation of an array over one or
+    more axes with the gradient w.r.t. every entry.
+
+    NaN entries are left out of the aggregation and flagged, and slices
+    with only NaN entries aggregate to NaN.
+
+    parameters
+    ----------
+    p: array
+        values to aggregate, e.g. failure indices of size ((ncase, ne, 6))
+    rho: float
+        aggregation parameter
+    axis: int or tuple
+        axes to aggregate over, default all axes
+    side: float
+        side=1 computes the max, side=-1. computes the min
+
+    returns
+    -------
+    ks: array or float
+        aggregated values with the axes removed
+    dks: array
+        gradient of the aggregated values w.r.t. p, which is zero for the
+        NaN entries. Same size as p
+    nan: array
+        True for the NaN entries of p. Same size as p
+    """
+
+    p = np.asarray(p, dtype=float)
+    side = float(side)
+    nan = np.isnan(p)
+    q = np.where(nan, -np.inf, side * p)
+    qmax = np.max(q, axis=axis, keepdims=True)
+    empty = np.isinf(qmax)
+    qmax[empty] = 0.
+    e = np.exp(rho * (q - qmax))
+    s = e.sum(axis=axis, keepdims=True)
+    s[empty] = 1.
+    ks = side * (qmax + np.log(s) / rho)
+    ks[empty] = np.nan
+    dks = e / s
+    if axis is None:
+        return ks.flatten()[0], dks, nan
+    return np.squeeze(ks, axis=axis), dks, nan
@@ -0,0 +1,100 @@
+import unittest
+import os
+import numpy as np
+
+from becas_wrapper.becas_numpy import BECASNumpy, transform_matrix
+from becas_wrapper.beamprops import transform_matrices, transform_beam_matrices, \
+                                    km2csprops, km2hawc2, section_shear_modulus
+
+path_data = 'data/BECAS_inputs'
+sections = [0., 0.333, 0.667, 1.]
+
+
+def load_inputs(s):
+
+    path = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+    nl_2d = np.loadtxt(os.path.join(path, 'N2D.in'))
+    el_2d = np.loadtxt(os.path.join(path, 'E2D.in')).astype(int)
+    emat = np.loadtxt(os.path.join(path, 'EMAT.in'))
+    matprops = np.loadtxt(os.path.join(path, 'MATPROPS.in'))
+    return nl_2d, el_2d, emat, matprops
+
+
+def run_sections():
+
+    results = []
+    for s in sections:
+        section = BECASNumpy(*load_inputs(s))
+        section.compute()
+        results.append(section)
+    return results
+
+
+class BeamPropsTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.results = run_sections()
+        cls.K = np.array([sec.Ks for sec in cls.results])
+        cls.M = np.array([sec.Ms for sec in cls.results])
+
+    def test_transform_matrices(self):
+
+        x0 = np.array([0.1, -0.2, 0.3])
+        y0 = np.array([0.05, 0., -0.1])
+        alpha = np.array([0.1, -0.5, 1.])
+        T = transform_matrices(x0, y0, alpha)
+        for i in range(3):
+            self.assertEqual(np.testing.assert_allclose(T[i], transform_matrix(x0[i], y0[i], alpha[i]),
+                                                        rtol=1.e-14, atol=1.e-14), None)
+
+    def test_transform_beam_matrices(self):
+
+        x0 = np.array([0.1, -0.2, 0.3, 0.5])
+        y0 = np.zeros(4)
+        K, M = transform_beam_matrices(self.K, self.M, x0, y0, np.zeros(4))
+        for i in range(4):
+            T = transform_matrix(x0[i], y0[i], 0.)
+            self.assertEqual(np.testing.assert_allclose(K[i], np.dot(T.T, np.dot(self.K[i], T)),
+                                                        rtol=1.e-12, atol=1.e-6), None)
+            self.assertEqual(np.testing.assert_allclose(M[i], np.dot(T.T, np.dot(self.M[i], T)),
+                                                        rtol=1.e-12, atol=1.e-12), None)
+        p0 = km2csprops(self.K, self.M)
+        p = km2csprops(K, M)
+        self.assertEqual(np.testing.assert_allclose(p['xe'], p0['xe'] - x0,
+                                                    rtol=1.e-6, atol=1.e-10), None)
+        self.assertEqual(np.testing.assert_allclose(p['xm'], p0['xm'] - x0,
+                                                    rtol=1.e-6, atol=1.e-10), None)
+
+    def test_csprops(self):
+
+        p = km2csprops(self.K, self.M)
+        csprops = np.array([sec.csprops for sec in self.results])
+        for j, name in enumerate(['xs', 'ys', 'xe', 'ye', 'mass', 'xm', 'ym',
+                                  'Ixx', 'Iyy', 'Ixy']):
+            self.assertEqual(np.testing.assert_allclose(p[name], csprops[:, j],
+                                                        rtol=1.e-6, atol=1.e-10), None)
+        self.assertEqual(np.testing.assert_allclose(p['alpha_e'], csprops[:, 17],
+                                                    rtol=1.e-6, atol=1.e-10), None)
+
+    def test_hawc2(self):
+
+        area = np.zeros(len(sections))
+        G = np.zeros(len(sections))
+        for i, s in enumerate(sections):
+            area[i], G[i] = section_shear_modulus(*load_inputs(s))
+        cs_props = km2hawc2(self.K, self.M, sections, False, area, G)
+        ref = np.array([sec.becas2hawc2(s) for s, sec in zip(sections, self.results)])
+        self.assertEqual(np.testing.assert_allclose(cs_props, ref, rtol=1.e-6, atol=1.e-10), None)
+
+    def test_FPM(self):
+
+        cs_props = km2hawc2(self.K, self.M, sections, True)
+        ref = np.array([sec.becas2hawc2(s, True) for s, sec in zip(sections, self.results)])
+        self.assertEqual(np.testing.assert_allclose(cs_props, ref, rtol=1.e-6, atol=1.e-4), None)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -17,7 +17,8 @@ from fusedwind.turbine.structure import read_bladestructure, \
                                         SplinedBladeStructure
 
 from becas_wrapper.becas_bladestructure import BECASBeamStructureKM,\
-                                               BECASBeamStructure
+                                               BECASBeamStructure, \
+                                               _interpolate_span
 from becas_wrapper.becas_stressrecovery import BECASStressRecovery
 
 from distutils.spawn import find_executable
@@ -170,7 +171,7 @@ blade_beam_csprops_ref = np.array([[4.474857571200e-03,   2.599762118283e-04,
     3.189399797468e-05,   4.525135763937e-04,  -1.433510628713e-05,
     1.596955117636e-02,  -2.523556151881e-02,  -1.538518181341e-02]])
 
-def configure_BECASBeamStructure(nsec, exec_mode, path_data, dry_run=False, FPM=False, with_sr=False):
+def configure_BECASBeamStructure(nsec, exec_mode, path_data, dry_run=False, FPM=False, with_sr=False, blade_mesh=False, adaptive_span=None, layup_mass=False):
 
     p = Problem(impl=impl, root=Group())
 
@@ -214,6 +215,11 @@ def configure_BECASBeamStructure(nsec, exec_mode, path_data, dry_run=False, FPM=
     spl.configure()
     # inputs to CS2DtoBECAS and BECASWrapper
     config = {}
+    config['blade_mesh'] = blade_mesh
+    if adaptive_span is not None:
+        config['adaptive_span'] = adaptive_span
+    config['layup_mass'] = layup_mass
+    config['with_sr'] = with_sr
     cfg = {}
     cfg['dry_run'] = dry_run
     cfg['dominant_elsets'] = ['REGION04', 'REGION08']
@@ -229,7 +235,7 @@ def configure_BECASBeamStructure(nsec, exec_mode, path_data, dry_run=False, FPM=
     config['BECASWrapper'] = cfg
 
     p.root.add('stiffness', BECASBeamStructure(p.root, config, st3dn, (200, nsec_st, 3)), promotes=['*'])
-    p.root.add('stress_recovery', BECASStressRecovery(config, s_st, 2), promotes=['*'])
+    p.root.add('stress_recovery', BECASStressRecovery(config, s_st, 2, st3dn), promotes=['*'])
 
     p.setup()
     p['hub_radius'] = 2.8
@@ -343,6 +349,86 @@ class BECASBeamStructureTestCase(unittest.TestCase):
             self.assertAlmostEqual(p['blade_failure_index_sec003'][0], 0.15931231052281988, places=6)
     
     
+    def test_blade_mesh_octave(self):
+        p = configure_BECASBeamStructure(4, 'octave', 'data', False, False, blade_mesh=True)
+        p.run()
+
+        self.assertEqual(np.testing.assert_array_almost_equal(p['blade_beam_structure'][:,1:]/beam_st[:,1:], np.ones((4,18)), decimal=6), None)
+
+        self.assertAlmostEqual(p['blade_mass']/42499.350315582917, 1.e0, places=6)
+        self.assertAlmostEqual(p['blade_mass_moment']/10670946.166707618, 1.e0, places=6)
+
+        self.assertEqual(np.testing.assert_allclose(p['KStruct'][2,2,:], k_33, 1E-6), None)
+        self.assertEqual(np.testing.assert_allclose(p['MStruct'][5,5,:], m_66, 1E-6), None)
+
+    def test_adaptive_span_numpy(self):
+        # the interpolation error between the first and last sections
+        # is too large, so all sections end up being computed
+        p = configure_BECASBeamStructure(4, 'numpy', 'data', False, False,
+                                         adaptive_span={'n_initial': 3, 'tol': 1.e-6})
+        p.run()
+
+        self.assertEqual(np.testing.assert_array_almost_equal(p['blade_beam_structure'][:,1:]/beam_st[:,1:], np.ones((4,18)), decimal=5), None)
+        self.assertEqual(np.testing.assert_allclose(p['KStruct'][2,2,:], k_33, 1E-5), None)
+        self.assertEqual(np.testing.assert_allclose(p['MStruct'][5,5,:], m_66, 1E-5), None)
+
+    def test_adaptive_span_interpolated_numpy(self):
+        # with a loose tolerance only the initial sections are computed
+        # and the second section is interpolated
+        p = configure_BECASBeamStructure(4, 'numpy', 'data', False, False,
+                                         adaptive_span={'n_initial': 3, 'tol': 2.})
+        p.run()
+
+        computed = [0, 2, 3]
+        self.assertEqual(list(p.root.stiffness.adaptive.computed), computed)
+        self.assertEqual(np.testing.assert_allclose(p['KStruct'][2,2,computed], k_33[computed], 1E-5), None)
+        self.assertEqual(np.testing.assert_allclose(p['MStruct'][5,5,computed], m_66[computed], 1E-5), None)
+        # the interpolation error of the root transition is about 30%
+        self.assertEqual(np.testing.assert_allclose(p['KStruct'][2,2,1], k_33[1], 0.5), None)
+        self.assertEqual(np.testing.assert_allclose(p['MStruct'][5,5,1], m_66[1], 0.5), None)
+        for i in range(4):
+            self.assertTrue(np.all(np.linalg.eigvalsh(p['KStruct'][:,:,i]) > 0.))
+
+    def test_adaptive_span_changed_sections_numpy(self):
+        p = configure_BECASBeamStructure(4, 'numpy', 'data', False, False,
+                                         adaptive_span={'n_initial': 3, 'tol': 2.})
+        p.run()
+        comp = p.root.stiffness.adaptive
+        last = list(comp._computed_inputs)
+
+        # unchanged sections are not computed again
+        comp.solve_nonlinear(comp.params, comp.unknowns, comp.resids)
+        for i in range(4):
+            self.assertTrue(comp._computed_inputs[i] is last[i])
+
+        # only the section with changed inputs is computed again
+        comp.params['sec_tvec'][2] *= 1.01
+        comp.solve_nonlinear(comp.params, comp.unknowns, comp.resids)
+        for i in [0, 3]:
+            self.assertTrue(comp._computed_inputs[i] is last[i])
+        self.assertFalse(comp._computed_inputs[2] is last[2])
+
+    def test_layup_mass_numpy(self):
+        # the layup mass neglects the curvature of the walls
+        p = configure_BECASBeamStructure(4, 'numpy', 'data', False, False,
+                                         layup_mass=True)
+        p.run()
+
+        self.assertAlmostEqual(p['blade_mass']/42499.350315582917, 1.e0, delta=0.05)
+        self.assertAlmostEqual(p['blade_mass_moment']/10670946.166707618, 1.e0, delta=0.05)
+        self.assertEqual(np.testing.assert_allclose(p['blade_dm'], beam_st[:,1], 0.05), None)
+
+    def test_oct2py_session(self):
+        p = configure_BECASBeamStructure(4, 'oct2py_session', 'data', False, False)
+        p.run()
+        # second run reuses the mesh held in the Octave sessions
+        p.run()
+
+        self.assertEqual(np.testing.assert_array_almost_equal(p['blade_beam_structure'][:,1:]/beam_st[:,1:], np.ones((4,18)), decimal=6), None)
+
+        self.assertEqual(np.testing.assert_allclose(p['KStruct'][2,2,:], k_33, 1E-6), None)
+        self.assertEqual(np.testing.assert_allclose(p['MStruct'][5,5,:], m_66, 1E-6), None)
+
     @unittest.skipIf(not _matlab_installed,
                  "Matlab not available on this system")
     def test_standard_matlab(self):
@@ -409,6 +495,40 @@ class BECASBeamStructureKMTestCase(unittest.TestCase):
         self.assertEqual(np.testing.assert_allclose(p['MStruct'][0,0,:], m_11, 1E-6), None)
         self.assertEqual(np.testing.assert_allclose(p['MStruct'][5,5,:], m_66, 1E-6), None)
         
+class InterpolateSpanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # positive definite matrices varying by orders of magnitude
+        np.random.seed(1)
+        self.si = np.array([0., 0.2, 0.5, 1.])
+        self.K = np.zeros((4, 6, 6))
+        self.M = np.zeros((4, 6, 6))
+        for i in range(4):
+            A = np.random.rand(6, 6)
+            self.K[i] = np.dot(A, A.T) * 10**(8 - 2 * i) + np.eye(6)
+            B = np.random.rand(6, 6)
+            self.M[i] = np.dot(B, B.T) * 10**(3 - i) + np.eye(6) * 1.e-3
+        self.props = [np.random.rand(4, 19), np.random.rand(4, 18)]
+
+    def test_nodes(self):
+
+        K, M, props = _interpolate_span(self.si, self.si, self.K, self.M, self.props)
+        self.assertEqual(np.testing.assert_allclose(K, self.K, rtol=1.e-10), None)
+        self.assertEqual(np.testing.assert_allclose(M, self.M, rtol=1.e-10), None)
+        for p, pi in zip(props, self.props):
+            self.assertEqual(np.testing.assert_allclose(p, pi, rtol=1.e-12), None)
+
+    def test_positive_definite(self):
+
+        s = np.linspace(0, 1, 101)
+        K, M, props = _interpolate_span(self.si, s, self.K, self.M, self.props)
+        self.assertEqual(K.shape, (101, 6, 6))
+        self.assertEqual(props[0].shape, (101, 19))
+        for i in range(s.shape[0]):
+            self.assertTrue(np.all(np.linalg.eigvalsh(K[i]) > 0.))
+            self.assertTrue(np.all(np.linalg.eigvalsh(M[i]) > 0.))
+            self.assertEqual(np.testing.assert_allclose(K[i], K[i].T, rtol=1.e-12), None)
+
 if __name__ == "__main__":
     unittest.main()
     #p = configure_BECASBeamStructure(4, 'matlab', 'data', False, False)
@@ -0,0 +1,597 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from becas_wrapper.becas_wrapper import BECASWrapper, ksfunc
+from becas_wrapper.becas_numpy import BECASNumpy
+from becas_wrapper.becas_stressrecovery import BECASCSStressRecovery
+from becas_wrapper.cs2dtobecas import CS2DtoBECAS
+
+from test_becas_bladestructure import beam_st, beam_st_FPM, \
+                                      blade_beam_csprops_ref, \
+                                      k_11, k_33, m_11, m_66
+
+path_data = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'BECAS_inputs')
+sections = [0., 0.333, 0.667, 1.]
+
+
+def run_sections(FPM=False):
+
+    results = []
+    for s in sections:
+        becas = BECASWrapper(s, exec_mode='numpy', hawc2_FPM=FPM,
+                             path_input=os.path.join(path_data, 'BECAS_SECTION%3.3f' % s))
+        becas.compute()
+        results.append(becas)
+    return results
+
+
+class BECASNumpyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # the sections are saved to becas_utils%3.3f.npz in the work directory
+        self.basedir = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        os.chdir(self.workdir)
+
+    def tearDown(self):
+        os.chdir(self.basedir)
+        shutil.rmtree(self.workdir)
+
+    def test_stiffness_mass(self):
+
+        results = run_sections()
+        for i, becas in enumerate(results):
+            self.assertTrue(becas.success)
+            self.assertAlmostEqual(becas.k_matrix[0, 0] / k_11[i], 1., places=5)
+            self.assertAlmostEqual(becas.k_matrix[2, 2] / k_33[i], 1., places=5)
+            self.assertAlmostEqual(becas.m_matrix[0, 0] / m_11[i], 1., places=5)
+            self.assertAlmostEqual(becas.m_matrix[5, 5] / m_66[i], 1., places=5)
+
+    def test_csprops(self):
+
+        results = run_sections()
+        csprops = np.array([becas.csprops for becas in results])
+        self.assertEqual(np.testing.assert_allclose(csprops, blade_beam_csprops_ref, rtol=1.e-5), None)
+
+    def test_hawc2(self):
+
+        results = run_sections()
+        cs_props = np.array([becas.cs_props for becas in results])
+        # the reference x-coordinates are shifted to half chord in PostprocessCS
+        offset = beam_st[:, 2] - cs_props[:, 2]
+        for j in [2, 6, 17]:
+            cs_props[:, j] += offset
+        self.assertEqual(np.testing.assert_allclose(cs_props[:, 1:], beam_st[:, 1:], rtol=1.e-5), None)
+
+    def test_FPM(self):
+
+        results = run_sections(FPM=True)
+        cs_props = np.array([becas.cs_props for becas in results])
+        offset = beam_st_FPM[:, 2] - cs_props[:, 2]
+        for j in [2, 6, 17]:
+            cs_props[:, j] += offset
+        self.assertEqual(np.testing.assert_allclose(cs_props[:, 1:], beam_st_FPM[:, 1:], rtol=1.e-5, atol=1.e-2), None)
+
+    def test_quad8(self):
+
+        # convert the Quad4 mesh into a Quad8 mesh with mid-side nodes
+        path = os.path.join(path_data, 'BECAS_SECTION0.333')
+        nl_2d = np.loadtxt(os.path.join(path, 'N2D.in'))
+        el_2d = np.loadtxt(os.path.join(path, 'E2D.in')).astype(int)
+        emat = np.loadtxt(os.path.join(path, 'EMAT.in'))
+        matprops = np.loadtxt(os.path.join(path, 'MATPROPS.in'))
+        q4 = BECASNumpy(nl_2d, el_2d, emat, matprops)
+        q4.compute()
+
+        xy = dict(zip(nl_2d[:, 0].astype(int), nl_2d[:, 1:]))
+        nodes = list(nl_2d)
+        nn = nl_2d[:, 0].astype(int).max()
+        mids = {}
+        el_q8 = np.zeros((el_2d.shape[0], 9), dtype=int)
+        el_q8[:, :5] = el_2d[:, :5]
+        for i, el in enumerate(el_2d[:, 1:5]):
+            for j in range(4):
+                edge = tuple(sorted((el[j], el[(j + 1) % 4])))
+                if edge not in mids:
+                    mids[edge] = nn + len(mids) + 1
+                    x, y = 0.5 * (xy[edge[0]] + xy[edge[1]])
+                    nodes.append([mids[edge], x, y])
+                el_q8[i, 5 + j] = mids[edge]
+        q8 = BECASNumpy(np.array(nodes), el_q8, emat, matprops)
+        q8.compute()
+
+        self.assertEqual(q8.nnpe, 8)
+        self.assertAlmostEqual(q8.Ms[0, 0] / q4.Ms[0, 0], 1., places=10)
+        self.assertAlmostEqual(q8.Ks[2, 2] / q4.Ks[2, 2], 1., places=2)
+        self.assertAlmostEqual(q8.Ks[5, 5] / q4.Ks[5, 5], 1., places=1)
+
+    def test_update_materials(self):
+
+        path = os.path.join(path_data, 'BECAS_SECTION0.667')
+        nl_2d = np.loadtxt(os.path.join(path, 'N2D.in'))
+        el_2d = np.loadtxt(os.path.join(path, 'E2D.in'))
+        emat = np.loadtxt(os.path.join(path, 'EMAT.in'))
+        matprops = np.loadtxt(os.path.join(path, 'MATPROPS.in'))
+        section = BECASNumpy(nl_2d, el_2d, emat, matprops)
+        section.compute()
+        perm = section.perm
+
+        matprops[:, :6] *= 1.1
+        emat[:, 2] += 5.
+        section.update_materials(emat, matprops)
+        ref = BECASNumpy(nl_2d, el_2d, emat, matprops)
+        ref.compute()
+
+        self.assertTrue(section.perm is perm)
+        self.assertEqual(np.testing.assert_allclose(section.Ks, ref.Ks, rtol=1.e-8, atol=1.e-6), None)
+        self.assertEqual(np.testing.assert_allclose(section.csprops, ref.csprops, rtol=1.e-8, atol=1.e-12), None)
+
+    def test_stress_recovery(self):
+
+        ks_ref = [0.17026370426021892, 0.16552789587300576,
+                  0.16292259732314465, 0.15931231052281988]
+        for i, s in enumerate(sections):
+            path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+            becas = BECASWrapper(s, exec_mode='numpy', path_input=path_input)
+            becas.compute()
+            sr = BECASWrapper(s, exec_mode='numpy', analysis_mode='stress_recovery',
+                              path_input=path_input)
+            sr.load_cases = np.ones((2, 6))
+            sr.compute()
+            self.assertTrue(sr.success)
+            self.assertEqual(sr.failure_elements[0].shape, (becas.section.ne, 6))
+            self.assertAlmostEqual(sr.max_failure_ks[0], ks_ref[i], places=6)
+
+            # the failure index scales linearly with the loads
+            sr.load_cases = 1.e5 * np.ones((1, 6))
+            sr.compute()
+            self.assertAlmostEqual(sr.max_failure[0] / becas.section.compute_failure(np.ones(6)).max(), 1.e5, places=3)
+
+    def test_failure_groups(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input)
+        becas.load_cases = np.ones((2, 6)) * 1.e4
+        becas.compute()
+        failure = np.array(becas.failure_elements)
+        self.assertEqual(list(becas.material_ids), list(np.unique(becas.emat[:, 1])))
+        self.assertEqual(np.testing.assert_allclose(becas.material_max_failure.max(axis=1),
+                                                    becas.max_failure, rtol=1.e-14), None)
+        el_mat = becas.section.el_mat + 1
+        for j, k in enumerate(becas.material_ids):
+            self.assertAlmostEqual(becas.material_failure_ks[0, j],
+                                   ksfunc(failure[0, el_mat == k]), places=12)
+
+    def test_failure_outputs_zero_loads(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input)
+        np.random.seed(1)
+        becas.load_cases = np.random.randn(2, 6) * 1.e5
+        becas.compute()
+
+        # failure files written by BECAS in Octave, where the zero load
+        # case is not recovered
+        np.savetxt('failure0.out', becas.failure_elements[0])
+        np.savetxt('failure1.out', np.zeros(100))
+        sr = BECASWrapper(s, exec_mode='octave', analysis_mode='stress_recovery',
+                          path_input=path_input)
+        sr.load_cases = np.array([becas.load_cases[0], np.zeros(6)])
+        sr.read_failure_outputs()
+        self.assertEqual(list(sr.max_failure), [becas.max_failure[0], 0.])
+        self.assertEqual(sr.material_max_failure.shape, (2, sr.material_ids.shape[0]))
+        self.assertAlmostEqual(sr.material_max_failure[0].max(), becas.max_failure[0], places=12)
+        self.assertEqual(np.abs(sr.material_max_failure[1]).max(), 0.)
+
+    def test_critical_elements(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input, recovery_top_k=50,
+                             full_sweep_interval=3)
+        np.random.seed(1)
+        becas.load_cases = np.random.randn(5, 6) * 1.e5
+        becas.compute()
+        self.assertEqual(becas.recovered_elements, None)
+        ne = becas.section.ne
+        max_failure = becas.max_failure.copy()
+        self.assertEqual(becas.critical_elements.shape, (50, 3))
+        self.assertAlmostEqual(becas.critical_elements[0, 2], max_failure.max(), places=12)
+        self.assertEqual(int(becas.critical_elements[0, 1]), np.argmax(max_failure))
+
+        # only the critical elements of the previous call are recovered
+        becas.compute()
+        self.assertEqual(becas.recovered_elements.shape[0], 50)
+        self.assertEqual(len(becas.failure_elements[0]), 50)
+        self.assertAlmostEqual(becas.max_failure.max(), max_failure.max(), places=12)
+
+        # periodic full sweep
+        becas.compute()
+        becas.compute()
+        self.assertEqual(becas.recovered_elements, None)
+        self.assertEqual(len(becas.failure_elements[0]), ne)
+
+    def test_screening(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input)
+        np.random.seed(1)
+        becas.load_cases = np.random.randn(20, 6) * 1.e5
+        becas.compute()
+        max_failure = becas.max_failure.copy()
+
+        # all cases are recovered if none exceeds the threshold
+        becas.screening_threshold = 2. * max_failure.max()
+        becas.compute()
+        self.assertFalse(becas.screening_exceeded)
+        self.assertEqual(becas.screening_ncases, 20)
+        self.assertAlmostEqual(becas.max_failure_lower_bound, max_failure.max(), places=12)
+
+        # the most critical case of the previous call is recovered first
+        becas.screening_threshold = 0.5 * max_failure.max()
+        becas.compute()
+        self.assertTrue(becas.screening_exceeded)
+        self.assertEqual(becas.screening_ncases, 1)
+        self.assertEqual(np.isnan(becas.max_failure).sum(), 19)
+        self.assertAlmostEqual(becas.max_failure[np.argmax(max_failure)], max_failure.max(), places=12)
+        self.assertTrue(becas.max_failure_lower_bound <= max_failure.max())
+
+    def test_parallel_stress_recovery(self):
+
+        s = 0.333
+        path_input = os.path.abspath(os.path.join(path_data, 'BECAS_SECTION%3.3f' % s))
+        workdir = 'becas_sec001_0'
+        try:
+            os.mkdir(workdir)
+        except:
+            pass
+        os.chdir(workdir)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input)
+        np.random.seed(1)
+        loads = np.random.randn(11, 6) * 1.e5
+        becas.load_cases = loads
+        becas.compute()
+        os.chdir('..')
+
+        config = {'BECASWrapper': {'exec_mode': 'numpy', 'path_input': path_input},
+                  'sr_workers': 2, 'sr_chunk_size': 3}
+        sr = BECASCSStressRecovery('sec001', config, s, 11)
+        params = {'sec001:hash': 0., 'load_cases_sec001': loads}
+        unknowns = {'blade_failure_index_sec001': np.zeros(11)}
+        sr.solve_nonlinear(params, unknowns, {})
+        # the work directories of the chunks are removed
+        self.assertEqual([d for d in os.listdir(workdir) if d.startswith('sr')], [])
+        shutil.rmtree(workdir)
+
+        self.assertTrue(sr.becas.success)
+        self.assertEqual(np.testing.assert_allclose(sr.becas.max_failure, becas.max_failure,
+                                                    rtol=1.e-12), None)
+        self.assertEqual(np.testing.assert_allclose(unknowns['blade_failure_index_sec001'],
+                                                    becas.max_failure_ks, rtol=1.e-12), None)
+        self.assertEqual(np.testing.assert_allclose(sr.becas.critical_elements,
+                                                    becas.critical_elements, rtol=1.e-12), None)
+        self.assertEqual(list(sr.becas.material_ids), list(becas.material_ids))
+        self.assertEqual(np.testing.assert_allclose(sr.becas.material_failure_ks,
+                                                    becas.material_failure_ks, rtol=1.e-12), None)
+
+    def test_stress_recovery_cache(self):
+
+        s = 0.333
+        path_input = os.path.abspath(os.path.join(path_data, 'BECAS_SECTION%3.3f' % s))
+        workdir = 'becas_sec001_0'
+        try:
+            os.mkdir(workdir)
+        except:
+            pass
+        os.chdir(workdir)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input)
+        np.random.seed(1)
+        loads = np.random.randn(6, 6) * 1.e5
+        loads[5] = loads[2]
+        becas.load_cases = loads
+        becas.compute()
+        os.chdir('..')
+
+        config = {'BECASWrapper': {'exec_mode': 'numpy', 'path_input': path_input},
+                  'sr_cache': True}
+        sr = BECASCSStressRecovery('sec001', config, s, 6)
+        params = {'sec001:hash': 0., 'load_cases_sec001': loads.copy()}
+        unknowns = {'blade_failure_index_sec001': np.zeros(6)}
+        sr.solve_nonlinear(params, unknowns, {})
+        # repeated load cases are only recovered once
+        self.assertEqual(sr.becas.recovered_elements, None)
+        self.assertEqual(len(sr.becas.failure_elements), 5)
+        self.assertEqual(np.testing.assert_allclose(unknowns['blade_failure_index_sec001'],
+                                                    becas.max_failure_ks, rtol=1.e-12), None)
+
+        # only the changed load case is recovered
+        params['load_cases_sec001'][3] *= 1.1
+        sr.solve_nonlinear(params, unknowns, {})
+        self.assertEqual(len(sr.becas.failure_elements), 1)
+        becas.load_cases = params['load_cases_sec001']
+        os.chdir(workdir)
+        becas.compute()
+        os.chdir('..')
+        shutil.rmtree(workdir)
+        self.assertEqual(np.testing.assert_allclose(unknowns['blade_failure_index_sec001'],
+                                                    becas.max_failure_ks, rtol=1.e-12), None)
+
+    def test_group_failure_outputs(self):
+
+        s = 0.333
+        path_input = os.path.abspath('BECAS_SECTION%3.3f' % s)
+        shutil.copytree(os.path.join(path_data, 'BECAS_SECTION%3.3f' % s), path_input)
+        # elements of two regions and the second web
+        elnr = np.loadtxt(os.path.join(path_input, 'E2D.in'))[:, 0].astype(int)
+        np.savetxt(os.path.join(path_input, 'REGIONS.in'),
+                   np.array([elnr, np.arange(elnr.shape[0]) % 3]).T, fmt='%d',
+                   header='REGION00 REGION01 WEB01')
+        workdir = 'becas_sec001_0'
+        os.mkdir(workdir)
+        os.chdir(workdir)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input)
+        np.random.seed(1)
+        loads = np.random.randn(4, 6) * 1.e5
+        becas.load_cases = loads
+        becas.compute()
+        os.chdir('..')
+        self.assertEqual(becas.region_names, ['REGION00', 'REGION01', 'WEB01'])
+
+        st3d = {'regions': [{}, {}], 'webs': [{}, {}],
+                'materials': {'biax': 0, 'uniax': 1, 'balsa': 2, 'triax': 3}}
+        for cache in [False, True]:
+            config = {'BECASWrapper': {'exec_mode': 'numpy', 'path_input': path_input},
+                      'sr_cache': cache}
+            sr = BECASCSStressRecovery('sec001', config, s, 4, st3d)
+            params = {'sec001:hash': 0., 'load_cases_sec001': loads}
+            unknowns = {'blade_failure_index_sec001': np.zeros(4),
+                        'blade_region_failure_index_sec001': np.zeros((4, 4)),
+                        'blade_material_failure_index_sec001': np.zeros((4, 4))}
+            sr.solve_nonlinear(params, unknowns, {})
+            sr.solve_nonlinear(params, unknowns, {})
+            fks = unknowns['blade_region_failure_index_sec001']
+            self.assertEqual(np.testing.assert_allclose(fks[:, [0, 1, 3]], becas.region_failure_ks,
+                                                        rtol=1.e-12), None)
+            # the first web has no elements
+            self.assertTrue(np.all(fks[:, 2] == 0.))
+            self.assertEqual(np.testing.assert_allclose(unknowns['blade_material_failure_index_sec001'],
+                                                        becas.material_failure_ks, rtol=1.e-12), None)
+        shutil.rmtree(workdir)
+
+    def test_stress_recovery_failed(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        # no section has been computed in the work directory
+        os.mkdir('becas_sec001_0')
+        config = {'BECASWrapper': {'exec_mode': 'numpy', 'path_input': path_input},
+                  'sr_cache': True}
+        sr = BECASCSStressRecovery('sec001', config, s, 3)
+        params = {'sec001:hash': 0., 'load_cases_sec001': np.ones((3, 6))}
+        unknowns = {'blade_failure_index_sec001': np.zeros(3)}
+        sr.solve_nonlinear(params, unknowns, {})
+        self.assertFalse(sr.becas.success)
+        self.assertTrue(np.all(np.isnan(unknowns['blade_failure_index_sec001'])))
+
+    def test_stress_recovery_surrogate(self):
+
+        config = {'BECASWrapper': {'exec_mode': 'numpy'},
+                  'surrogate': {'radius': 0.05}}
+        self.assertRaises(RuntimeError, BECASCSStressRecovery, 'sec001', config, 0.333, 2)
+        config['with_sr'] = True
+        sr = BECASCSStressRecovery('sec001', config, 0.333, 2)
+        self.assertEqual(sr.becas.analysis_mode, 'stress_recovery')
+
+    def test_stress_recovery_thin_walled(self):
+
+        config = {'BECASWrapper': {'exec_mode': 'numpy'},
+                  'thin_walled_iterations': 5}
+        self.assertRaises(RuntimeError, BECASCSStressRecovery, 'sec001', config, 0.333, 2)
+        config['with_sr'] = True
+        sr = BECASCSStressRecovery('sec001', config, 0.333, 2)
+        self.assertEqual(sr.becas.analysis_mode, 'stress_recovery')
+
+    def test_shared_section(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='stiffness',
+                             path_input=path_input)
+        becas.compute()
+
+        # the stress recovery reads the section from memory
+        self.assertFalse(os.path.exists(becas.utils_rst_filename))
+        sr = BECASWrapper(s, exec_mode='numpy', analysis_mode='stress_recovery',
+                          path_input=path_input)
+        np.random.seed(1)
+        sr.load_cases = np.random.randn(5, 6) * 1.e5
+        sr.compute()
+        self.assertTrue(sr.success)
+        self.assertTrue(sr.section is becas.section)
+
+        becas.analysis_mode = 'combined'
+        becas.load_cases = sr.load_cases
+        becas.compute()
+        self.assertEqual(np.testing.assert_allclose(sr.max_failure, becas.max_failure,
+                                                    rtol=1.e-14), None)
+
+        # without the shared section the saved file is needed
+        becas.unshare_section()
+        sr.compute()
+        self.assertFalse(sr.success)
+
+        becas.save_state = True
+        becas.compute()
+        becas.unshare_section()
+        sr.compute()
+        self.assertTrue(sr.success)
+        self.assertFalse(sr.section is becas.section)
+        self.assertEqual(np.testing.assert_allclose(sr.max_failure, becas.max_failure,
+                                                    rtol=1.e-12), None)
+
+    def test_export_paraview(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', analysis_mode='combined',
+                             path_input=path_input)
+        self.assertFalse(becas.plot_paraview)
+        np.random.seed(1)
+        becas.load_cases = np.random.randn(4, 6) * 1.e5
+        becas.compute()
+        self.assertRaises(RuntimeError, becas.export_paraview)
+
+        # script exporting the critical load case
+        becas.exec_mode = 'octave'
+        becas.dry_run = True
+        open(becas.utils_rst_filebase + '%3.3f.mat' % s, 'w').close()
+        becas.export_paraview()
+        os.remove(becas.utils_rst_filename)
+        script = open('becas_paraview.m').read()
+        for fname in ['becas_paraview.m', 'BECAS_SetupPath.m']:
+            os.remove(fname)
+        shutil.rmtree(becas.path_plots)
+        case = np.argmax(becas.max_failure)
+        self.assertEqual(script.count('BECAS_PARAVIEW'), 2)
+        self.assertTrue('Sec_span0.333_case%i' % case in script)
+
+    def test_stress_recovery_stream(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', path_input=path_input)
+        becas.compute()
+        np.random.seed(0)
+        loads = np.random.randn(300, 6) * 1.e5
+        np.save('load_series.npy', loads)
+        sr = BECASWrapper(s, exec_mode='numpy', analysis_mode='stress_recovery',
+                          path_input=path_input)
+        sr.stress_recovery_stream(np.load('load_series.npy', mmap_mode='r'), chunk_size=64)
+        os.remove('load_series.npy')
+        failure = becas.section.compute_failure(loads)
+        self.assertEqual(np.testing.assert_allclose(sr.element_max_failure,
+                                                    failure.max(axis=(0, 2)), rtol=1.e-12), None)
+        self.assertAlmostEqual(sr.stream_failure_ks, ksfunc(failure), places=10)
+
+    def test_fatigue(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='numpy', path_input=path_input)
+        becas.compute()
+        snmat = np.tile([10., 1.e9], (becas.matprops.shape[0], 1))
+        np.random.seed(0)
+        loads = np.cumsum(np.random.randn(500, 6), axis=0) * 1.e4
+        fat = BECASWrapper(s, exec_mode='numpy', analysis_mode='fatigue',
+                           path_input=path_input, snmat=snmat)
+        fat.load_cases = loads
+        fat.compute()
+        self.assertTrue(fat.success)
+        damage = becas.section.compute_fatigue(loads, snmat)
+        self.assertEqual(np.testing.assert_allclose(fat.damage, damage, rtol=1.e-12), None)
+        self.assertEqual(fat.max_damage, damage.max())
+
+    def test_session_script(self):
+
+        s = 0.333
+        path_input = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+        becas = BECASWrapper(s, exec_mode='oct2py_session', dry_run=True,
+                             path_input=path_input)
+        becas.compute()
+        # the saved state must be readable by scipy.io.loadmat
+        self.assertTrue("save('-v7', '%s'," % becas.utils_rst_filename in ''.join(becas.out_str))
+
+    def test_write_snmat(self):
+
+        materials = {'biax': 0, 'uniax': 1, 'balsa': 2, 'triax': 3}
+        snmat = np.array([[10., 1.e9], [9., 2.e9], [8., 3.e9], [7., 4.e9]])
+        mesher = CS2DtoBECAS({'s': 0.333, 'materials': materials, 'snmat': snmat})
+        os.makedirs(os.path.join(mesher.becas_inputs, mesher.section_name))
+        mesher.write_snmat()
+        # the materials are written to MATPROPS.in in the same order
+        rows = [snmat[ix] for name, ix in materials.iteritems()]
+        self.assertEqual(np.testing.assert_allclose(np.loadtxt(os.path.join(mesher.becas_inputs,
+                                                    mesher.section_name, 'SNMAT.in')),
+                                                    rows, rtol=1.e-6), None)
+
+    def test_fatigue_without_snmat(self):
+
+        s = 0.333
+        path_input = os.path.abspath(os.path.join(path_data, 'BECAS_SECTION%3.3f' % s))
+        st3d = {'regions': [], 'webs': [], 'materials': {'biax': 0}}
+        config = {'BECASWrapper': {'exec_mode': 'numpy', 'path_input': path_input},
+                  'fatigue': True}
+        self.assertRaises(RuntimeError, BECASCSStressRecovery, 'sec001', config, s, 10, st3d)
+
+        # the BECAS inputs have no SNMAT.in
+        workdir = 'becas_sec001_0'
+        os.mkdir(workdir)
+        os.chdir(workdir)
+        becas = BECASWrapper(s, exec_mode='numpy', path_input=path_input)
+        becas.compute()
+        os.chdir('..')
+        sr = BECASCSStressRecovery('sec001', config, s, 10)
+        params = {'sec001:hash': 0., 'load_cases_sec001': np.ones((10, 6))}
+        unknowns = {'blade_failure_index_sec001': np.zeros(10),
+                    'blade_damage_sec001': 0.}
+        sr.solve_nonlinear(params, unknowns, {})
+        self.assertFalse(sr.becas.success)
+        self.assertTrue(np.isnan(unknowns['blade_damage_sec001']))
+
+    def test_sensitivities(self):
+
+        path = os.path.join(path_data, 'BECAS_SECTION0.333')
+        nl_2d = np.loadtxt(os.path.join(path, 'N2D.in'))
+        el_2d = np.loadtxt(os.path.join(path, 'E2D.in'))
+        emat = np.loadtxt(os.path.join(path, 'EMAT.in'))
+        matprops = np.loadtxt(os.path.join(path, 'MATPROPS.in'))
+        section = BECASNumpy(nl_2d, el_2d, emat, matprops)
+        section.compute()
+
+        dmat = np.zeros(matprops.shape)
+        dmat[1, 0] = 1.
+        demat = np.zeros((section.ne, 2))
+        demat[section.el_mat == 1, 0] = 1.
+        dxy = np.zeros((section.nn, 2))
+        dxy[::10, 1] = 0.01
+        directions = [{'matprops': dmat}, {'emat': demat}, {'nl_2d': dxy}]
+        sens = section.compute_sensitivities(directions)
+
+        for d, step, sk, sm in zip(directions, [1.e6, 1.e-3, 1.e-4],
+                                   sens['k_matrix'], sens['m_matrix']):
+            fd = []
+            for sign in [1., -1.]:
+                nl = nl_2d.copy()
+                em = section.emat.copy()
+                mp = matprops.copy()
+                if 'nl_2d' in d:
+                    nl[:, 1:3] += sign * step * d['nl_2d']
+                if 'emat' in d:
+                    em[:, 2:4] += sign * step * d['emat']
+                if 'matprops' in d:
+                    mp += sign * step * d['matprops']
+                s = BECASNumpy(nl, el_2d, em, mp)
+                s.compute()
+                fd.append(s)
+            dK = (fd[0].Ks - fd[1].Ks) / (2. * step)
+            dM = (fd[0].Ms - fd[1].Ms) / (2. * step)
+            self.assertEqual(np.testing.assert_allclose(sk, dK, rtol=0., atol=1.e-5 * np.abs(dK).max()), None)
+            self.assertEqual(np.testing.assert_allclose(sm, dM, rtol=0., atol=1.e-6 * np.abs(section.Ms).max()), None)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
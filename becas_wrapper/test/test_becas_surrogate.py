@@ -0,0 +1,67 @@
+import unittest
+import numpy as np
+
+from becas_wrapper.becas_surrogate import SectionSurrogate
+
+tvec0 = np.array([0.01, 0.02, 0., 0.005, 0., 45., 0., -45.])
+
+
+def func(tvec):
+
+    t = tvec[:4]
+    a = np.radians(tvec[4:])
+    return np.array([1.e9 * t[0] * (1. + 0.1 * np.cos(a[1])) + 2.e9 * t[1]**1.2,
+                     t[3] * t[0], 5. + 1.e-3 * tvec[7]])
+
+
+def fill(surrogate, key, n=10):
+
+    rng = np.random.RandomState(0)
+    for i in range(n):
+        t = tvec0.copy()
+        t[[0, 1, 3]] *= 1. + 0.03 * rng.uniform(-1., 1., 3)
+        t[[5, 7]] += 0.3 * rng.uniform(-1., 1., 2)
+        surrogate.add_sample(t, func(t), key)
+
+
+class SectionSurrogateTestCase(unittest.TestCase):
+
+    def test_predict(self):
+
+        key = [np.ones(3)]
+        s = SectionSurrogate(4, radius=0.05, tol=1.e-2)
+        self.assertEqual(s.predict(tvec0, key), None)
+        fill(s, key)
+
+        t = tvec0.copy()
+        t[0] *= 1.01
+        y = s.predict(t, key)
+        self.assertEqual(np.testing.assert_allclose(y, func(t), rtol=1.e-4), None)
+
+    def test_trust_region(self):
+
+        key = [np.ones(3)]
+        s = SectionSurrogate(4, radius=0.05, tol=1.e-2)
+        fill(s, key)
+
+        # outside the trust region
+        t = tvec0.copy()
+        t[0] *= 1.2
+        self.assertEqual(s.predict(t, key), None)
+        # other plies or inputs
+        t = tvec0.copy()
+        t[2] = 0.001
+        self.assertEqual(s.predict(t, key), None)
+        self.assertEqual(s.predict(tvec0, [np.zeros(3)]), None)
+        # too large error estimate
+        s.tol = 1.e-8
+        self.assertEqual(s.predict(tvec0, key), None)
+
+        # new inputs discard the samples
+        s.add_sample(tvec0, func(tvec0), [np.zeros(3)])
+        self.assertEqual(s.X.shape[0], 1)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,181 @@
+import unittest
+import os
+import numpy as np
+
+from becas_wrapper.becas_wrapper import ksfunc
+from becas_wrapper.becas_numpy import BECASNumpy
+from becas_wrapper.loadcases import hull_load_cases, hull_weights, \
+                                    iter_load_chunks, FailureAccumulator, \
+                                    rainflow, miner_damage, group_failure, \
+                                    ks_aggregate
+
+path_data = 'data/BECAS_inputs'
+
+
+def load_section(s):
+
+    path = os.path.join(path_data, 'BECAS_SECTION%3.3f' % s)
+    section = BECASNumpy(np.loadtxt(os.path.join(path, 'N2D.in')),
+                         np.loadtxt(os.path.join(path, 'E2D.in')).astype(int),
+                         np.loadtxt(os.path.join(path, 'EMAT.in')),
+                         np.loadtxt(os.path.join(path, 'MATPROPS.in')))
+    section.compute()
+    section.failmat = np.loadtxt(os.path.join(path, 'FAILMAT.in'))
+    return section
+
+
+def tsai_wu_failmat(nmat):
+
+    failmat = np.zeros((nmat, 19))
+    failmat[:, 0] = 3
+    failmat[:, 1:10] = [1.e9, 5.e7, 5.e7, 7.e7, 7.e7, 7.e7, 8.e8, 1.5e8, 1.5e8]
+    failmat[:, 10:] = 1.e-2
+    return failmat
+
+
+class LoadCasesTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+
+        cls.section = load_section(0.333)
+        np.random.seed(1)
+        cls.loads = np.random.randn(150, 6) * [2.e5, 3.e5, 1.e6, 5.e6, 8.e6, 2.e5]
+
+    def check_failure(self, loads, failmat=None):
+
+        idx = hull_load_cases(loads)
+        W = hull_weights(loads, idx)
+        self.assertEqual(np.testing.assert_allclose(W.sum(axis=1), 1., rtol=1.e-12), None)
+        failure = self.section.compute_failure(loads, failmat)
+        fmax = failure.reshape(loads.shape[0], -1).max(axis=1)
+        fks = np.array([ksfunc(f) for f in failure])
+
+        # the maximum is reached at a hull vertex and the convex combinations
+        # of the vertices bound all other cases
+        self.assertAlmostEqual(fmax[idx].max() / fmax.max(), 1., places=12)
+        self.assertTrue(np.all(np.dot(W, fmax[idx]) >= fmax * (1. - 1.e-8)))
+        self.assertTrue(np.all(np.dot(W, fks[idx]) >= fks * (1. - 1.e-8)))
+        return idx
+
+    def test_max_strain(self):
+
+        idx = self.check_failure(self.loads)
+        self.assertTrue(idx.shape[0] < self.loads.shape[0])
+
+    def test_tsai_wu(self):
+
+        failmat = tsai_wu_failmat(int(self.section.el_mat.max()) + 1)
+        self.check_failure(self.loads, failmat)
+
+    def test_degenerate(self):
+
+        # flapwise and edgewise moments only
+        loads = np.zeros((100, 6))
+        loads[:, 3:5] = self.loads[:100, 3:5]
+        idx = self.check_failure(loads)
+        self.assertTrue(idx.shape[0] < 20)
+
+        # proportional loading
+        loads = np.outer(np.linspace(-1., 2., 10), self.loads[0])
+        self.assertEqual(list(hull_load_cases(loads)), [0, 9])
+
+    def test_accumulator(self):
+
+        failure = self.section.compute_failure(self.loads)
+        acc = FailureAccumulator(failure.shape[1])
+        for chunk in iter_load_chunks(iter(self.loads), 64):
+            acc.add(self.section.compute_failure(chunk))
+        self.assertEqual(acc.ncase, self.loads.shape[0])
+        self.assertEqual(np.testing.assert_allclose(acc.max, failure.max(axis=(0, 2)),
+                                                    rtol=1.e-14), None)
+        ks = np.array([ksfunc(failure[:, i]) for i in range(failure.shape[1])])
+        self.assertEqual(np.testing.assert_allclose(acc.ks, ks, rtol=1.e-12), None)
+        self.assertAlmostEqual(acc.total_ks(), ksfunc(failure), places=12)
+
+    def test_rainflow(self):
+
+        # example of ASTM E1049 section 5.4.4
+        ranges, means, counts, ids = rainflow([-2., 1., -3., 5., -1., 3., -4., 4., -2.])
+        cycles = {}
+        for r, c in zip(ranges, counts):
+            cycles[r] = cycles.get(r, 0.) + c
+        self.assertEqual(cycles, {3.: 0.5, 4.: 1.5, 6.: 0.5, 8.: 1., 9.: 0.5})
+
+        # histories are counted independently
+        h = np.random.randn(3, 200)
+        damage = miner_damage(h, 4., 10.)
+        for i in range(3):
+            self.assertAlmostEqual(miner_damage(h[i], 4., 10.)[0], damage[i], places=14)
+
+    def test_fatigue(self):
+
+        nmat = int(self.section.el_mat.max()) + 1
+        snmat = np.zeros((nmat, 2))
+        snmat[:, 0] = 10.
+        snmat[:, 1] = 1.e9
+        loads = np.cumsum(self.loads[:120], axis=0) * 0.1
+        damage = self.section.compute_fatigue(loads, snmat)
+
+        # the damage is independent of the number of elements in a block
+        self.assertEqual(np.testing.assert_allclose(self.section.compute_fatigue(loads, snmat, block_size=1000),
+                                                    damage, rtol=1.e-12), None)
+        # and scales with the stress ranges to the power of m
+        self.assertEqual(np.testing.assert_allclose(self.section.compute_fatigue(2. * loads, snmat),
+                                                    2.**10 * damage, rtol=1.e-10), None)
+
+        # fiber stress history of an element
+        e = np.argmax(damage)
+        strain, strain_m = self.section.compute_strains(loads)
+        stress, stress_m = self.section.compute_stresses(strain, strain_m)
+        self.assertAlmostEqual(miner_damage(stress_m[:, e, 0], 10., 1.e9)[0] / damage[e], 1., places=10)
+
+    def test_group_failure(self):
+
+        failure = self.section.compute_failure(self.loads[:20])
+        groups = self.section.el_mat + 1
+        keys, fmax, fks = group_failure(failure, groups)
+        self.assertEqual(list(keys), list(np.unique(groups)))
+        for j, k in enumerate(keys):
+            f = failure[:, groups == k]
+            self.assertEqual(np.testing.assert_allclose(fmax[:, j], f.max(axis=(1, 2)),
+                                                        rtol=1.e-14), None)
+            self.assertEqual(np.testing.assert_allclose(fks[:, j], [ksfunc(fi) for fi in f],
+                                                        rtol=1.e-12), None)
+
+    def test_ks_aggregate(self):
+
+        failure = self.section.compute_failure(self.loads[:10])
+        ks, dks, nan = ks_aggregate(failure, axis=(1, 2))
+        self.assertEqual(np.testing.assert_allclose(ks, [ksfunc(f) for f in failure],
+                                                    rtol=1.e-12), None)
+        self.assertFalse(nan.any())
+
+        # gradient w.r.t. the failure indices
+        p = np.random.rand(4, 5)
+        for side in [1., -1.]:
+            ks, dks, nan = ks_aggregate(p, 5., side=side)
+            self.assertAlmostEqual(ks, ksfunc(p, 5., side), places=12)
+            fd = np.zeros(p.shape)
+            for i in range(p.shape[0]):
+                for j in range(p.shape[1]):
+                    dp = np.zeros(p.shape)
+                    dp[i, j] = 1.e-6
+                    fd[i, j] = (ks_aggregate(p + dp, 5., side=side)[0] -
+                                ks_aggregate(p - dp, 5., side=side)[0]) / 2.e-6
+            self.assertEqual(np.testing.assert_allclose(dks, fd, rtol=1.e-6, atol=1.e-10), None)
+
+        # NaN entries are flagged and left out
+        p[1, 2] = np.nan
+        p[3] = np.nan
+        ks, dks, nan = ks_aggregate(p, axis=1)
+        self.assertEqual(list(np.nonzero(nan.any(axis=1))[0]), [1, 3])
+        self.assertAlmostEqual(ks[1], ksfunc(p[1][~nan[1]]), places=12)
+        self.assertTrue(np.isnan(ks[3]))
+        self.assertEqual(dks[1, 2], 0.)
+        self.assertAlmostEqual(dks[1].sum(), 1., places=12)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import numpy as np
+
+from becas_wrapper.thinwalled import ThinWalledSection, lamina_stiffness, wall_geometry
+
+
+def tube_cs2d(R=0.5, t=0.01, ni=361):
+
+    a = np.linspace(0., 2. * np.pi, ni)
+    coords = np.array([R * np.cos(a), R * np.sin(a)]).T
+    coords[-1] = coords[0]
+    E = 1.e10
+    nu = 0.3
+    matprops = np.array([[E, E, E, nu, nu, nu, E / (2. * (1. + nu)),
+                          E / (2. * (1. + nu)), E / (2. * (1. + nu)), 1000.]])
+    cs2d = {}
+    cs2d['s'] = 0.
+    cs2d['coords'] = coords
+    cs2d['materials'] = {'iso': 0}
+    cs2d['matprops'] = matprops
+    cs2d['DPs'] = np.array([-1., 0., 1.])
+    cs2d['web_def'] = []
+    cs2d['webs'] = []
+    cs2d['regions'] = []
+    for i in range(2):
+        cs2d['regions'].append({'layers': ['iso01'],
+                                'thicknesses': np.array([t]),
+                                'angles': np.array([0.])})
+    return cs2d
+
+
+class ThinWalledSectionTestCase(unittest.TestCase):
+
+    def test_lamina_stiffness(self):
+
+        matprops = np.array([4.e10, 1.e10, 1.e10, 0.3, 0.3, 0.3, 5.e9, 5.e9, 5.e9, 1900.])
+        Q0 = lamina_stiffness(matprops, 0.)
+        Q90 = lamina_stiffness(matprops, 90.)
+        self.assertAlmostEqual(Q0[0, 0] / Q90[1, 1], 1., places=10)
+        self.assertAlmostEqual(Q0[1, 1] / Q90[0, 0], 1., places=10)
+        Q45 = lamina_stiffness(matprops, 45.)
+        self.assertAlmostEqual(Q45[0, 2] / lamina_stiffness(matprops, -45.)[0, 2], -1., places=10)
+
+    def test_tube(self):
+
+        R = 0.5
+        t = 0.01
+        cs2d = tube_cs2d(R, t)
+        E = cs2d['matprops'][0, 0]
+        G = cs2d['matprops'][0, 6]
+        # the walls are at the midline of the tube
+        Rm = R - 0.5 * t
+        sec = ThinWalledSection(cs2d)
+        sec.compute()
+        self.assertTrue(sec.success)
+
+        K = sec.k_matrix
+        M = sec.m_matrix
+        self.assertAlmostEqual(K[2, 2] / (E * 2. * np.pi * Rm * t), 1., places=3)
+        self.assertAlmostEqual(K[3, 3] / (E * np.pi * Rm**3 * t), 1., places=3)
+        self.assertAlmostEqual(K[4, 4] / (E * np.pi * Rm**3 * t), 1., places=3)
+        self.assertAlmostEqual(K[5, 5] / (G * 2. * np.pi * Rm**3 * t), 1., places=3)
+        self.assertAlmostEqual(K[0, 0] / (G * np.pi * Rm * t), 1., places=2)
+        self.assertAlmostEqual(M[2, 2] / (1000. * 2. * np.pi * Rm * t), 1., places=3)
+        # shear and elastic centers at the center of the tube
+        self.assertEqual(np.testing.assert_allclose(sec.csprops[[0, 1, 2, 3]],
+                                                    np.zeros(4), atol=1.e-6), None)
+        self.assertEqual(np.testing.assert_allclose(sec.DPcoords[[0, 2]],
+                                                    np.array([[R, 0.], [R, 0.]]),
+                                                    atol=1.e-12), None)
+        self.assertEqual(sec.cs_props.shape[0], 19)
+
+    def test_wall_geometry(self):
+
+        a = np.linspace(0., 2. * np.pi, 41)
+        coords = np.array([0.5 + 0.5 * np.cos(a), 0.1 * np.sin(a) * (1. + 0.3 * np.cos(a))]).T
+        DPs = np.array([-1., -0.6, -0.3, 0., 0.25, 0.55, 1.])
+        web_def = [[1, -2], [2, -3]]
+        length, moment, dlength, dmoment = wall_geometry(coords, DPs, web_def)
+        S = np.sqrt((np.diff(coords, axis=0)**2).sum(axis=1)).sum()
+        self.assertAlmostEqual(length[:6].sum() / S, 1., places=12)
+
+        x = np.append(coords.flatten(), DPs)
+        h = 1.e-7
+        for i in range(x.size):
+            xp = x.copy()
+            xp[i] += h
+            lp, mp = wall_geometry(xp[:82].reshape(41, 2), xp[82:], web_def)[:2]
+            self.assertEqual(np.testing.assert_allclose((lp - length) / h, dlength[:, i],
+                                                        atol=1.e-5), None)
+            self.assertEqual(np.testing.assert_allclose((mp - moment) / h, dmoment[:, :, i],
+                                                        atol=1.e-5), None)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -0,0 +1,682 @@
+__all__ = ['ThinWalledSection', 'lamina_stiffness', 'wall_geometry']
+
+import numpy as np
+
+from becas_numpy import BECASNumpy, transform_matrix, principal_angle
+
+
+def lamina_stiffness(matprops, angle):
+    """
+    Plane stress stiffness matrix of a ply in the wall coordinate system,
+    with the 1-axis along the beam axis and the 2-axis along the wall.
+
+    parameters
+    ----------
+    matprops: array
+        material properties E1 E2 E3 nu12 nu13 nu23 G12 G13 G23 rho.
+        Size (10)
+    angle: float
+        ply angle in degrees w.r.t. the beam axis
+
+    returns
+    -------
+    Q: array
+        plane stress stiffness matrix for the strains eps_11, eps_22 and
+        gamma_12. Size ((3, 3))
+    """
+
+    E1, E2, nu12, G12 = matprops[0], matprops[1], matprops[3], matprops[6]
+    nu21 = nu12 * E2 / E1
+    d = 1. - nu12 * nu21
+    Q = np.array([[E1 / d, nu12 * E2 / d, 0.],
+                  [nu12 * E2 / d, E2 / d, 0.],
+                  [0., 0., G12]])
+    a = np.radians(angle)
+    c = np.cos(a)
+    s = np.sin(a)
+    # stress transformation matrix
+    T = np.array([[c**2, s**2, 2. * s * c],
+                  [s**2, c**2, -2. * s * c],
+                  [-s * c, s * c, c**2 - s**2]])
+    Ti = np.linalg.inv(T)
+    return np.dot(Ti, np.dot(Q, Ti.T))
+
+
+def _laminate(layers, cs2d):
+    """
+    Membrane properties per unit length of a laminate.
+
+    parameters
+    ----------
+    layers: list
+        list of (thickness, angle, layer name) of the plies, the first
+        ply being the outermost
+    cs2d: dict
+        cross section dictionary with materials and matprops
+
+    returns
+    -------
+    lam: dict
+        thickness t, axial stiffness Et, shear stiffness Gt, mass rho_t,
+        and the depths of the axial stiffness and mass centers
+        dE and dm, measured from the outer surface
+    """
+
+    t = 0.
+    A = np.zeros((3, 3))
+    rho_t = 0.
+    E_d = 0.
+    m_d = 0.
+    E_w = 0.
+    for thick, angle, name in layers:
+        matprops = cs2d['matprops'][cs2d['materials'][name[:-2]]]
+        Q = lamina_stiffness(matprops, angle)
+        A += Q * thick
+        d = t + 0.5 * thick
+        E_w += Q[0, 0] * thick
+        E_d += Q[0, 0] * thick * d
+        rho_t += matprops[9] * thick
+        m_d += matprops[9] * thick * d
+        t += thick
+    a = np.linalg.inv(A)
+    lam = {}
+    lam['t'] = t
+    lam['Et'] = 1. / a[0, 0]
+    lam['Gt'] = 1. / a[2, 2]
+    lam['rho_t'] = rho_t
+    lam['dE'] = E_d / E_w
+    lam['dm'] = m_d / rho_t
+    return lam
+
+
+def _layers(reg):
+
+    layers = []
+    for i, name in enumerate(reg['layers']):
+        if reg['thicknesses'][i] > 0.:
+            layers.append((reg['thicknesses'][i], reg['angles'][i], name))
+    return layers
+
+
+def _moments(w, xa, ya, xb, yb):
+    """
+    integrals of w, w x, w y, w x^2, w y^2 and w x y along straight
+    lines between (xa, ya) and (xb, yb), where w is per unit length.
+    """
+
+    L = np.sqrt((xb - xa)**2 + (yb - ya)**2)
+    wL = w * L
+    xm = 0.5 * (xa + xb)
+    ym = 0.5 * (ya + yb)
+    dx = xb - xa
+    dy = yb - ya
+    return np.array([wL.sum(),
+                     np.dot(wL, xm),
+                     np.dot(wL, ym),
+                     np.dot(wL, xm**2 + dx**2 / 12.),
+                     np.dot(wL, ym**2 + dy**2 / 12.),
+                     np.dot(wL, xm * ym + dx * dy / 12.)])
+
+
+def _contour_point(s, ds, P, D, l, S, dl, dS):
+    """
+    position on the contour and its integral along the contour at the
+    curve length s, with their derivatives w.r.t. the geometry variables.
+    """
+
+    n, nv = dS.shape
+    k = min(max(np.searchsorted(S, s, side='right') - 1, 0), n - 2)
+    sig = s - S[k]
+    dsig = ds - dS[k]
+    Ek = np.zeros((2, nv))
+    Ek[0, 2 * k] = 1.
+    Ek[1, 2 * k + 1] = 1.
+    dD = -Ek
+    dD[0, 2 * k + 2] = 1.
+    dD[1, 2 * k + 3] = 1.
+
+    # position
+    Ps = P[k] + sig / l[k] * D[k]
+    dPs = Ek + np.outer(D[k], dsig / l[k] - sig * dl[k] / l[k]**2) + sig / l[k] * dD
+
+    # integral of the position along the contour from the first point
+    M = 0.5 * (P[:-1] + P[1:])
+    G = np.dot(l[:k], M[:k]) + sig * P[k] + 0.5 * sig**2 / l[k] * D[k]
+    dG = np.zeros((2, nv))
+    dG += np.dot(M[:k].T, dl[:k])
+    a = np.zeros(n)
+    a[:k] += 0.5 * l[:k]
+    a[1:k + 1] += 0.5 * l[:k]
+    dG[0, 0:2 * n:2] += a
+    dG[1, 1:2 * n:2] += a
+    dG += np.outer(P[k], dsig) + sig * Ek
+    dG += np.outer(D[k], sig * dsig / l[k] - 0.5 * sig**2 * dl[k] / l[k]**2)
+    dG += 0.5 * sig**2 / l[k] * dD
+    return Ps, dPs, G, dG
+
+
+def wall_geometry(coords, DPs, web_def):
+    """
+    lengths and first moments of the regions and shear webs of a cross
+    section with their exact derivatives w.r.t. the coordinates and the DPs.
+
+    The regions follow the outer contour between their DPs and the webs are
+    straight lines between the DPs they are attached to, the DPs being
+    placed on the contour with the same curve length parameterization as in
+    ThinWalledSection.
+
+    parameters
+    ----------
+    coords: array
+        cross section coordinates. Size ((ni, 2)) or ((ni, 3))
+    DPs: array
+        vector of DPs in the range [-1, 1]. Size (nDP)
+    web_def: list
+        DP indices of the shear webs. Size ((nweb, 2))
+
+    returns
+    -------
+    length: array
+        lengths of the regions followed by the webs. Size (nwall)
+    moment: array
+        first moments of the walls, i.e. the integrals of the coordinates
+        along the walls. Size ((nwall, 2))
+    dlength: array
+        derivatives of length w.r.t. the flattened coordinates (x0, y0, x1,
+        y1, ...) followed by the DPs. Size ((nwall, 2 * ni + nDP))
+    dmoment: array
+        derivatives of moment. Size ((nwall, 2, 2 * ni + nDP))
+    """
+
+    P = np.asarray(coords, dtype=float)[:, :2]
+    DPs = np.asarray(DPs, dtype=float)
+    n = P.shape[0]
+    nq = 2 * n
+    nDP = DPs.shape[0]
+    nv = nq + nDP
+
+    # segment lengths and curve length with their derivatives
+    D = np.diff(P, axis=0)
+    l = np.sqrt((D**2).sum(axis=1))
+    e = D / l[:, None]
+    k = np.arange(n - 1)
+    dl = np.zeros((n - 1, nv))
+    dl[k, 2 * k] = -e[:, 0]
+    dl[k, 2 * k + 1] = -e[:, 1]
+    dl[k, 2 * k + 2] = e[:, 0]
+    dl[k, 2 * k + 3] = e[:, 1]
+    S = np.append(0., np.cumsum(l))
+    dS = np.vstack([np.zeros(nv), np.cumsum(dl, axis=0)])
+    L = S[-1]
+    dL = dS[-1]
+
+    # the leading edge is kept at the point furthest from the trailing edge
+    iLE = np.argmax(np.sqrt(((P - 0.5 * (P[0] + P[-1]))**2).sum(axis=1)))
+    SLE = S[iLE]
+    dSLE = dS[iLE]
+
+    points = []
+    for j, d in enumerate(DPs):
+        if d < 0.:
+            s = (d + 1.) * SLE
+            ds = (d + 1.) * dSLE
+            ds[nq + j] += SLE
+        else:
+            s = SLE + d * (L - SLE)
+            ds = dSLE + d * (dL - dSLE)
+            ds[nq + j] += L - SLE
+        points.append(_contour_point(s, ds, P, D, l, S, dl, dS) + (s, ds))
+
+    nr = nDP - 1
+    nw = len(web_def)
+    length = np.zeros(nr + nw)
+    moment = np.zeros((nr + nw, 2))
+    dlength = np.zeros((nr + nw, nv))
+    dmoment = np.zeros((nr + nw, 2, nv))
+    for i in range(nr):
+        Pa, dPa, Ga, dGa, sa, dsa = points[i]
+        Pb, dPb, Gb, dGb, sb, dsb = points[i + 1]
+        length[i] = sb - sa
+        dlength[i] = dsb - dsa
+        moment[i] = Gb - Ga
+        dmoment[i] = dGb - dGa
+    for iw, (i0, i1) in enumerate(web_def):
+        Pa, dPa = points[i0][:2]
+        Pb, dPb = points[i1][:2]
+        v = Pb - Pa
+        w = np.sqrt((v**2).sum())
+        dw = np.dot(v / w, dPb - dPa)
+        length[nr + iw] = w
+        dlength[nr + iw] = dw
+        moment[nr + iw] = 0.5 * w * (Pa + Pb)
+        dmoment[nr + iw] = np.outer(0.5 * (Pa + Pb), dw) + 0.5 * w * (dPa + dPb)
+    return length, moment, dlength, dmoment
+
+
+class ThinWalledSection(object):
+    """
+    Fast analytic cross section model for screening and early design
+    iterations, based on classical lamination theory and thin-walled
+    multi-cell beam theory.
+
+    The section is defined by the same cross section dictionary as used
+    by CS2DtoBECAS. The walls are modelled by their membrane properties,
+    the axial and bending stiffness and the mass are integrated along the
+    walls, and the torsional stiffness, the shear center and the shear
+    stiffness are computed from the shear flows of the closed cells formed
+    by the outer contour and the shear webs, which are assumed to be
+    nested. The resulting stiffness and mass matrices, cross section
+    properties and HAWC2 properties are given in the BECAS conventions,
+    so the class can be used in place of BECASWrapper.
+
+    parameters
+    ----------
+    cs2d: dict
+        dictionary containing coordinates and materials
+    spanpos: float
+        spanwise position of the section
+    hawc2_FPM: bool
+        output the fully populated stiffness matrix format
+    web_panels: int
+        number of panels of each shear web
+    web_offsets: list
+        web shell offset types, 'mid' or 'bot', defaults to 'mid'
+
+    returns
+    -------
+    k_matrix: array
+        stiffness matrix w.r.t. the reference point. Size ((6, 6))
+    m_matrix: array
+        mass matrix w.r.t. the reference point. Size ((6, 6))
+    csprops: array
+        cross section properties in the BECAS order. Size (18)
+    cs_props: array
+        HAWC2 beam properties. Size (19) or (30)
+    DPcoords: array
+        coordinates of the DPs on the outer surface. Size ((nDP, 2))
+    """
+
+    def __init__(self, cs2d, **kwargs):
+
+        self.cs2d = cs2d
+        self.spanpos = cs2d['s']
+        self.hawc2_FPM = False
+        self.web_panels = 10
+        self.web_offsets = []
+        self.success = False
+
+        for k, w in kwargs.iteritems():
+            try:
+                setattr(self, k, w)
+            except:
+                pass
+
+    def compute(self):
+        """
+        compute the stiffness and mass matrices and the
+        cross section properties.
+        """
+
+        self.success = False
+        self.build_walls()
+        self.compute_axial()
+        self.compute_shear()
+        self.compute_csprops()
+        self.k_matrix = self.Ks
+        self.m_matrix = self.Ms
+        self.csprops_ref = self.csprops
+        self.cs_props = self.becas2hawc2(self.spanpos, self.hawc2_FPM)
+        self.success = True
+
+    # the HAWC2 properties are computed as for the native BECAS sections
+    becas2hawc2 = BECASNumpy.__dict__['becas2hawc2']
+
+    def build_walls(self):
+        """
+        discretize the outer contour and the shear webs into straight
+        panels with the membrane properties of their laminates.
+        """
+
+        cs2d = self.cs2d
+        pts = np.asarray(cs2d['coords'], dtype=float)[:, :2]
+        closed = np.linalg.norm(pts[0] - pts[-1]) == 0.
+
+        # normalized curve length and leading edge
+        S = np.append(0., np.cumsum(np.sqrt((np.diff(pts, axis=0)**2).sum(axis=1))))
+        s01 = S / S[-1]
+        iLE = np.argmax(np.sqrt(((pts - 0.5 * (pts[0] + pts[-1]))**2).sum(axis=1)))
+        sLE = s01[iLE]
+        DPs01 = []
+        for s in cs2d['DPs']:
+            if s < 0.:
+                DPs01.append((s + 1.) * sLE)
+            else:
+                DPs01.append(sLE + s * (1. - sLE))
+        DPs01 = np.sort(DPs01)
+        self.DPcoords = np.array([np.interp(DPs01, s01, pts[:, 0]),
+                                  np.interp(DPs01, s01, pts[:, 1])]).T
+
+        # contour nodes including the DPs
+        u = np.unique(np.append(s01, DPs01))
+        xy = np.array([np.interp(u, s01, pts[:, 0]), np.interp(u, s01, pts[:, 1])]).T
+        iDPs = np.searchsorted(u, DPs01)
+        m = u.shape[0] - 1
+        nodes = np.arange(m + 1)
+        if closed:
+            nodes[-1] = 0
+            xy = xy[:-1]
+
+        # inward normals of the contour panels
+        xyc = np.array([np.interp(u, s01, pts[:, 0]), np.interp(u, s01, pts[:, 1])]).T
+        area = 0.5 * np.sum(xyc[:-1, 0] * xyc[1:, 1] - xyc[1:, 0] * xyc[:-1, 1])
+        tang = np.diff(xyc, axis=0)
+        length = np.sqrt((tang**2).sum(axis=1))
+        tang /= length[:, None]
+        sign = 1. if area > 0. else -1.
+        normal = sign * np.array([-tang[:, 1], tang[:, 0]]).T
+
+        # laminates of the regions, all plies of a region are offset inwards
+        umid = 0.5 * (u[:-1] + u[1:])
+        ireg = np.clip(np.searchsorted(DPs01, umid) - 1, 0, len(cs2d['regions']) - 1)
+        lams = []
+        for reg in cs2d['regions']:
+            layers = _layers(reg)
+            if len(layers) == 0:
+                raise AssertionError('The total thickness of the profile laminate is 0. '
+                                     'I do not expect open cross sections.')
+            lams.append(_laminate(layers, cs2d))
+        t = np.array([lams[i]['t'] for i in ireg])
+
+        # wall midline nodes, offset at the corners of the contour
+        # with the mitre of the normals of the adjacent panels
+        nn = xy.shape[0]
+        nsum = np.zeros((nn, 2))
+        ndot = np.zeros(nn)
+        tsum = np.zeros(nn)
+        cnt = np.zeros(nn)
+        for k, (i0, i1) in enumerate(zip(nodes[:-1], nodes[1:])):
+            for i in [i0, i1]:
+                ndot[i] = np.dot(nsum[i], normal[k])
+                nsum[i] += normal[k]
+                tsum[i] += t[k]
+                cnt[i] += 1.
+        mitre = nsum / np.maximum(1. + ndot, 0.1)[:, None]
+        mitre[cnt == 1.] = nsum[cnt == 1.]
+        xy_mid = xy + mitre * (0.5 * tsum / cnt)[:, None]
+
+        walls = {'a': [], 'b': [], 'lam': [],
+                 'E': [], 'm': []}
+        for k, (i0, i1) in enumerate(zip(nodes[:-1], nodes[1:])):
+            lam = lams[ireg[k]]
+            walls['a'].append(i0)
+            walls['b'].append(i1)
+            walls['lam'].append(lam)
+            p0 = xy_mid[i0]
+            p1 = xy_mid[i1]
+            dE = lam['dE'] - 0.5 * lam['t']
+            dm = lam['dm'] - 0.5 * lam['t']
+            walls['E'].append(np.append(p0 + normal[k] * dE, p1 + normal[k] * dE))
+            walls['m'].append(np.append(p0 + normal[k] * dm, p1 + normal[k] * dm))
+        ncontour = len(walls['a'])
+
+        # shear webs between the midline nodes of their DPs
+        webs = []
+        xy_all = list(xy_mid)
+        offsets = list(self.web_offsets) + ['mid'] * len(cs2d['webs'])
+        for iw, web in enumerate(cs2d['webs']):
+            layers = _layers(web)
+            if len(layers) == 0:
+                continue
+            lam = _laminate(layers, cs2d)
+            i0 = iDPs[cs2d['web_def'][iw][0]]
+            i1 = iDPs[cs2d['web_def'][iw][1]]
+            if i0 > i1:
+                i0, i1 = i1, i0
+            n0 = nodes[i0]
+            n1 = nodes[i1]
+            if n0 == n1:
+                continue
+            p0 = xy_mid[n0]
+            p1 = xy_mid[n1]
+            tw = (p1 - p0) / np.linalg.norm(p1 - p0)
+            nw = np.array([-tw[1], tw[0]])
+            if offsets[iw] == 'mid':
+                shift = -0.5 * lam['t']
+            else:
+                shift = 0.
+            npan = max(int(self.web_panels), 1)
+            ids = [n0]
+            for j in range(1, npan):
+                xy_all.append(p0 + (p1 - p0) * j / float(npan))
+                ids.append(len(xy_all) - 1)
+            ids.append(n1)
+            for j in range(npan):
+                walls['a'].append(ids[j])
+                walls['b'].append(ids[j + 1])
+                walls['lam'].append(lam)
+                q0 = p0 + (p1 - p0) * j / float(npan)
+                q1 = p0 + (p1 - p0) * (j + 1) / float(npan)
+                walls['E'].append(np.append(q0 + nw * (shift + lam['dE']), q1 + nw * (shift + lam['dE'])))
+                walls['m'].append(np.append(q0 + nw * (shift + lam['dm']), q1 + nw * (shift + lam['dm'])))
+            webs.append((i0, i1, range(len(walls['a']) - npan, len(walls['a']))))
+
+        self.xy = np.array(xy_all)
+        self.wall_a = np.array(walls['a'])
+        self.wall_b = np.array(walls['b'])
+        self.wall_E = np.array(walls['E'])
+        self.wall_m = np.array(walls['m'])
+        for key in ['t', 'Et', 'Gt', 'rho_t']:
+            setattr(self, 'wall_' + key, np.array([lam[key] for lam in walls['lam']]))
+        self.cells = self._cells(ncontour, closed, webs)
+
+    def _cells(self, ncontour, closed, webs):
+        """
+        closed cells of the section as lists of walls with their
+        orientations, for shear webs nested from the trailing edge
+        towards the leading edge.
+        """
+
+        webs = sorted(webs, key=lambda w: w[0])
+        cells = []
+        bounds = [(0, ncontour, None)] + [(i0, i1, ws) for i0, i1, ws in webs]
+        for k in range(len(bounds)):
+            o0, o1, outer = bounds[k]
+            cell = []
+            if k + 1 < len(bounds):
+                i0, i1, inner = bounds[k + 1]
+                cell.extend([(e, 1.) for e in range(o0, i0)])
+                cell.extend([(e, 1.) for e in inner])
+                cell.extend([(e, 1.) for e in range(i1, o1)])
+            else:
+                cell.extend([(e, 1.) for e in range(o0, o1)])
+            if outer is not None:
+                cell.extend([(e, -1.) for e in outer[::-1]])
+            elif not closed:
+                # the trailing edge cell is open
+                continue
+            if len([e for e, s in cell if e < ncontour]) == 0:
+                continue
+            cells.append(cell)
+        return cells
+
+    def compute_axial(self):
+        """
+        axial and bending stiffness and mass matrix w.r.t. the reference point.
+        """
+
+        E = self.wall_E
+        mE = _moments(self.wall_Et, E[:, 0], E[:, 1], E[:, 2], E[:, 3])
+        self.EA = mE[0]
+        self.xe = mE[1] / mE[0]
+        self.ye = mE[2] / mE[0]
+
+        K = np.zeros((6, 6))
+        K[2, 2] = mE[0]
+        K[2, 3] = K[3, 2] = mE[2]
+        K[2, 4] = K[4, 2] = -mE[1]
+        K[3, 3] = mE[4]
+        K[4, 4] = mE[3]
+        K[3, 4] = K[4, 3] = -mE[5]
+        self.K_axial = K
+
+        Mw = self.wall_m
+        m, mx, my, mxx, myy, mxy = _moments(self.wall_rho_t, Mw[:, 0], Mw[:, 1],
+                                             Mw[:, 2], Mw[:, 3])
+        Ms = np.zeros((6, 6))
+        Ms[0, 0] = Ms[1, 1] = Ms[2, 2] = m
+        Ms[0, 5] = Ms[5, 0] = -my
+        Ms[1, 5] = Ms[5, 1] = mx
+        Ms[2, 3] = Ms[3, 2] = my
+        Ms[2, 4] = Ms[4, 2] = -mx
+        Ms[3, 3] = myy
+        Ms[4, 4] = mxx
+        Ms[3, 4] = Ms[4, 3] = -mxy
+        Ms[5, 5] = mxx + myy
+        self.Ms = Ms
+
+    def _shear_flows(self, rates, twist):
+        """
+        shear flows in the walls for the axial stress rates and the
+        twist rates of the cells.
+
+        parameters
+        ----------
+        rates: array
+            axial stress resultant rate per unit length at the start and end
+            of the walls. Size ((nw, 2))
+        twist: array
+            right hand sides of the cell compatibility equations. Size (ncell)
+
+        returns
+        -------
+        q0: array
+            shear flow at the start of the walls. Size (nw)
+        qint: array
+            integral of the shear flow along the walls. Size (nw)
+        q: array
+            shear flows at the start, middle and end of the walls. Size ((nw, 3))
+        """
+
+        nw = self.wall_a.shape[0]
+        nn = self.xy.shape[0]
+        L = self.wall_L
+        f0 = rates[:, 0]
+        f1 = rates[:, 1]
+        F = 0.5 * L * (f0 + f1)
+        Fint = L**2 * (f0 / 3. + f1 / 6.)
+        Fmid = L * (3. * f0 + f1) / 8.
+
+        A = np.zeros((nn + len(self.cells), nw))
+        b = np.zeros(nn + len(self.cells))
+        # continuity of the shear flow at the nodes
+        A[self.wall_b, np.arange(nw)] += 1.
+        A[self.wall_a, np.arange(nw)] -= 1.
+        np.add.at(b, self.wall_b, F)
+        # compatibility of the twist rates of the cells
+        for i, cell in enumerate(self.cells):
+            for e, s in cell:
+                A[nn + i, e] += s * L[e] / self.wall_Gt[e]
+                b[nn + i] += s * Fint[e] / self.wall_Gt[e]
+            b[nn + i] += twist[i]
+        q0 = np.linalg.lstsq(A, b, rcond=None)[0]
+        q = np.array([q0, q0 - Fmid, q0 - F]).T
+        return q0, L * q0 - Fint, q
+
+    def compute_shear(self):
+        """
+        torsional stiffness, shear center and shear stiffness from
+        the shear flows of the walls.
+        """
+
+        a = self.xy[self.wall_a]
+        b = self.xy[self.wall_b]
+        self.wall_L = np.sqrt(((b - a)**2).sum(axis=1))
+        tang = (b - a) / self.wall_L[:, None]
+        arm = a[:, 0] * tang[:, 1] - a[:, 1] * tang[:, 0]
+        Gt = self.wall_Gt
+        L = self.wall_L
+
+        # enclosed areas of the cells
+        cell_area = np.zeros(len(self.cells))
+        for i, cell in enumerate(self.cells):
+            for e, s in cell:
+                p0 = a[e] if s > 0. else b[e]
+                p1 = b[e] if s > 0. else a[e]
+                cell_area[i] += 0.5 * (p0[0] * p1[1] - p1[0] * p0[1])
+
+        # torsion with unit twist rate
+        zero = np.zeros((L.shape[0], 2))
+        q0, qint, q = self._shear_flows(zero, 2. * cell_area)
+        self.GJ = np.dot(arm, qint) + np.sum(Gt * self.wall_t**2 * L) / 3.
+
+        # shear forces through axial stress rates about the elastic center
+        E = self.wall_E
+        mE = _moments(self.wall_Et, E[:, 0] - self.xe, E[:, 1] - self.ye,
+                      E[:, 2] - self.xe, E[:, 3] - self.ye)
+        EI = np.array([[mE[3], mE[5]], [mE[5], mE[4]]])
+        flows = []
+        forces = []
+        moments = []
+        for V in np.eye(2):
+            bx, by = np.linalg.solve(EI, V)
+            rates = -np.array([self.wall_Et * (bx * (E[:, 0] - self.xe) + by * (E[:, 1] - self.ye)),
+                               self.wall_Et * (bx * (E[:, 2] - self.xe) + by * (E[:, 3] - self.ye))]).T
+            q0, qint, q = self._shear_flows(rates, np.zeros(len(self.cells)))
+            flows.append(q)
+            forces.append(np.dot(qint, tang))
+            moments.append(np.dot(arm, qint))
+
+        # flows of unit shear forces and the shear center
+        R = np.linalg.inv(np.array(forces).T)
+        flows = np.einsum('kij,kl->lij', np.array(flows), R)
+        moments = np.dot(np.array(moments), R)
+        self.xs = moments[1]
+        self.ys = -moments[0]
+
+        # shear compliance from the complementary energy of the shear flows
+        C = np.zeros((2, 2))
+        for i in range(2):
+            for j in range(2):
+                qq = flows[i] * flows[j]
+                C[i, j] = np.sum(L / 6. * (qq[:, 0] + 4. * qq[:, 1] + qq[:, 2]) / Gt)
+
+        Ksh = np.zeros((6, 6))
+        Ksh[0:2, 0:2] = np.linalg.inv(C)
+        Ksh[5, 5] = self.GJ
+        Ti = np.linalg.inv(transform_matrix(self.xs, self.ys, 0.))
+        self.Ks = np.dot(Ti.T, np.dot(Ksh, Ti)) + self.K_axial
+        self.Fs = np.linalg.inv(self.Ks)
+
+    def compute_csprops(self):
+        """
+        cross section properties in the order of the BECAS csprops struct,
+        see BECASNumpy.compute_csprops.
+        """
+
+        Ms = self.Ms
+        self.mass = Ms[0, 0]
+        self.xm = Ms[1, 5] / self.mass
+        self.ym = -Ms[0, 5] / self.mass
+        self.Ixx = Ms[3, 3]
+        self.Iyy = Ms[4, 4]
+        self.Ixy = -Ms[3, 4]
+
+        a = self.xy[self.wall_a]
+        b = self.xy[self.wall_b]
+        A, Ax, Ay, Ayy, Axx, Axy = _moments(self.wall_t, a[:, 0], a[:, 1], b[:, 0], b[:, 1])
+        self.area = A
+        self.xa = Ax / A
+        self.ya = Ay / A
+        self.el_area = self.wall_t * self.wall_L
+        self.Q = np.zeros((self.el_area.shape[0], 6, 6))
+        self.Q[:, 3, 3] = self.Q[:, 4, 4] = self.wall_Gt / self.wall_t
+
+        self.alpha_ref = principal_angle(self.Ks)
+        Te = transform_matrix(self.xe, self.ye, 0.)
+        self.alpha_e = principal_angle(np.dot(Te.T, np.dot(self.Ks, Te)))
+
+        self.csprops = np.array([self.xs, self.ys, self.xe, self.ye,
+                                 self.mass, self.xm, self.ym,
+                                 self.Ixx, self.Iyy, self.Ixy,
+                                 self.xa, self.ya, Axx, Ayy, Axy, self.area,
+                                 self.alpha_ref, self.alpha_e])